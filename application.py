@@ -11,14 +11,24 @@ any changes, are expressly prohibited.
 All of the files in this directory and all subdirectories are:
 Copyright (c) 2025 Bogdan Simion, Diane Horton, Jacqueline Smith
 """
+from __future__ import annotations
+
 import datetime
+import itertools
 import json
+import os
+from typing import Iterable, Iterator, Optional
 
 from contract import MTMContract, PrepaidContract, TermContract
 from customer import Customer
 from phoneline import PhoneLine
-from visualizer import Visualizer
 from call import Call
+from callstore import CallStore
+from eventstream import iter_json_array, iter_jsonl
+from snapshot import load_snapshot, read_checkpoint, save_snapshot
+
+# Format of the time of the events in the dataset
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 
 
 def import_data() -> dict[str, list[dict]]:
@@ -33,10 +43,73 @@ def import_data() -> dict[str, list[dict]]:
         return log
 
 
-def create_customers(log: dict[str, list[dict]]) -> list[Customer]:
+def stream_data(filename: str = "dataset.json") \
+        -> dict[str, Iterable[dict]]:
+    """ Return a dictionary in the same format as import_data, for the dataset
+    stored in the file <filename>, where the "events" value is an iterator
+    that reads the events from the file one at a time, as they are consumed.
+    The "customers" value is a list, since all customers must be created
+    before the events are processed.
+
+    If <filename> ends in ".jsonl", the file is in the JSON-Lines format: one
+    record per line, where all customer records come before the first event
+    record. Event records are those with a "type" key.
+
+    Precondition: the dataset file must be in the json or JSON-Lines format.
+    """
+    if filename.endswith('.jsonl'):
+        return _stream_jsonl_data(filename)
+
+    with open(filename) as o:
+        customers = list(iter_json_array(o, 'customers'))
+
+    def events() -> Iterable[dict]:
+        """ Yield the events from <filename> one at a time.
+        """
+        with open(filename) as f:
+            yield from iter_json_array(f, 'events')
+
+    return {'events': events(), 'customers': customers}
+
+
+def _stream_jsonl_data(filename: str) -> dict[str, Iterable[dict]]:
+    """ Return the dictionary described in stream_data, for the JSON-Lines
+    file <filename>.
+    """
+    customers = []
+    # the number of lines before the first event, which the events skip
+    skipped = 0
+    with open(filename) as o:
+        for line in o:
+            if line.strip():
+                record = json.loads(line)
+                if 'type' in record:
+                    break
+                customers.append(record)
+            skipped += 1
+
+    def events() -> Iterable[dict]:
+        """ Yield the events from <filename> one at a time.
+        """
+        with open(filename) as f:
+            for _ in range(skipped):
+                f.readline()
+            yield from iter_jsonl(f)
+
+    return {'events': events(), 'customers': customers}
+
+
+def create_customers(log: dict[str, list[dict]],
+                     directory: Optional[dict[str, tuple[Customer,
+                                                         PhoneLine]]] = None) \
+        -> list[Customer]:
     """ Returns a list of Customer instances for each customer from the input
     dataset from the dictionary <log>.
 
+    If <directory> is given, it is filled in with an entry for every phone
+    line that is created, mapping the phone number to its owning Customer and
+    PhoneLine (see build_number_directory).
+
     Precondition:
     - The <log> dictionary contains the input data in the correct format,
     matching the expected input format described in the handout.
@@ -59,21 +132,66 @@ def create_customers(log: dict[str, list[dict]]) -> list[Customer]:
 
             line = PhoneLine(line['number'], contract)
             customer.add_phone_line(line)
+            if directory is not None:
+                directory[line.get_number()] = (customer, line)
         customer_list.append(customer)
     return customer_list
 
 
+def build_number_directory(customer_list: list[Customer]) \
+        -> dict[str, tuple[Customer, PhoneLine]]:
+    """ Return a dictionary mapping every phone number owned by a customer in
+    <customer_list> to a tuple containing the Customer that owns it and the
+    corresponding PhoneLine.
+    """
+    directory = {}
+    for customer in customer_list:
+        for number in customer.get_phone_numbers():
+            directory[number] = (customer, customer.get_phone_line(number))
+    return directory
+
+
 def find_customer_by_number(number: str, customer_list: list[Customer]) \
         -> Customer:
     """ Return the Customer with the phone number <number> in the list of
     customers <customer_list>.
     If the number does not belong to any customer, return None.
+
+    Note: this is a linear search over <customer_list>; when looking up many
+    numbers, use build_number_directory instead.
     """
-    cust = None
     for customer in customer_list:
         if number in customer:
-            cust = customer
-    return cust
+            return customer
+    return None
+
+
+def _is_digits(text: str) -> bool:
+    """ Return whether <text> is only made of the ASCII digits 0 to 9.
+    """
+    return text.isascii() and text.isdigit()
+
+
+def parse_time(text: str) -> datetime.datetime:
+    """ Return the date and time written in <text>, in the TIME_FORMAT format
+    used by the dataset.
+
+    Strings in exactly this format are parsed with datetime.fromisoformat,
+    which is much faster than datetime.strptime; anything else falls back to
+    datetime.strptime, so that the same strings are accepted and rejected.
+    Only the shape YYYY-MM-DD HH:MM:SS, with ASCII digits, takes the fast
+    path, since datetime.fromisoformat also accepts other ISO 8601 forms,
+    such as week dates and time zones.
+    """
+    if (len(text) == 19 and text[4] == text[7] == '-' and text[10] == ' '
+            and text[13] == text[16] == ':'
+            and _is_digits(text[:4] + text[5:7] + text[8:10] + text[11:13]
+                           + text[14:16] + text[17:])):
+        try:
+            return datetime.datetime.fromisoformat(text)
+        except ValueError:
+            pass
+    return datetime.datetime.strptime(text, TIME_FORMAT)
 
 
 def new_month(customer_list: list[Customer], month: int, year: int) -> None:
@@ -84,11 +202,175 @@ def new_month(customer_list: list[Customer], month: int, year: int) -> None:
         cust.new_month(month, year)
 
 
-def process_event_history(log: dict[str, list[dict]],
-                          customer_list: list[Customer]) -> None:
+class EventProcessor:
+    """ Processes the events of a dataset incrementally, one batch at a time,
+    as they are appended to a live feed.
+
+    Processing all events in several batches gives the same result as
+    processing them all at once with process_event_history. The state of the
+    processor can be saved into a checkpoint, so that after a crash it resumes
+    from the first event that was not processed yet.
+
+    === Public Attributes ===
+    customers:
+         the customers the events are processed for
+    store:
+         the CallStore every call made by a customer is appended to, or None
+    offset:
+         the number of events processed so far, from the start of the feed
+    billing_month:
+         the (month, year) of the current bills of the customers, or None if
+         no event was processed yet
+
+    === Representation Invariants ===
+    - offset >= 0
+    """
+    customers: list[Customer]
+    store: Optional[CallStore]
+    offset: int
+    billing_month: Optional[tuple[int, int]]
+    # === Private Attributes ===
+    # _directory:
+    #     the owning Customer and PhoneLine of each phone number, as returned
+    #     by build_number_directory
+    _directory: dict[str, tuple[Customer, PhoneLine]]
+
+    def __init__(self, customer_list: list[Customer],
+                 store: Optional[CallStore] = None,
+                 directory: Optional[dict[str, tuple[Customer, PhoneLine]]]
+                 = None) -> None:
+        """ Create a new processor for the customers in <customer_list>, which
+        has not processed any event yet. If <store> is given, every call made
+        by a customer is appended to it, and it records the phone numbers of
+        the customers.
+
+        The <directory> maps phone numbers to their owning Customer and
+        PhoneLine, as returned by build_number_directory. If it is not
+        provided, it is built from <customer_list>.
+        """
+        if directory is None:
+            directory = build_number_directory(customer_list)
+        self.customers = customer_list
+        self.store = store
+        self.offset = 0
+        self.billing_month = None
+        self._directory = directory
+        if store is not None:
+            # the store finds the calls of a customer from its id
+            for customer in customer_list:
+                store.add_customer(customer)
+
+    def process(self, events: Iterable[dict],
+                start: Optional[int] = None) -> int:
+        """ Process the <events>, which come right after the events already
+        processed, and return the number of events processed.
+
+        The customers are only advanced to a new month when the month of the
+        calls changes, as described in process_event_history.
+
+        If <start> is given, it is the index in the feed of the first of the
+        <events>, such as the offset of a checkpoint they were read after. The
+        events before <offset> were already processed and are skipped. Raise
+        a ValueError if <start> is after <offset>, since the events in between
+        would be missed.
+
+        Precondition: the <events> are in the same format as the "events" of
+        the dictionary returned by import_data, in chronological order.
+        """
+        if start is not None:
+            if start > self.offset:
+                raise ValueError(f"events from index {start} do not follow "
+                                 f"the {self.offset} events processed")
+            events = itertools.islice(events, self.offset - start, None)
+        directory = self._directory
+        store = self.store
+        count = 0
+        for event_data in events:
+            if self.billing_month is None:
+                # start recording the bills from the date of the first event
+                billing_date = parse_time(event_data['time'])
+                self.billing_month = (billing_date.month, billing_date.year)
+                new_month(self.customers, billing_date.month,
+                          billing_date.year)
+
+            if event_data["type"] == "call":
+                src_num = event_data["src_number"]
+                dst_num = event_data["dst_number"]
+                # collect info to make call object for every call
+                call = Call(src_num, dst_num,
+                            parse_time(event_data['time']),
+                            event_data["duration"],
+                            tuple(event_data["src_loc"]),
+                            tuple(event_data["dst_loc"]))
+
+                # check whether customer is making a call or receiving a call
+                line_sending = directory.get(src_num)
+                line_receiving = directory.get(dst_num)
+
+                # in either case, add this call to the call history of this
+                # line
+                if line_sending is not None:
+                    line_sending[1].make_call(call)
+                    if store is not None:
+                        store.append(call)
+                if line_receiving is not None:
+                    line_receiving[1].receive_call(call)
+                # push bill to next month if it doesn't match current month
+                if call.get_bill_date() != self.billing_month:
+                    self.billing_month = call.get_bill_date()
+                    new_month(self.customers, *self.billing_month)
+            self.offset += 1
+            count += 1
+        return count
+
+    def unprocessed(self, events: Iterable[dict]) -> Iterator[dict]:
+        """ Return an iterator over the <events> of the whole feed, from its
+        start, which skips the events that were already processed.
+        """
+        return itertools.islice(events, self.offset, None)
+
+    def save_checkpoint(self, filename: str) -> None:
+        """ Save the state of this processor, including the state of its
+        customers, into the snapshot file <filename>.
+        """
+        checkpoint = {'offset': self.offset,
+                      'billing_month': self.billing_month}
+        save_snapshot(filename, self.customers, self.store, checkpoint)
+
+    @classmethod
+    def resume(cls, filename: str) -> EventProcessor:
+        """ Return the processor whose state was saved by save_checkpoint into
+        the snapshot file <filename>. It always has a CallStore.
+
+        Raise a ValueError if <filename> does not hold a checkpoint.
+        """
+        checkpoint = read_checkpoint(filename)
+        if checkpoint is None:
+            raise ValueError(f"{filename} does not hold a checkpoint")
+        customer_list, store = load_snapshot(filename)
+        processor = cls(customer_list, store or CallStore())
+        processor.offset = checkpoint['offset']
+        if checkpoint['billing_month'] is not None:
+            processor.billing_month = tuple(checkpoint['billing_month'])
+        return processor
+
+
+def process_event_history(log: dict[str, Iterable[dict]],
+                          customer_list: list[Customer],
+                          directory: Optional[dict[str, tuple[Customer,
+                                                              PhoneLine]]]
+                          = None,
+                          store: Optional[CallStore] = None) -> None:
     """ Process the calls from the <log> dictionary. The <customer_list>
     list contains all the customers that exist in the <log> dictionary.
 
+    The <directory> maps phone numbers to their owning Customer and PhoneLine,
+    as returned by build_number_directory. If it is not provided, it is built
+    from <customer_list> before processing the events.
+
+    If <store> is given, every call made by a customer is also appended to it,
+    in chronological order.
+
     Construct Call objects from <log> and register the Call into the
     corresponding customer's call history.
 
@@ -104,51 +386,60 @@ def process_event_history(log: dict[str, list[dict]],
     - The <log> dictionary is in the correct format, as defined in the
     handout.
     - The <customer_list> already contains all the customers from the <log>.
+
+    The "events" in <log> may be any iterable, such as the iterator returned
+    by stream_data, and are only read once.
     """
-    billing_date = datetime.datetime.strptime(log['events'][0]['time'],
-                                              "%Y-%m-%d %H:%M:%S")
-    billing_month = billing_date.month
-    # start recording the bills from this date
-
-    new_month(customer_list, billing_date.month, billing_date.year)
-    for event_data in log['events']:
-        if event_data["type"] == "call":
-            src_num = event_data["src_number"]
-            dst_num = event_data["dst_number"]
-            event_time = datetime.datetime.strptime(event_data['time'],
-                                                    "%Y-%m-%d %H:%M:%S")
-            # collect info to make call object for every call
-            event_data = Call(src_num, dst_num,
-                              event_time,
-                              event_data["duration"],
-                              tuple(event_data["src_loc"]),
-                              tuple(event_data["dst_loc"]))
-
-            # check whether customer is making a call or receiving a call
-            # e_src = event_data.src_number
-            # e_dst = event_data.dst_number
-            customer_sending = find_customer_by_number(src_num, customer_list)
-            customer_receiving = find_customer_by_number(dst_num, customer_list)
-
-            # in either case, add this call to the call history of this customer
-            if customer_sending or customer_receiving:
-                customer_sending.make_call(event_data)
-                customer_receiving.receive_call(event_data)
-            # push bill to next month if it doesn't match current month
-            if event_time.month != billing_month:
-                billing_month = event_time.month
-                new_month(customer_list, billing_month, event_time.year)
+    EventProcessor(customer_list, store, directory).process(log['events'])
+
+
+def load_dataset(filename: str = "dataset.json",
+                 snapshot_file: Optional[str] = None) \
+        -> tuple[list[Customer], CallStore]:
+    """ Return the customers of the dataset stored in the file <filename>,
+    after processing all of its events, along with a CallStore holding every
+    call made by a customer, in chronological order.
+
+    If <snapshot_file> is given and is at least as recent as <filename>, the
+    customers are restored from it instead of processing the events again.
+    Otherwise, the events are processed and, if <snapshot_file> is given, the
+    result is saved into it for the next time.
+
+    Precondition: the dataset file must be in the json or JSON-Lines format.
+    """
+    if (snapshot_file is not None and os.path.exists(snapshot_file)
+            and os.path.getmtime(snapshot_file)
+            >= os.path.getmtime(filename)):
+        try:
+            customer_list, store = load_snapshot(snapshot_file)
+            return customer_list, store or CallStore()
+        except ValueError:
+            # written by another version of the format: process the events
+            pass
+
+    log = stream_data(filename)
+    directory = {}
+    customer_list = create_customers(log, directory)
+    store = CallStore()
+    process_event_history(log, customer_list, directory, store)
+    if snapshot_file is not None:
+        save_snapshot(snapshot_file, customer_list, store)
+    return customer_list, store
 
 
 if __name__ == '__main__':
+    # only the visualization needs Pygame, so it is imported here to keep the
+    # functions above usable for headless runs
+    from visualizer import Visualizer
+
     v = Visualizer()
     print("Toronto map coordinates:")
     print("  Lower-left corner: -79.697878, 43.576959")
     print("  Upper-right corner: -79.196382, 43.799568")
 
-    input_dictionary = import_data()
-    customers = create_customers(input_dictionary)
-    process_event_history(input_dictionary, customers)
+    # the processed dataset is kept in a snapshot, so that the events only
+    # need to be processed again when dataset.json changes
+    customers, all_calls = load_dataset("dataset.json", "dataset.snapshot")
 
     # ----------------------------------------------------------------------
     # NOTE: You do not need to understand any of the implementation below,
@@ -156,13 +447,10 @@ if __name__ == '__main__':
     # read it anyway, just to get a sense of how the application runs.
     # ----------------------------------------------------------------------
 
-    # Gather all calls to be drawn on screen for filtering, but we only want
-    # to plot each call only once, so only plot the outgoing calls to screen.
-    # (Each call is registered as both an incoming and outgoing)
-    all_calls = []
-    for c in customers:
-        hist = c.get_history()
-        all_calls.extend(hist[0])
+    # All calls to be drawn on screen for filtering were gathered in the
+    # <all_calls> store, which the filters select from with vectorized
+    # operations. Each call is only plotted once: the store only holds each
+    # call made by a customer once, like their outgoing calls.
     print("\n-----------------------------------------")
     print("Total Calls in the dataset:", len(all_calls))
 
@@ -171,30 +459,40 @@ if __name__ == '__main__':
     #    appropriately
     # 2) Take the calls from the results of the filtering and create the
     #    drawables and connection lines for those calls
-    # 3) Display the calls in the visualization window
+    # 3) Display the calls in the visualization window, only when they or the
+    #    view of the map changed, with at most MAX_FPS frames per second
     events = all_calls
+    drawables = None
     while not v.has_quit():
-        events = v.handle_window_events(customers, events)
-
-        connections = []
-        drawables = []
-        for event in events:
-            connections.append(event.get_connection())
-            drawables.extend(event.get_drawables())
-
-        # Put the connections on top of the other sprites
-        drawables.extend(connections)
+        new_events = v.handle_window_events(customers, events)
+
+        # the drawables are only created again when a filter changed the
+        # calls to display
+        if drawables is None or new_events is not events:
+            events = new_events
+            connections = []
+            drawables = []
+            for event in events:
+                connections.append(event.get_connection())
+                drawables.extend(event.get_drawables())
+
+            # Put the connections on top of the other sprites
+            drawables.extend(connections)
         v.render_drawables(drawables)
+        v.wait_frame()
 
     import python_ta
 
     python_ta.check_all(config={
         'allowed-import-modules': [
-            'python_ta', 'typing', 'json', 'datetime',
-            'visualizer', 'customer', 'call', 'contract', 'phoneline'
+            'python_ta', 'typing', '__future__', 'itertools', 'json',
+            'datetime',
+            'visualizer', 'customer', 'call', 'contract', 'phoneline',
+            'eventstream', 'callstore', 'snapshot', 'os'
         ],
         'allowed-io': [
-            'create_customers', 'import_data'
+            'create_customers', 'import_data', 'stream_data',
+            '_stream_jsonl_data', 'events'
         ],
         'generated-members': 'pygame.*'
     })
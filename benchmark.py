@@ -0,0 +1,517 @@
+"""
+CSC148, Winter 2025
+Assignment 1
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) 2025 Bogdan Simion, Diane Horton, Jacqueline Smith
+
+=== Module Description ===
+
+This file contains benchmarks for the performance-sensitive parts of the
+MewbileTech system. The benchmarks run on synthetic datasets that follow the
+same format as dataset.json, so that they can be scaled to any size.
+
+Run this module directly to print the results of all of the benchmarks.
+"""
+import datetime
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from application import create_customers, process_event_history, \
+    build_number_directory, import_data, load_dataset, parse_time, \
+    TIME_FORMAT
+from billing import bill_store
+from filter import DurationFilter, Filter, LocationFilter
+from parallel import FilterPool
+from call import Call
+from callstore import CallStore
+from snapshot import load_snapshot, save_snapshot
+from sortedindex import SortedIndex
+from spatialindex import GridIndex
+
+# Map lower-left and upper-right corners (long, lat)
+BENCH_MIN = (-79.697878, 43.576959)
+BENCH_MAX = (-79.196382, 43.799568)
+
+
+def make_log(num_customers: int, num_events: int, lines_per_customer: int = 3,
+             seed: int = 148) -> dict[str, list[dict]]:
+    """ Return a synthetic dataset in the same format as dataset.json, with
+    <num_customers> customers owning <lines_per_customer> phone lines each,
+    and <num_events> call events spread chronologically over the year 2018.
+
+    The same <seed> always generates the same dataset.
+    """
+    rng = random.Random(seed)
+    contracts = ['mtm', 'term', 'prepaid']
+    customers = []
+    numbers = []
+    for i in range(num_customers):
+        lines = []
+        for j in range(lines_per_customer):
+            n = i * lines_per_customer + j
+            number = f'{n // 10000:03d}-{n % 10000:04d}'
+            numbers.append(number)
+            lines.append({'number': number,
+                          'contract': contracts[n % len(contracts)]})
+        customers.append({'lines': lines, 'id': 1000 + i})
+
+    events = []
+    seconds_per_event = 365 * 24 * 60 * 60 / max(num_events, 1)
+    start = datetime.datetime(2018, 1, 1)
+    for k in range(num_events):
+        # the times are naive, like those of dataset.json, so that they do
+        # not depend on the time zone of the machine
+        moment = start + datetime.timedelta(seconds=k * seconds_per_event)
+        events.append({
+            'type': 'call',
+            'src_number': rng.choice(numbers),
+            'dst_number': rng.choice(numbers),
+            'time': moment.strftime('%Y-%m-%d %H:%M:%S'),
+            'duration': rng.randint(1, 600),
+            'src_loc': [rng.uniform(BENCH_MIN[0], BENCH_MAX[0]),
+                        rng.uniform(BENCH_MIN[1], BENCH_MAX[1])],
+            'dst_loc': [rng.uniform(BENCH_MIN[0], BENCH_MAX[0]),
+                        rng.uniform(BENCH_MIN[1], BENCH_MAX[1])]
+        })
+    return {'events': events, 'customers': customers}
+
+
+def bench_ingest(num_customers: int = 2000,
+                 event_counts: tuple[int, ...] = (5000, 10000, 20000)) \
+        -> list[tuple[int, float]]:
+    """ Time create_customers and process_event_history on synthetic datasets
+    with <num_customers> customers, once for each number of events in
+    <event_counts>. Return a list of (number of events, seconds) tuples.
+
+    With the phone number directory, the time taken grows linearly in the
+    number of events, independently of the number of customers.
+    """
+    results = []
+    for num_events in event_counts:
+        log = make_log(num_customers, num_events)
+        t1 = time.perf_counter()
+        directory = {}
+        customers = create_customers(log, directory)
+        process_event_history(log, customers, directory)
+        t2 = time.perf_counter()
+        results.append((num_events, t2 - t1))
+    return results
+
+
+class _DictCall:
+    """ A call stored the way Call was stored before it was made compact: in
+    a __dict__, with a datetime and two coordinate tuples. Only used as a
+    reference point for bench_call_memory.
+    """
+
+    def __init__(self, src_nr: str, dst_nr: str,
+                 calltime: datetime.datetime, duration: int,
+                 src_loc: tuple[float, float], dst_loc: tuple[float, float]) \
+            -> None:
+        """ Create a new call with the given parameters.
+        """
+        self.src_number = src_nr
+        self.dst_number = dst_nr
+        self.time = calltime
+        self.duration = duration
+        self.src_loc = src_loc
+        self.dst_loc = dst_loc
+
+
+def _measure_calls(call_class: type, events: list[dict]) -> float:
+    """ Return the number of bytes allocated per call when creating an
+    instance of <call_class> for each of the <events>, the same way that
+    process_event_history does.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    calls = []
+    for event in events:
+        calls.append(call_class(
+            event['src_number'], event['dst_number'],
+            parse_time(event['time']),
+            event['duration'],
+            tuple(event['src_loc']), tuple(event['dst_loc'])))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(calls)
+
+
+def bench_call_memory(num_calls: int = 100000) -> list[tuple[str, float]]:
+    """ Return the number of bytes used per call in memory, for <num_calls>
+    calls, for both the previous __dict__-based layout and the current
+    compact Call, as a list of (layout, bytes per call) tuples.
+
+    The phone numbers of the events are copied first, so that every event has
+    its own strings, like when they are decoded from a dataset file.
+    """
+    events = make_log(num_calls // 10, num_calls)['events']
+    for event in events:
+        event['src_number'] = ''.join(list(event['src_number']))
+        event['dst_number'] = ''.join(list(event['dst_number']))
+    return [('dict', _measure_calls(_DictCall, events)),
+            ('slots', _measure_calls(Call, events))]
+
+
+def bench_billing(num_customers: int = 200, num_events: int = 100000) \
+        -> list[tuple[str, float]]:
+    """ Return the time taken to bill <num_events> calls made by
+    <num_customers> customers, one call at a time through Contract.bill_call
+    and in batches with billing.bill_store, as a list of (method, seconds)
+    tuples.
+    """
+    log = make_log(num_customers, num_events)
+    store = CallStore()
+    process_event_history(log, create_customers(log), store=store)
+    months = [call.get_bill_date() for call in store]
+
+    customers = create_customers(log)
+    directory = build_number_directory(customers)
+    t1 = time.perf_counter()
+    current = None
+    for call, month in zip(store, months):
+        if month != current:
+            current = month
+            for customer in customers:
+                customer.new_month(month[0], month[1])
+        directory[call.src_number][1].contract.bill_call(call)
+    t2 = time.perf_counter()
+
+    customers = create_customers(log)
+    t3 = time.perf_counter()
+    bill_store(customers, store)
+    t4 = time.perf_counter()
+    return [('per-call', t2 - t1), ('batch', t4 - t3)]
+
+
+def bench_bill_lookups(num_customers: int = 2000, num_events: int = 100000,
+                       rounds: int = 5) -> list[tuple[str, float]]:
+    """ Return the time taken to look up the bills of every month of the
+    year, <rounds> times, for <num_customers> customers after <num_events>
+    events, by summarizing their Bill objects every time and through
+    Customer.generate_bill, as a list of (method, seconds) tuples.
+    """
+    log = make_log(num_customers, num_events)
+    customers = create_customers(log)
+    process_event_history(log, customers)
+    months = [(month, 2018) for month in range(1, 13)]
+
+    t1 = time.perf_counter()
+    for _ in range(rounds):
+        for customer in customers:
+            for month, year in months:
+                for number in customer.get_phone_numbers():
+                    line = customer.get_phone_line(number)
+                    if (month, year) in line.bills:
+                        summary = line.bills[(month, year)].get_summary()
+                        summary['number'] = number
+    t2 = time.perf_counter()
+    for _ in range(rounds):
+        for customer in customers:
+            for month, year in months:
+                customer.generate_bill(month, year)
+    t3 = time.perf_counter()
+    return [('summarize', t2 - t1), ('cached', t3 - t2)]
+
+
+def bench_history_range(num_customers: int = 200, num_events: int = 200000,
+                        days: int = 7) -> list[tuple[str, float]]:
+    """ Return the time taken to find the calls made and received in the last
+    <days> days of the year by each phone line of <num_customers> customers
+    after <num_events> events, by checking every call of the month and with
+    CallHistory.get_calls_between, as a list of (method, seconds) tuples.
+    """
+    log = make_log(num_customers, num_events)
+    customers = create_customers(log)
+    process_event_history(log, customers)
+    histories = [h for c in customers for h in c.get_call_history()]
+    end = datetime.datetime(2019, 1, 1)
+    start = end - datetime.timedelta(days=days)
+
+    t1 = time.perf_counter()
+    for history in histories:
+        found = []
+        for calls in history.get_monthly_history(12, 2018):
+            for call in calls:
+                if start <= call.time < end:
+                    found.append(call)
+    t2 = time.perf_counter()
+    for history in histories:
+        found = []
+        for calls in history.get_calls_between(start, end):
+            found.extend(calls)
+    t3 = time.perf_counter()
+    return [('scan', t2 - t1), ('bisect', t3 - t2)]
+
+
+def bench_time_parsing(scale: int = 1000) -> list[tuple[str, float]]:
+    """ Return the time taken to parse the times of all of the events in
+    dataset.json, repeated <scale> times, with datetime.strptime and with
+    application.parse_time, as a list of (parser, seconds) tuples.
+    """
+    times = [event['time'] for event in import_data()['events']] * scale
+
+    t1 = time.perf_counter()
+    for text in times:
+        datetime.datetime.strptime(text, TIME_FORMAT)
+    t2 = time.perf_counter()
+    for text in times:
+        parse_time(text)
+    t3 = time.perf_counter()
+    return [('strptime', t2 - t1), ('parse_time', t3 - t2)]
+
+
+def bench_snapshot(num_customers: int = 2000, num_events: int = 100000) \
+        -> list[tuple[str, float]]:
+    """ Return the time taken to get the state of <num_customers> customers
+    after <num_events> call events, by reading and processing the events from
+    a dataset file, and by restoring a snapshot of that state, as a list of
+    (method, seconds) tuples.
+    """
+    directory = tempfile.mkdtemp()
+    dataset = os.path.join(directory, 'dataset.json')
+    snapshot = os.path.join(directory, 'dataset.snapshot')
+    try:
+        with open(dataset, 'w') as f:
+            json.dump(make_log(num_customers, num_events), f)
+        t1 = time.perf_counter()
+        customers, store = load_dataset(dataset)
+        t2 = time.perf_counter()
+        save_snapshot(snapshot, customers, store)
+        t3 = time.perf_counter()
+        load_snapshot(snapshot)
+        t4 = time.perf_counter()
+    finally:
+        shutil.rmtree(directory)
+    return [('replay', t2 - t1), ('snapshot', t4 - t3)]
+
+
+def bench_location_index(num_calls: int = 10000000, num_queries: int = 20,
+                         box_size: float = 0.02) -> list[tuple[str, float]]:
+    """ Return the time taken to find the calls made or received in
+    <num_queries> random square areas <box_size> degrees wide, among
+    <num_calls> calls spread uniformly over the map, by checking every call
+    and with a GridIndex, as a list of (method, seconds per query) tuples.
+    The time taken to build the index is included as well.
+    """
+    rng = np.random.default_rng(148)
+    lon = rng.uniform(BENCH_MIN[0], BENCH_MAX[0], (2, num_calls))
+    lat = rng.uniform(BENCH_MIN[1], BENCH_MAX[1], (2, num_calls))
+    boxes = [(x, y, x + box_size, y + box_size) for x, y in zip(
+        rng.uniform(BENCH_MIN[0], BENCH_MAX[0] - box_size, num_queries),
+        rng.uniform(BENCH_MIN[1], BENCH_MAX[1] - box_size, num_queries))]
+
+    t1 = time.perf_counter()
+    for x0, y0, x1, y1 in boxes:
+        np.flatnonzero(
+            ((x0 <= lon[0]) & (lon[0] <= x1) & (y0 <= lat[0]) & (lat[0] <= y1))
+            | ((x0 <= lon[1]) & (lon[1] <= x1)
+               & (y0 <= lat[1]) & (lat[1] <= y1)))
+    t2 = time.perf_counter()
+    index = GridIndex(lon[0], lat[0], lon[1], lat[1])
+    t3 = time.perf_counter()
+    for box in boxes:
+        index.query(*box)
+    t4 = time.perf_counter()
+    return [('scan', (t2 - t1) / num_queries), ('build', t3 - t2),
+            ('index', (t4 - t3) / num_queries)]
+
+
+def bench_duration_index(num_calls: int = 10000000,
+                         thresholds: tuple[int, ...] = (590, 300, 10)) \
+        -> list[tuple[str, float]]:
+    """ Return the time taken to find the calls longer than each of the
+    <thresholds> among <num_calls> calls lasting up to 600 seconds, by
+    checking every duration and with a SortedIndex, as a list of
+    (method and threshold, seconds) tuples.
+    """
+    durations = np.random.default_rng(148).integers(1, 600, num_calls)
+    index = SortedIndex(durations)
+    results = []
+    for threshold in thresholds:
+        t1 = time.perf_counter()
+        np.flatnonzero(durations > threshold)
+        t2 = time.perf_counter()
+        index.greater_than(threshold)
+        t3 = time.perf_counter()
+        results.append((f'scan G{threshold:03d}', t2 - t1))
+        results.append((f'index G{threshold:03d}', t3 - t2))
+    return results
+
+
+def bench_parallel_filters(num_calls: int = 4000000,
+                           worker_counts: tuple[int, ...] = (1, 2, 4),
+                           repeat: int = 5) -> list[tuple[int, float]]:
+    """ Return the time taken to apply a location filter <repeat> times to
+    half of <num_calls> calls spread uniformly over the map, with a FilterPool
+    of each of the <worker_counts> worker processes, as a list of (number of
+    workers, seconds per filter) tuples.
+
+    The filter is applied to every other call, rather than to all of the
+    calls, so that each call is checked instead of using the spatial index.
+    The speedup is bounded by the number of cores of the machine.
+    """
+    store = _random_store(num_calls)
+    return _time_pool(store, store.select(np.arange(0, num_calls, 2)),
+                      LocationFilter(), '-79.6, 43.6, -79.4, 43.7',
+                      worker_counts, repeat)
+
+
+def bench_parallel_root_filters(num_calls: int = 2000000,
+                                worker_counts: tuple[int, ...] = (1, 2, 4),
+                                repeat: int = 5) -> list[tuple[int, float]]:
+    """ Return the time taken to apply a duration filter <repeat> times to
+    all of <num_calls> calls, as the application does before any other
+    filter, with a FilterPool of each of the <worker_counts> worker
+    processes, as a list of (number of workers, seconds per filter) tuples.
+
+    The duration index of the root store answers the filter, so it is applied
+    in the main process, and takes the same time for any number of workers.
+    """
+    store = _random_store(num_calls)
+    store.duration_index()
+    return _time_pool(store, store, DurationFilter(), 'G590', worker_counts,
+                      repeat)
+
+
+def _random_store(num_calls: int) -> CallStore:
+    """ Return a store of <num_calls> calls spread uniformly over the map,
+    without the Call objects.
+    """
+    rng = np.random.default_rng(148)
+    columns = {
+        'durations': rng.integers(1, 600, num_calls),
+        'timestamps': np.zeros(num_calls, dtype=np.int64),
+        'src_lines': np.zeros(num_calls, dtype=np.int64),
+        'dst_lines': np.zeros(num_calls, dtype=np.int64),
+        'src_lon': rng.uniform(BENCH_MIN[0], BENCH_MAX[0], num_calls),
+        'src_lat': rng.uniform(BENCH_MIN[1], BENCH_MAX[1], num_calls),
+        'dst_lon': rng.uniform(BENCH_MIN[0], BENCH_MAX[0], num_calls),
+        'dst_lat': rng.uniform(BENCH_MIN[1], BENCH_MAX[1], num_calls),
+    }
+    return CallStore.from_columns(np.empty(num_calls, dtype=object),
+                                  columns, ['000-0000'], copy=False)
+
+
+def _time_pool(store: CallStore, data: CallStore, f: Filter,
+               filter_string: str, worker_counts: tuple[int, ...],
+               repeat: int) -> list[tuple[int, float]]:
+    """ Return the time taken to apply the filter <f> specified in
+    <filter_string> <repeat> times to the calls <data> selected from <store>,
+    with a FilterPool of each of the <worker_counts> worker processes, as a
+    list of (number of workers, seconds per filter) tuples.
+    """
+    results = []
+    for workers in worker_counts:
+        pool = FilterPool(store, [], workers)
+        try:
+            # the workers set themselves up in the background, which would
+            # take the time of the cores away from the filters: a first
+            # filter, split between them, waits until they are ready
+            pool.apply(f, [], store.select(np.arange(0, len(store), 2)),
+                       filter_string)
+            t1 = time.perf_counter()
+            for _ in range(repeat):
+                pool.apply(f, [], data, filter_string)
+            t2 = time.perf_counter()
+        finally:
+            pool.close()
+        results.append((workers, (t2 - t1) / repeat))
+    return results
+
+
+def bench_idle_cpu(seconds: float = 2.0, num_calls: int = 10000) \
+        -> list[tuple[str, float]]:
+    """ Return the share of a core used by the main loop of the application
+    while the user does nothing, over <seconds> seconds with <num_calls>
+    calls displayed: drawing a frame on every iteration as fast as possible,
+    and only drawing the frames that changed, at most MAX_FPS per second, as
+    a list of (method, share) tuples.
+
+    This opens the windows of the visualizer, so it needs a display.
+    """
+    # only this benchmark needs Pygame and Tk
+    from visualizer import Visualizer
+
+    v = Visualizer()
+    log = make_log(num_calls // 10, num_calls)
+    customers = create_customers(log)
+    store = CallStore()
+    process_event_history(log, customers, store=store)
+    drawables = [d for call in store for d in call.get_drawables()]
+    drawables.extend(call.get_connection() for call in store)
+
+    results = []
+    for method in ('every frame', 'on change'):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        while time.perf_counter() - wall < seconds:
+            v.handle_window_events(customers, store)
+            if method == 'every frame':
+                v.invalidate()
+            v.render_drawables(drawables)
+            if method == 'on change':
+                v.wait_frame()
+        results.append((method, (time.process_time() - cpu)
+                        / (time.perf_counter() - wall)))
+    return results
+
+
+def print_results(title: str, results: list[tuple[int, float]]) -> None:
+    """ Print the (size, seconds) pairs in <results> under <title>.
+    """
+    print(title)
+    for size, seconds in results:
+        print(f'  {size:>10}: {seconds:.4f}s '
+              f'({seconds / max(size, 1) * 1e6:.2f}us each)')
+
+
+if __name__ == '__main__':
+    print_results('Ingest (events):', bench_ingest())
+    print('Memory per call (bytes):')
+    for layout, size in bench_call_memory():
+        print(f'  {layout:>10}: {size:.1f}')
+    print('Parsing the event times of dataset.json x1000:')
+    for parser, seconds in bench_time_parsing():
+        print(f'  {parser:>10}: {seconds:.4f}s')
+    print('Billing 100000 calls:')
+    for method, seconds in bench_billing():
+        print(f'  {method:>10}: {seconds:.4f}s')
+    print('Looking up 12 months of bills of 2000 customers x5:')
+    for method, seconds in bench_bill_lookups():
+        print(f'  {method:>10}: {seconds:.4f}s')
+    print('Calls of the last 7 days of each line, after 200000 events:')
+    for method, seconds in bench_history_range():
+        print(f'  {method:>10}: {seconds:.4f}s')
+    print('Location queries over 10000000 calls:')
+    for method, seconds in bench_location_index():
+        print(f'  {method:>10}: {seconds:.4f}s')
+    print('Duration queries over 10000000 calls:')
+    for method, seconds in bench_duration_index():
+        print(f'  {method:>10}: {seconds:.4f}s')
+    print('Location filter over 2000000 calls (workers):')
+    for workers, seconds in bench_parallel_filters():
+        print(f'  {workers:>10}: {seconds:.4f}s')
+    print('Duration filter over all of 2000000 calls (workers):')
+    for workers, seconds in bench_parallel_root_filters():
+        print(f'  {workers:>10}: {seconds:.4f}s')
+    print('Idle main loop with 10000 calls (share of a core):')
+    for method, share in bench_idle_cpu():
+        print(f'  {method:>10}: {share:.1%}')
+    print('Restoring the state after 100000 events:')
+    for method, seconds in bench_snapshot():
+        print(f'  {method:>10}: {seconds:.4f}s')
@@ -0,0 +1,211 @@
+"""
+CSC148, Winter 2025
+Assignment 1
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) 2025 Bogdan Simion, Diane Horton, Jacqueline Smith
+
+=== Module Description ===
+
+This file contains a batch billing engine, which bills all of the calls made
+in a month at once using NumPy, instead of one call at a time through
+Contract.bill_call. The calls are grouped by phone line and by contract type,
+and the resulting bills are the same as the ones produced by billing every
+call in turn.
+"""
+from typing import Optional
+
+import numpy as np
+
+from callstore import CallStore
+from contract import PrepaidContract, TermContract, PREPAID_MINS_COST
+from customer import Customer
+from phoneline import PhoneLine
+
+# Contract types, as grouped by the billing engine
+_NO_LINE = 0
+_MTM = 1
+_TERM = 2
+_PREPAID = 3
+
+
+def call_minutes(durations: np.ndarray) -> np.ndarray:
+    """ Return the number of minutes billed for calls lasting <durations>
+    seconds: every started minute is billed.
+    """
+    return (durations.astype(np.int64) + 59) // 60
+
+
+def _contract_kinds(lines: list[Optional[PhoneLine]]) -> np.ndarray:
+    """ Return an array with the contract type of each of the <lines>.
+    """
+    kinds = np.full(len(lines), _NO_LINE, dtype=np.int8)
+    for i, line in enumerate(lines):
+        if line is None:
+            continue
+        if isinstance(line.contract, TermContract):
+            kinds[i] = _TERM
+        elif isinstance(line.contract, PrepaidContract):
+            kinds[i] = _PREPAID
+        else:
+            kinds[i] = _MTM
+    return kinds
+
+
+def _term_usage(line_index: np.ndarray, minutes: np.ndarray,
+                free: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """ Return the billed minutes and the free minutes left for each line,
+    after billing the calls lasting <minutes> made by the lines in
+    <line_index> under term contracts, in order. <free> holds the free
+    minutes left on the bill of each line before these calls.
+
+    This follows TermContract.bill_call exactly: while each call is shorter
+    than the free minutes left, it is not billed, and the free minutes left
+    become the length of that call. The first call that is not shorter is
+    billed for the minutes it goes over, and every later call in the month
+    is billed in full.
+    """
+    billed = np.zeros(len(free), dtype=np.int64)
+    free = free.copy()
+    if len(line_index) == 0:
+        return billed, free
+
+    # group the calls by line, keeping them in order within each line
+    order = np.argsort(line_index, kind='stable')
+    line_index = line_index[order]
+    minutes = minutes[order]
+    starts = np.flatnonzero(np.r_[True, line_index[1:] != line_index[:-1]])
+    lines = line_index[starts]
+
+    # free minutes left before each call, if no call was billed so far
+    before = np.empty_like(minutes)
+    before[1:] = minutes[:-1]
+    before[starts] = free[lines]
+    over = before - minutes <= 0
+
+    # number of calls of the line that went over the free minutes left, up to
+    # and including each call
+    over_count = np.cumsum(over)
+    group_base = over_count[starts] - over[starts]
+    over_count -= np.repeat(group_base, np.diff(np.r_[starts, len(over)]))
+
+    first_over = over & (over_count == 1)
+    call_billed = np.where(first_over, minutes - before,
+                           np.where(over_count > 0, minutes, 0))
+    billed[:] = np.bincount(line_index, weights=call_billed,
+                            minlength=len(free)).round().astype(np.int64)
+
+    ends = np.r_[starts[1:], len(over)] - 1
+    free[lines] = np.where(over_count[ends] > 0, 0, minutes[ends])
+    return billed, free
+
+
+def bill_calls(lines: list[Optional[PhoneLine]], line_index: np.ndarray,
+               durations: np.ndarray,
+               kinds: Optional[np.ndarray] = None) -> None:
+    """ Bill the calls lasting <durations> seconds, made by the phone lines
+    <lines>[i] for each i in <line_index>, in chronological order, onto the
+    current bill of each line.
+
+    Calls made by a line that is None are ignored. <kinds> is the contract
+    type of each line, as returned by _contract_kinds; it is computed from
+    <lines> if it is not given.
+
+    Precondition:
+    - all of the calls were made in the same month, and every line in <lines>
+    has already been advanced to that month
+    - every contract is a MTMContract, a TermContract or a PrepaidContract
+    """
+    if kinds is None:
+        kinds = _contract_kinds(lines)
+    minutes = call_minutes(durations)
+    call_kinds = kinds[line_index]
+    num_lines = len(lines)
+
+    # MTM and prepaid contracts bill every minute of every call
+    full = (call_kinds == _MTM) | (call_kinds == _PREPAID)
+    billed = np.bincount(line_index[full], weights=minutes[full],
+                         minlength=num_lines).round().astype(np.int64)
+
+    term = call_kinds == _TERM
+    free = np.zeros(num_lines, dtype=np.int64)
+    for i in np.unique(line_index[term]):
+        free[i] = lines[i].contract.bill.free_min
+    term_billed, free = _term_usage(line_index[term], minutes[term], free)
+    billed += term_billed
+
+    # the cost of each call is added to the balance in turn, as in
+    # PrepaidContract.bill_call, so that the balance is rounded the same way
+    prepaid = call_kinds == _PREPAID
+    order = np.argsort(line_index[prepaid], kind='stable')
+    prepaid_lines = line_index[prepaid][order]
+    costs = (minutes[prepaid][order] * PREPAID_MINS_COST).tolist()
+    bounds = np.searchsorted(prepaid_lines, np.arange(num_lines + 1)).tolist()
+
+    for i in np.flatnonzero(np.bincount(line_index, minlength=num_lines)):
+        if kinds[i] == _NO_LINE:
+            continue
+        contract = lines[i].contract
+        contract.bill.add_billed_minutes(int(billed[i]))
+        if kinds[i] == _TERM:
+            contract.bill.free_min = int(free[i])
+        elif kinds[i] == _PREPAID:
+            balance = contract.balance
+            for cost in costs[bounds[i]:bounds[i + 1]]:
+                balance += cost
+            contract.balance = balance
+
+
+def bill_store(customer_list: list[Customer], store: CallStore,
+               months: Optional[list[tuple[int, int]]] = None) -> None:
+    """ Bill all of the calls in <store>, month by month, onto the phone lines
+    of the customers in <customer_list>. Before billing the calls of a month,
+    all customers are advanced to that month.
+
+    <months> lists the (month, year) billing cycles to advance through, in
+    chronological order. If it is None, the months in which the calls of
+    <store> were made are used.
+
+    Precondition:
+    - the calls in <store> are in chronological order, and have not been
+    billed yet
+    - the months of all calls in <store> are included in <months>
+    """
+    numbers = {}
+    for customer in customer_list:
+        for number in customer.get_phone_numbers():
+            numbers[number] = customer.get_phone_line(number)
+    lines = [numbers.get(number) for number in store.numbers()]
+    kinds = _contract_kinds(lines)
+
+    call_months = store.timestamps.astype('datetime64[s]') \
+        .astype('datetime64[M]').astype(np.int64)
+    if months is None:
+        keys = np.unique(call_months)
+        months = [(int(k) % 12 + 1, int(k) // 12 + 1970) for k in keys]
+
+    for month, year in months:
+        for customer in customer_list:
+            customer.new_month(month, year)
+        selected = call_months == (year - 1970) * 12 + month - 1
+        if selected.any():
+            bill_calls(lines, store.src_lines[selected],
+                       store.durations[selected], kinds)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'typing', 'numpy',
+            'callstore', 'contract', 'customer', 'phoneline'
+        ],
+        'generated-members': 'pygame.*'
+    })
@@ -0,0 +1,181 @@
+"""
+CSC148, Winter 2025
+Assignment 1
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) 2025 Bogdan Simion, Diane Horton, Jacqueline Smith
+
+=== Module Description ===
+
+This file contains the monthly bill run, which generates the bill of every
+customer for a billing cycle without the visualization, and writes them to a
+CSV or JSON-Lines file.
+
+The customers are split into chunks, which are formatted by a pool of worker
+processes. Each worker loads the customers from a snapshot file, instead of
+having them all copied to it. The chunks are written as soon as they are
+ready, in the order of the customers, so the whole run is never held in
+memory.
+
+Run this module directly to bill all of the customers of a dataset, e.g.:
+    python billrun.py 1 2018 bills.csv --snapshot dataset.snapshot
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import Optional, TextIO
+
+from application import load_dataset
+from customer import Customer
+from parallel import NUM_WORKERS
+from snapshot import load_snapshot, save_snapshot
+
+# Output formats of the bill run
+FORMATS = ('csv', 'jsonl')
+
+# Columns of the CSV output, which has one row per phone line
+CSV_COLUMNS = ['customer_id', 'month', 'year', 'number', 'type', 'fixed',
+               'free_mins', 'billed_mins', 'min_rate', 'total']
+
+# Number of chunks given to each worker process
+CHUNKS_PER_WORKER = 4
+
+# The customers and the billing cycle of a worker process, set up by
+# _init_worker
+_worker_customers: list[Customer] = []
+_worker_cycle: tuple[int, int, str] = (0, 0, 'csv')
+
+
+def format_bills(customers: list[Customer], month: int, year: int,
+                 fmt: str) -> str:
+    """ Return the bills of the <customers> for the <month> and <year>
+    billing cycle, in the output format <fmt>, without the CSV header.
+
+    In the CSV format, each phone line with a bill is on its own row. In the
+    JSON-Lines format, each customer is on its own line, with the bills of
+    all of its phone lines.
+    """
+    out = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(out, lineterminator='\n')
+        for customer in customers:
+            cid, _, bills = customer.generate_bill(month, year)
+            for bill in bills:
+                writer.writerow([cid, month, year] + [
+                    bill[column] for column in CSV_COLUMNS[3:]])
+    else:
+        for customer in customers:
+            cid, total, bills = customer.generate_bill(month, year)
+            out.write(json.dumps({'customer_id': cid, 'month': month,
+                                  'year': year, 'total': total,
+                                  'lines': bills}))
+            out.write('\n')
+    return out.getvalue()
+
+
+def _init_worker(snapshot_file: str, month: int, year: int,
+                 fmt: str) -> None:
+    """ Set up a worker process, to format the bills of the customers saved in
+    the snapshot file <snapshot_file> for the <month> and <year> billing
+    cycle in the output format <fmt>.
+    """
+    global _worker_customers, _worker_cycle
+    _worker_customers = load_snapshot(snapshot_file)[0]
+    _worker_cycle = (month, year, fmt)
+
+
+def _format_chunk(bounds: tuple[int, int]) -> str:
+    """ Return the formatted bills of the customers of this worker from the
+    positions <bounds>[0] to <bounds>[1].
+    """
+    month, year, fmt = _worker_cycle
+    return format_bills(_worker_customers[bounds[0]:bounds[1]], month, year,
+                        fmt)
+
+
+def run_bills(customers: list[Customer], month: int, year: int,
+              out: TextIO, fmt: str = 'csv',
+              workers: int = NUM_WORKERS,
+              snapshot_file: Optional[str] = None) -> tuple[int, float]:
+    """ Write the bills of all of the <customers> for the <month> and <year>
+    billing cycle to <out>, in the output format <fmt>, using <workers>
+    worker processes. Return the number of customers billed and the time it
+    took, in seconds.
+
+    The worker processes load the customers from the snapshot file
+    <snapshot_file>. If it is None, the <customers> are saved into a
+    temporary snapshot file for them.
+
+    Precondition:
+    - fmt in FORMATS
+    - if <snapshot_file> is given, it holds the <customers>, in order
+    """
+    start = time.perf_counter()
+    if fmt == 'csv':
+        out.write(','.join(CSV_COLUMNS) + '\n')
+
+    workers = max(1, min(workers, len(customers)))
+    if workers == 1:
+        out.write(format_bills(customers, month, year, fmt))
+        return len(customers), time.perf_counter() - start
+
+    size = -(-len(customers) // (workers * CHUNKS_PER_WORKER))
+    chunks = [(i, i + size) for i in range(0, len(customers), size)]
+    with tempfile.TemporaryDirectory() as directory:
+        if snapshot_file is None:
+            snapshot_file = os.path.join(directory, 'customers.snapshot')
+            save_snapshot(snapshot_file, customers)
+        with multiprocessing.Pool(workers, _init_worker,
+                                  (snapshot_file, month, year, fmt)) as pool:
+            for text in pool.imap(_format_chunk, chunks):
+                out.write(text)
+    return len(customers), time.perf_counter() - start
+
+
+def main(args: Optional[list[str]] = None) -> None:
+    """ Bill all of the customers of a dataset for a billing cycle, as given
+    by the command line arguments <args>, and report the throughput.
+    """
+    parser = argparse.ArgumentParser(
+        description='Generate the bills of all customers for a month.')
+    parser.add_argument('month', type=int)
+    parser.add_argument('year', type=int)
+    parser.add_argument('output', help='the file the bills are written to')
+    parser.add_argument('--format', choices=FORMATS, default=None,
+                        help='the output format; by default, jsonl for '
+                             'a .jsonl output file, and csv otherwise')
+    parser.add_argument('--dataset', default='dataset.json')
+    parser.add_argument('--snapshot', default=None,
+                        help='a snapshot file the customers are restored '
+                             'from, or saved into if it is missing or older '
+                             'than the dataset')
+    parser.add_argument('--workers', type=int, default=NUM_WORKERS)
+    options = parser.parse_args(args)
+
+    fmt = options.format
+    if fmt is None:
+        fmt = 'jsonl' if options.output.endswith('.jsonl') else 'csv'
+    customers, _ = load_dataset(options.dataset, options.snapshot)
+    with open(options.output, 'w', newline='', encoding='utf-8') as out:
+        count, seconds = run_bills(customers, options.month, options.year,
+                                   out, fmt, options.workers,
+                                   options.snapshot)
+    print(f'Billed {count} customers in {seconds:.2f}s '
+          f'({count / max(seconds, 1e-9):.0f} customers/s)')
+
+
+if __name__ == '__main__':
+    main()
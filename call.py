@@ -12,68 +12,46 @@ All of the files in this directory and all subdirectories are:
 Copyright (c) 2025 Bogdan Simion, Diane Horton, Jacqueline Smith
 """
 import datetime
-import os
-from typing import Optional
-import pygame
+import struct
+import sys
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from drawable import Drawable
 
 
 # Sprite files to display the start and end of a call
 START_CALL_SPRITE = 'data/call-start-2.png'
 END_CALL_SPRITE = 'data/call-end-2.png'
 
+# Layout of the source and destination coordinates packed into a Call:
+# source longitude, source latitude, destination longitude, destination latitude
+_COORDS = struct.Struct('4d')
 
-# ----------------------------------------------------------------------------
-# NOTE: You do not need to understand the implementation of the Drawable class
-# to be able to solve this assignment. However, feel feel free to read it for
-# the fun of understanding the visualization system.
-# ----------------------------------------------------------------------------
+# Start of the epoch used for the timestamps of calls
+_EPOCH = datetime.datetime(1970, 1, 1)
+_SECOND = datetime.timedelta(seconds=1)
 
-class Drawable:
-    """A class for objects that the graphical renderer can draw.
+# Billing dates of calls, keyed by themselves, so that all calls made in the
+# same month share a single (month, year) tuple
+_bill_dates: dict[tuple[int, int], tuple[int, int]] = {}
 
-    === Public Attributes ===
-    sprite:
-        image object for this drawable or None.
-        If none, then must have linelimits
-    linelimits:
-        limits for the line of the connection or None.
-        If none, then must have sprite
-    loc: location (longitude/latitude pair)
+
+def __getattr__(name: str) -> Any:
+    """ Give access to the Drawable class through this module, without
+    importing Pygame until it is actually used.
     """
-    sprite: Optional[pygame.Surface]
-    linelimits: Optional[tuple[float, float]]
-    loc: Optional[tuple[float, float]]
-
-    def __init__(self, sprite_file: Optional[str] = None,
-                 location: Optional[tuple[float, float]] = None,
-                 linelimits: Optional[tuple[tuple[float, float],
-                                            tuple[float, float]]] = None) \
-            -> None:
-        """Initialize this drawable object with the <sprite_file>, <location>
-        and <linelimits>.
-        """
-        self.linelimits = None
-        self.sprite = None
-        self.loc = None
-
-        if sprite_file is not None and location is not None:
-            self.sprite = pygame.transform.smoothscale(
-                pygame.image.load(os.path.join(os.path.dirname(__file__),
-                                               sprite_file)), (13, 13))
-            self.loc = location
-        else:
-            self.linelimits = linelimits
-
-    def get_position(self) -> tuple[float, float]:
-        """Return the (long, lat) position of this object at the given time.
-        """
-        return self.loc
+    if name == 'Drawable':
+        from drawable import Drawable
+        return Drawable
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    def get_linelimits(self) -> Optional[tuple[float, float]]:
-        """Return the limits for the line if the drawable is a line type
-        (otherwise None)
-        """
-        return self.linelimits
+
+def timestamp_at(moment: datetime.datetime) -> int:
+    """ Return the timestamp of the first whole second at or after <moment>,
+    which is the earliest timestamp of a Call made at <moment> or later.
+    """
+    return -((_EPOCH - moment) // _SECOND)
 
 
 class Call:
@@ -94,23 +72,39 @@ class Call:
     dst_loc:
          location of the destination of this Call; a Tuple containing the
          longitude and latitude coordinates
-    drawables:
-         sprites for drawing the source and destination of this Call
-    connection:
-         connecting line between the two sprites representing the source and
-         destination of this Call
+    timestamp:
+         date and time of this Call, as a whole number of seconds since
+         1970-01-01 00:00:00
+
+    Since there can be tens of millions of calls in memory, a Call is stored
+    compactly: it has no __dict__, its phone numbers are interned so that all
+    calls share a single string per number, its date and time are kept as the
+    integer <timestamp>, and its coordinates are packed into a single bytes
+    object. The <time>, <src_loc> and <dst_loc> attributes are computed from
+    these when they are accessed, and cannot be reassigned. The time of a Call
+    is only kept to the second. The billing date of the Call is computed once,
+    and shared with all other calls made in the same month.
+
+    A Call only holds its data. The sprites and the connecting line used to
+    display it are created on demand, by get_drawables and get_connection, so
+    that calls which are never displayed do not need Pygame.
 
     === Representation Invariants ===
     -   duration >= 0
     """
+    __slots__ = ('src_number', 'dst_number', 'timestamp', 'duration',
+                 '_coords', '_bill_date')
     src_number: str
     dst_number: str
-    time: datetime.datetime
+    timestamp: int
     duration: int
-    src_loc: tuple[float, float]
-    dst_loc: tuple[float, float]
-    drawables: list[Drawable]
-    connection: Drawable
+    # === Private Attributes ===
+    # _coords:
+    #     the source and destination coordinates, packed with _COORDS
+    # _bill_date:
+    #     the (month, year) billing date of this Call
+    _coords: bytes
+    _bill_date: tuple[int, int]
 
     def __init__(self, src_nr: str, dst_nr: str,
                  calltime: datetime.datetime, duration: int,
@@ -118,24 +112,61 @@ class Call:
             -> None:
         """ Create a new Call object with the given parameters.
         """
-        self.src_number = src_nr
-        self.dst_number = dst_nr
-        self.time = calltime
+        self.src_number = sys.intern(src_nr)
+        self.dst_number = sys.intern(dst_nr)
+        self.timestamp = (calltime - _EPOCH) // _SECOND
         self.duration = duration
-        self.src_loc = src_loc
-        self.dst_loc = dst_loc
-        self.drawables = [Drawable(sprite_file=START_CALL_SPRITE,
-                                   location=src_loc),
-                          Drawable(sprite_file=END_CALL_SPRITE,
-                                   location=dst_loc)]
+        self._coords = _COORDS.pack(src_loc[0], src_loc[1],
+                                    dst_loc[0], dst_loc[1])
+        bill_date = (calltime.month, calltime.year)
+        self._bill_date = _bill_dates.setdefault(bill_date, bill_date)
+
+    @classmethod
+    def from_packed(cls, src_nr: str, dst_nr: str, timestamp: int,
+                    duration: int, coords: bytes,
+                    bill_date: tuple[int, int]) -> 'Call':
+        """ Return a new Call made at <timestamp>, with the source and
+        destination coordinates packed in <coords>, and the billing date
+        <bill_date>, as stored by a Call.
+
+        This is used to recreate saved calls without going through a datetime.
+
+        Precondition: <bill_date> is the (month, year) of <timestamp>.
+        """
+        call = cls.__new__(cls)
+        call.src_number = sys.intern(src_nr)
+        call.dst_number = sys.intern(dst_nr)
+        call.timestamp = timestamp
+        call.duration = duration
+        call._coords = coords
+        call._bill_date = _bill_dates.setdefault(bill_date, bill_date)
+        return call
+
+    @property
+    def time(self) -> datetime.datetime:
+        """ Return the date and time of this Call.
+        """
+        return _EPOCH + datetime.timedelta(seconds=self.timestamp)
 
-        self.connection = Drawable(linelimits=(src_loc, dst_loc))
+    @property
+    def src_loc(self) -> tuple[float, float]:
+        """ Return the (longitude, latitude) location of the source of this
+        Call.
+        """
+        return _COORDS.unpack(self._coords)[:2]
+
+    @property
+    def dst_loc(self) -> tuple[float, float]:
+        """ Return the (longitude, latitude) location of the destination of
+        this Call.
+        """
+        return _COORDS.unpack(self._coords)[2:]
 
     def get_bill_date(self) -> tuple[int, int]:
         """ Return the billing date for this Call, as a tuple containing the
         month and the year
         """
-        return self.time.month, self.time.year
+        return self._bill_date
 
     # ----------------------------------------------------------
     # NOTE: You do not need to understand the implementation of
@@ -143,16 +174,21 @@ class Call:
     # but feel free to read them to get a sense of what these do.
     # ----------------------------------------------------------
 
-    def get_drawables(self) -> list[Drawable]:
+    def get_drawables(self) -> list['Drawable']:
         """ Return the list of drawable sprites for this Call
         """
-        return self.drawables
+        from drawable import Drawable
+        return [Drawable(sprite_file=START_CALL_SPRITE,
+                         location=self.src_loc),
+                Drawable(sprite_file=END_CALL_SPRITE,
+                         location=self.dst_loc)]
 
-    def get_connection(self) -> Drawable:
+    def get_connection(self) -> 'Drawable':
         """ Return the connecting line for this Call start and end locations
         """
-        return self.connection
-    
+        from drawable import Drawable
+        return Drawable(linelimits=(self.src_loc, self.dst_loc))
+
     def __str__(self) -> str:
         """ Return the string representation of a Call"""
         return "srcnum" + self.src_number + "srcdst" + self.dst_number + "time"\
@@ -164,8 +200,9 @@ if __name__ == '__main__':
     import python_ta
     python_ta.check_all(config={
         'allowed-import-modules': [
-            'python_ta', 'typing', 'datetime', 'os', 'pygame'
+            'python_ta', 'typing', 'datetime', 'drawable',
+            'struct', 'sys'
         ],
-        'disable': ['R0902', 'R0913'],
+        'disable': ['R0902', 'R0913', 'C0415'],
         'generated-members': 'pygame.*'
     })
@@ -11,7 +11,16 @@ any changes, are expressly prohibited.
 All of the files in this directory and all subdirectories are:
 Copyright (c) 2025 Bogdan Simion, Diane Horton, Jacqueline Smith
 """
-from call import Call
+import datetime
+from bisect import bisect_left, insort
+from itertools import chain
+from operator import attrgetter
+from typing import Iterator
+
+from call import Call, timestamp_at
+
+# Key of the calls of a month, which are sorted by time
+_call_time = attrgetter('timestamp')
 
 
 class CallHistory:
@@ -24,6 +33,10 @@ class CallHistory:
     outgoing_calls:
          Dictionary of outgoing calls. Keys are tuples containing a month and a
          year, values are a List of Call objects for that month and year.
+
+    === Representation Invariants ===
+    - the calls of each month are sorted chronologically, so that the calls
+    made in any period can be found with a binary search
     """
     incoming_calls: dict[tuple[int, int], list[Call]]
     outgoing_calls: dict[tuple[int, int], list[Call]]
@@ -37,30 +50,12 @@ class CallHistory:
     def register_outgoing_call(self, call: Call) -> None:
         """ Register a Call <call> into this outgoing call history
         """
-        call_month = call.time.month
-        call_year = call.time.year
-
-        # check if date of call is already in dict
-        if (call_month, call_year) in self.outgoing_calls:
-            self.outgoing_calls[(call_month, call_year)].append(call)
-
-        else:
-            # create entry in call history and add this call
-            self.outgoing_calls[(call_month, call_year)] = [call]
+        _register(self.outgoing_calls, call)
 
     def register_incoming_call(self, call: Call) -> None:
         """ Register a Call <call> into this incoming call history
         """
-        call_month = call.time.month
-        call_year = call.time.year
-
-        # check if date of call is already in dict
-        if (call_month, call_year) in self.incoming_calls:
-            self.incoming_calls[(call_month, call_year)].append(call)
-
-        else:
-            # create entry in call history and add this call
-            self.incoming_calls[(call_month, call_year)] = [call]
+        _register(self.incoming_calls, call)
 
     # ----------------------------------------------------------
     # NOTE: You do not need to understand the implementation of
@@ -84,30 +79,115 @@ class CallHistory:
         """
         monthly_history = ([], [])
         if month is not None and year is not None:
-            if (month, year) in self.outgoing_calls:
-                for call in self.outgoing_calls[(month, year)]:
-                    monthly_history[0].append(call)
-
-            if (month, year) in self.incoming_calls:
-                for call in self.incoming_calls[(month, year)]:
-                    monthly_history[1].append(call)
+            monthly_history[0].extend(self.outgoing_calls.get((month, year),
+                                                              ()))
+            monthly_history[1].extend(self.incoming_calls.get((month, year),
+                                                              ()))
         else:
-            for entry in self.outgoing_calls:
-                for call in self.outgoing_calls[entry]:
-                    monthly_history[0].append(call)
-            for entry in self.incoming_calls:
-                for call in self.incoming_calls[entry]:
-                    monthly_history[1].append(call)
+            for calls in self.outgoing_calls.values():
+                monthly_history[0].extend(calls)
+            for calls in self.incoming_calls.values():
+                monthly_history[1].extend(calls)
         return monthly_history
 
+    def iter_outgoing(self, month: int = None, year: int = None) \
+            -> Iterator[Call]:
+        """ Return an iterator over the outgoing calls for <month> and <year>,
+        or over all outgoing calls from this call history if <month> and
+        <year> are both None, in the order of get_monthly_history.
+
+        The calls are read from this call history as the iterator is used,
+        without copying them. This call history must not change while the
+        iterator is used.
+
+        Precondition: <month> and <year> are either both specified, or are
+        both missing/None
+        """
+        return _iter_calls(self.outgoing_calls, month, year)
+
+    def iter_incoming(self, month: int = None, year: int = None) \
+            -> Iterator[Call]:
+        """ Return an iterator over the incoming calls for <month> and <year>,
+        or over all incoming calls from this call history if <month> and
+        <year> are both None, in the order of get_monthly_history.
+
+        The calls are read from this call history as the iterator is used,
+        without copying them. This call history must not change while the
+        iterator is used.
+
+        Precondition: <month> and <year> are either both specified, or are
+        both missing/None
+        """
+        return _iter_calls(self.incoming_calls, month, year)
+
+    def get_calls_between(self, start: datetime.datetime,
+                          end: datetime.datetime) \
+            -> tuple[Iterator[Call], Iterator[Call]]:
+        """ Return the outgoing and incoming calls made from <start> included
+        to <end> excluded, in chronological order, as a Tuple containing two
+        iterators in the following order:
+        (outgoing calls, incoming calls)
+
+        The calls are found with a binary search in the months of the period,
+        and are read from this call history as the iterators are used,
+        without copying them. This call history must not change while the
+        iterators are used.
+        """
+        first = timestamp_at(start)
+        last = timestamp_at(end)
+        months = ((start.year, start.month), (end.year, end.month))
+        return (_calls_between(self.outgoing_calls, first, last, months),
+                _calls_between(self.incoming_calls, first, last, months))
+
+
+def _register(calls_by_month: dict[tuple[int, int], list[Call]],
+              call: Call) -> None:
+    """ Add <call> to the calls of its month in <calls_by_month>, keeping
+    them in chronological order.
+    """
+    calls = calls_by_month.get(call.get_bill_date())
+    if calls is None:
+        calls_by_month[call.get_bill_date()] = [call]
+    elif calls[-1].timestamp > call.timestamp:
+        insort(calls, call, key=_call_time)
+    else:
+        calls.append(call)
+
+
+def _iter_calls(calls_by_month: dict[tuple[int, int], list[Call]],
+                month: int = None, year: int = None) -> Iterator[Call]:
+    """ Return an iterator over the calls of <calls_by_month> for <month> and
+    <year>, or over all of its calls if they are both None.
+    """
+    if month is not None and year is not None:
+        return iter(calls_by_month.get((month, year), ()))
+    return chain.from_iterable(calls_by_month.values())
+
+
+def _calls_between(calls_by_month: dict[tuple[int, int], list[Call]],
+                   first: int, last: int,
+                   months: tuple[tuple[int, int], tuple[int, int]]) \
+        -> Iterator[Call]:
+    """ Yield the calls of <calls_by_month> made from the timestamp <first>
+    included to <last> excluded, in chronological order. The calls are made
+    in the months from <months>[0] to <months>[1], as (year, month) tuples.
+    """
+    in_range = sorted((year, month) for month, year in calls_by_month
+                      if months[0] <= (year, month) <= months[1])
+    for year, month in in_range:
+        calls = calls_by_month[(month, year)]
+        start = bisect_left(calls, first, key=_call_time)
+        end = bisect_left(calls, last, lo=start, key=_call_time)
+        yield from map(calls.__getitem__, range(start, end))
+
 
 if __name__ == '__main__':
     import python_ta
 
     python_ta.check_all(config={
         'allowed-import-modules': [
-            'python_ta', 'typing', 'datetime', 'call'
-                                               ''
+            'python_ta', 'typing', 'datetime', 'bisect', 'itertools',
+            'operator', 'call'
         ],
         'disable': ['R0902', 'R0913'],
         'generated-members': 'pygame.*'
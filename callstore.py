@@ -0,0 +1,508 @@
+"""
+CSC148, Winter 2025
+Assignment 1
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) 2025 Bogdan Simion, Diane Horton, Jacqueline Smith
+
+=== Module Description ===
+
+This file contains the CallStore class, which stores a sequence of calls
+column by column in NumPy arrays, so that the filters can select calls with
+vectorized operations over all of the calls at once, instead of looking at
+the attributes of each Call object in turn.
+"""
+from __future__ import annotations
+
+from array import array
+from typing import Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+from call import Call
+from customer import Customer
+from sortedindex import SortedIndex
+from spatialindex import GridIndex
+
+# Name and array typecode of each column of a CallStore
+_COLUMNS = {
+    'durations': 'q',
+    'timestamps': 'q',
+    'src_lines': 'q',
+    'dst_lines': 'q',
+    'src_lon': 'd',
+    'src_lat': 'd',
+    'dst_lon': 'd',
+    'dst_lat': 'd',
+}
+
+
+def _column(name: str, doc: str) -> property:
+    """ Return a read-only property giving the column <name> of a CallStore,
+    brought up to date with the calls appended to the store.
+    """
+    def get_column(store: CallStore) -> np.ndarray:
+        """ Return the column of <store>.
+        """
+        store._sync()
+        return store._columns[name]
+
+    return property(get_column, doc=doc)
+
+
+class CallStore:
+    """ An ordered sequence of calls, stored in columns.
+
+    A CallStore can be used anywhere a list of calls is expected: it has a
+    length, it can be iterated over and indexed to get the Call objects, in
+    order, and slicing it returns a new CallStore. Calls can only be appended
+    to a store created empty or copied from columns; the stores returned by
+    select and by slicing cannot be modified.
+
+    Each phone number is given an integer line id by the store, the first time
+    it is seen, so that calls can be matched against phone numbers without
+    comparing strings. All stores selected from the same store share the same
+    line ids. As calls are appended, the store keeps the positions of the
+    calls made or received by each line, so that the calls of a customer can
+    be found without looking at every call. The customers are recorded with
+    add_customer, so that a customer is found from its id without looking at
+    every customer.
+
+    === Public Attributes ===
+    durations:
+         duration in seconds of each call
+    timestamps:
+         time of each call, as seconds since 1970-01-01 00:00:00
+    src_lines:
+         line id of the source number of each call
+    dst_lines:
+         line id of the destination number of each call
+    src_lon:
+         longitude of the source of each call
+    src_lat:
+         latitude of the source of each call
+    dst_lon:
+         longitude of the destination of each call
+    dst_lat:
+         latitude of the destination of each call
+    root:
+         the CallStore holding all of the calls this store was selected from,
+         or this store itself if it was created empty
+    version:
+         the number of calls appended to this store since it was created, so
+         that results computed from this store can tell when it has changed
+
+    === Representation Invariants ===
+    - every column has one entry per call in this store, in the same order
+    """
+    root: CallStore
+    version: int
+    # === Private Attributes ===
+    # _calls:
+    #     the Call objects in this store, in order
+    # _call_objects:
+    #     the Call objects in this store as a NumPy array, or None if it has
+    #     not been built since the last call was appended
+    # _line_ids:
+    #     the line id of each phone number seen by the root store
+    # _customers:
+    #     the customers recorded by the root store, keyed by customer id
+    # _columns:
+    #     the NumPy array of each column, keyed by the name of the column
+    # _buffers:
+    #     growable columns that calls are appended to, or None if this store
+    #     cannot be modified
+    # _synced:
+    #     whether <_columns> contains every appended call
+    # _positions:
+    #     the increasing position of each call of this store in <root>, or
+    #     None if this store is <root>
+    # _spatial_index:
+    #     the spatial index over the calls of this store, or None if it has
+    #     not been built since the last call was appended
+    # _duration_index:
+    #     the index over the durations of the calls of this store, or None if
+    #     it has not been built since the last call was appended
+    # _line_calls:
+    #     the increasing positions of the calls made or received by each line,
+    #     keyed by line id, or None if this store cannot be modified
+    _calls: Union[list[Call], np.ndarray]
+    _call_objects: Optional[np.ndarray]
+    _line_ids: dict[str, int]
+    _customers: dict[int, Customer]
+    _columns: dict[str, np.ndarray]
+    _buffers: Optional[dict[str, array]]
+    _synced: bool
+    _positions: Optional[np.ndarray]
+    _spatial_index: Optional[GridIndex]
+    _duration_index: Optional[SortedIndex]
+    _line_calls: Optional[dict[int, array]]
+
+    durations = _column('durations', "duration in seconds of each call")
+    timestamps = _column('timestamps', "time of each call, in seconds")
+    src_lines = _column('src_lines', "line id of each source number")
+    dst_lines = _column('dst_lines', "line id of each destination number")
+    src_lon = _column('src_lon', "longitude of the source of each call")
+    src_lat = _column('src_lat', "latitude of the source of each call")
+    dst_lon = _column('dst_lon', "longitude of the destination of each call")
+    dst_lat = _column('dst_lat', "latitude of the destination of each call")
+
+    def __init__(self, calls: Iterable[Call] = ()) -> None:
+        """ Create a new CallStore holding the <calls>, in order.
+        """
+        self.root = self
+        self.version = 0
+        self._calls = []
+        self._call_objects = None
+        self._line_ids = {}
+        self._customers = {}
+        self._columns = {}
+        self._buffers = {name: array(code) for name, code in _COLUMNS.items()}
+        self._synced = False
+        self._positions = None
+        self._spatial_index = None
+        self._duration_index = None
+        self._line_calls = {}
+        for call in calls:
+            self.append(call)
+        self._sync()
+
+    @classmethod
+    def _from_columns(cls, root: CallStore, calls: np.ndarray,
+                      columns: dict[str, np.ndarray],
+                      positions: np.ndarray) -> CallStore:
+        """ Return a new store that cannot be modified, selected from <root>,
+        holding the <calls> with the given <columns>, which are at the given
+        <positions> in <root>.
+        """
+        store = cls.__new__(cls)
+        store.root = root
+        store.version = 0
+        store._calls = calls
+        store._call_objects = calls
+        store._line_ids = root._line_ids
+        store._customers = root._customers
+        store._columns = columns
+        store._buffers = None
+        store._synced = True
+        store._positions = positions
+        store._spatial_index = None
+        store._duration_index = None
+        store._line_calls = None
+        return store
+
+    @classmethod
+    def from_columns(cls, calls: Union[list[Call], np.ndarray],
+                     columns: dict[str, np.ndarray], numbers: list[str],
+                     copy: bool = True) -> CallStore:
+        """ Return a new store holding the <calls>, in order, whose columns are
+        already known to be <columns>, with the phone number <numbers>[i]
+        given the line id i.
+
+        If <copy> is True, the columns are copied, and calls can be appended
+        to the new store. Otherwise, the new store uses the given <columns>
+        as they are, such as arrays in shared memory, and cannot be modified.
+
+        Precondition: <columns> has every column of a CallStore, with one
+        entry per call in <calls>, as they would be computed by append.
+        """
+        store = cls()
+        store._line_ids = {number: i for i, number in enumerate(numbers)}
+        if copy:
+            store._calls = list(calls)
+            for name, code in _COLUMNS.items():
+                store._buffers[name] = array(
+                    code, np.ascontiguousarray(columns[name],
+                                               dtype=code).tobytes())
+            store._synced = False
+        else:
+            store._calls = calls
+            store._columns = {name: columns[name] for name in _COLUMNS}
+            store._buffers = None
+            store._synced = True
+
+        # group the positions of the calls by line, all at once
+        count = len(store._calls)
+        src_lines = store.src_lines
+        dst_lines = store.dst_lines
+        received = src_lines != dst_lines
+        lines = np.concatenate([src_lines, dst_lines[received]])
+        positions = np.concatenate([np.arange(count),
+                                    np.flatnonzero(received)])
+        order = np.lexsort((positions, lines))
+        lines = lines[order]
+        positions = positions[order]
+        starts = np.flatnonzero(np.r_[True, lines[1:] != lines[:-1]]) \
+            if len(lines) else np.empty(0, dtype=np.int64)
+        ends = np.r_[starts[1:], len(lines)]
+        for line, start, end in zip(lines[starts].tolist(), starts.tolist(),
+                                    ends.tolist()):
+            store._line_calls[line] = array('q', positions[start:end]
+                                            .tobytes())
+        return store
+
+    def append(self, call: Call) -> None:
+        """ Add <call> at the end of this store.
+
+        Precondition: this store was created empty, rather than selected from
+        another store.
+        """
+        src_lon, src_lat = call.src_loc
+        dst_lon, dst_lat = call.dst_loc
+        buffers = self._buffers
+        buffers['durations'].append(call.duration)
+        buffers['timestamps'].append(call.timestamp)
+        src_line = self.line_id(call.src_number, True)
+        dst_line = self.line_id(call.dst_number, True)
+        buffers['src_lines'].append(src_line)
+        buffers['dst_lines'].append(dst_line)
+        buffers['src_lon'].append(src_lon)
+        buffers['src_lat'].append(src_lat)
+        buffers['dst_lon'].append(dst_lon)
+        buffers['dst_lat'].append(dst_lat)
+        position = len(self._calls)
+        self._line_calls.setdefault(src_line, array('q')).append(position)
+        if dst_line != src_line:
+            self._line_calls.setdefault(dst_line, array('q')).append(position)
+        self._calls.append(call)
+        self.version += 1
+        self._call_objects = None
+        self._synced = False
+        self._spatial_index = None
+        self._duration_index = None
+
+    def _sync(self) -> None:
+        """ Update the NumPy columns of this store with the calls appended
+        since they were last updated.
+        """
+        if self._synced:
+            return
+        for name, buffer in self._buffers.items():
+            self._columns[name] = np.frombuffer(buffer,
+                                                dtype=buffer.typecode).copy()
+        self._synced = True
+
+    def columns(self) -> dict[str, np.ndarray]:
+        """ Return a dictionary mapping the name of each column of this store
+        to the column.
+        """
+        self._sync()
+        return dict(self._columns)
+
+    def line_id(self, number: str, create: bool = False) -> int:
+        """ Return the line id of the phone number <number>.
+
+        If <number> has not been seen by this store yet, return -1, unless
+        <create> is True, in which case a new line id is given to <number>.
+        """
+        line = self._line_ids.get(number)
+        if line is None:
+            if not create:
+                return -1
+            line = len(self._line_ids)
+            self._line_ids[number] = line
+        return line
+
+    def add_customer(self, customer: Customer) -> None:
+        """ Record the <customer>, for this store and every store selected
+        from the same root.
+        """
+        self._customers[customer.get_id()] = customer
+
+    def has_customers(self) -> bool:
+        """ Return whether any customer was recorded.
+        """
+        return bool(self._customers)
+
+    def customer_numbers(self, customer_id: int) -> Optional[list[str]]:
+        """ Return the phone numbers that the customer with id <customer_id>
+        owns now, or None if no such customer was recorded.
+        """
+        customer = self._customers.get(customer_id)
+        if customer is None:
+            return None
+        return customer.get_phone_numbers()
+
+    def numbers(self) -> list[str]:
+        """ Return the phone numbers seen by this store, so that the phone
+        number with line id i is at index i.
+        """
+        return list(self._line_ids)
+
+    def line_ids(self, numbers: Iterable[str]) -> np.ndarray:
+        """ Return an array of the line ids of the phone numbers in <numbers>
+        that have been seen by this store.
+        """
+        ids = [self._line_ids[n] for n in numbers if n in self._line_ids]
+        return np.array(ids, dtype=np.int64)
+
+    def line_positions(self, line_ids: Iterable[int]) -> np.ndarray:
+        """ Return the increasing positions in this store of the calls made or
+        received by any of the lines with the given <line_ids>.
+
+        Precondition: this store was created empty, rather than selected from
+        another store.
+        """
+        found = [np.frombuffer(self._line_calls[line], dtype=np.int64)
+                 for line in line_ids if line in self._line_calls]
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        if len(found) == 1:
+            return found[0].copy()
+        # a call between two of the lines is found twice
+        positions = np.sort(np.concatenate(found))
+        distinct = np.ones(len(positions), dtype=bool)
+        distinct[1:] = positions[1:] != positions[:-1]
+        return positions[distinct]
+
+    def select(self, selection: np.ndarray) -> CallStore:
+        """ Return a new store holding the calls of this store selected by
+        <selection>, in the same order as in this store.
+
+        <selection> is either a boolean mask with one entry per call, or an
+        array of increasing positions of calls in this store.
+        """
+        calls = self._call_array()[selection]
+        columns = {name: column[selection]
+                   for name, column in self.columns().items()}
+        return CallStore._from_columns(self.root, calls, columns,
+                                       self.positions()[selection])
+
+    def positions(self) -> np.ndarray:
+        """ Return the position in <root> of each call of this store.
+        """
+        if self._positions is None:
+            return np.arange(len(self))
+        return self._positions
+
+    def root_range(self) -> Optional[tuple[int, int]]:
+        """ Return the (start, end) positions in <root> such that this store
+        holds exactly the calls of <root> from position start, inclusive, to
+        position end, exclusive, or None if there are no such positions.
+
+        This is the case for <root> itself, and for the stores sliced from it.
+        """
+        positions = self.positions()
+        if len(positions) == 0:
+            return 0, 0
+        start = int(positions[0])
+        end = int(positions[-1]) + 1
+        if end - start != len(positions):
+            return None
+        return start, end
+
+    def index_range(self) -> Optional[tuple[int, int]]:
+        """ Return the root_range of this store if it holds at least half of
+        the calls of <root>, or None otherwise.
+
+        The indexes of <root> find the matching calls of all of <root>, so the
+        filters only use them for such a store: for a smaller store, checking
+        its own calls directly costs less than keeping the few found in it.
+        """
+        if 2 * len(self) < len(self.root):
+            return None
+        return self.root_range()
+
+    def select_root_positions(self, positions: np.ndarray) -> CallStore:
+        """ Return a new store holding the calls of this store found at the
+        increasing <positions> in <root>, such as the positions returned by the
+        indexes of <root>, in the same order as in this store.
+
+        This takes O(log n + k) time for a store with a root_range, such as
+        <root> and the stores sliced from it, where k is the number of
+        <positions>, and O(k log n) time otherwise.
+        """
+        span = self.root_range()
+        if span is not None:
+            first, last = np.searchsorted(positions, span).tolist()
+            return self.select(positions[first:last] - span[0])
+        own = self.positions()
+        index = np.searchsorted(own, positions)
+        present = index < len(own)
+        present[present] = own[index[present]] == positions[present]
+        return self.select(index[present])
+
+    def spatial_index(self) -> GridIndex:
+        """ Return a spatial index over the sources and destinations of the
+        calls of this store, where each call is identified by its position in
+        this store.
+
+        The index is built the first time it is needed, and kept until a call
+        is appended to this store.
+        """
+        if self._spatial_index is None:
+            self._spatial_index = GridIndex(self.src_lon, self.src_lat,
+                                            self.dst_lon, self.dst_lat)
+        return self._spatial_index
+
+    def duration_index(self) -> SortedIndex:
+        """ Return an index over the durations of the calls of this store,
+        where each call is identified by its position in this store.
+
+        The index is built the first time it is needed, and kept until a call
+        is appended to this store.
+        """
+        if self._duration_index is None:
+            self._duration_index = SortedIndex(self.durations)
+        return self._duration_index
+
+    def _call_array(self) -> np.ndarray:
+        """ Return the calls of this store as a NumPy array of objects.
+        """
+        if self._call_objects is None:
+            self._call_objects = np.empty(len(self._calls), dtype=object)
+            self._call_objects[:] = self._calls
+        return self._call_objects
+
+    @classmethod
+    def concatenate(cls, stores: list[CallStore]) -> CallStore:
+        """ Return a new store holding the calls of all of the <stores>, in
+        order.
+
+        Precondition: <stores> is not empty, all of the <stores> were
+        selected from the same root store, and each store only holds calls
+        that come after the calls of the stores before it in the root store.
+        """
+        calls = np.concatenate([s._call_array() for s in stores])
+        columns = {name: np.concatenate([s.columns()[name] for s in stores])
+                   for name in _COLUMNS}
+        positions = np.concatenate([s.positions() for s in stores])
+        return cls._from_columns(stores[0].root, calls, columns, positions)
+
+    def __len__(self) -> int:
+        """ Return the number of calls in this store.
+        """
+        return len(self._calls)
+
+    def __iter__(self) -> Iterator[Call]:
+        """ Return an iterator over the calls of this store, in order.
+        """
+        return iter(self._calls)
+
+    def __getitem__(self, index: Union[int, slice]) \
+            -> Union[Call, CallStore]:
+        """ Return the call at position <index> of this store, or a new store
+        holding the calls in the slice <index>.
+        """
+        if isinstance(index, slice):
+            return self.select(np.arange(len(self))[index])
+        return self._calls[index]
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'typing', '__future__', 'array', 'numpy', 'call',
+            'customer', 'sortedindex', 'spatialindex'
+        ],
+        'disable': ['W0212'],
+        'generated-members': 'pygame.*'
+    })
@@ -11,7 +11,8 @@ any changes, are expressly prohibited.
 All of the files in this directory and all subdirectories are:
 Copyright (c) 2025 Bogdan Simion, Diane Horton, Jacqueline Smith
 """
-from typing import Union
+from itertools import chain
+from typing import Iterator, Optional, Union
 from phoneline import PhoneLine
 from call import Call
 from callhistory import CallHistory
@@ -26,14 +27,18 @@ class Customer:
     #     this customer's 4 digit Customer id
     # _phone_lines:
     #     this customer's phone lines
+    # _lines_by_number:
+    #     this customer's phone lines, keyed by their phone number
     _id: int
     _phone_lines: list[PhoneLine]
+    _lines_by_number: dict[str, PhoneLine]
 
     def __init__(self, cid: int) -> None:
         """ Create a new Customer with the <cid> id
         """
         self._id = cid
         self._phone_lines = []
+        self._lines_by_number = {}
 
     def new_month(self, month: int, year: int) -> None:
         """ Advance to a new month (specified by <month> and <year>) in the
@@ -51,9 +56,9 @@ class Customer:
         Precondition: The phone line associated with the source phone number of
         <call>, is owned by this customer
         """
-        for phone in self._phone_lines:
-            if phone.number == call.src_number:
-                phone.make_call(call)
+        phone = self._lines_by_number.get(call.src_number)
+        if phone is not None:
+            phone.make_call(call)
 
     def receive_call(self, call: Call) -> None:
         """ Record that a call was made to the destination phone number of
@@ -62,21 +67,20 @@ class Customer:
         Precondition: The phone line associated with the destination phone
         number of <call>, is owned by this customer
         """
-        for phone in self._phone_lines:
-            if phone.number == call.dst_number:
-                phone.receive_call(call)
+        phone = self._lines_by_number.get(call.dst_number)
+        if phone is not None:
+            phone.receive_call(call)
 
     def cancel_phone_line(self, number: str) -> Union[float, None]:
         """ Remove PhoneLine with number <number> from this customer and return
         the amount still owed by this customer.
         Return None if <number> is not owned by this customer.
         """
-        fee = None
-        for pl in self._phone_lines:
-            if pl.get_number() == number:
-                self._phone_lines.remove(pl)
-                fee = pl.cancel_line()
-        return fee
+        pl = self._lines_by_number.pop(number, None)
+        if pl is None:
+            return None
+        self._phone_lines.remove(pl)
+        return pl.cancel_line()
 
     # ----------------------------------------------------------
     # NOTE: You do not need to understand the implementation of
@@ -88,6 +92,7 @@ class Customer:
         """ Add a new PhoneLine to this customer.
         """
         self._phone_lines.append(pline)
+        self._lines_by_number[pline.get_number()] = pline
 
     def get_phone_numbers(self) -> list[str]:
         """ Return a list of all of the numbers this customer owns
@@ -105,17 +110,21 @@ class Customer:
     def __contains__(self, item: str) -> bool:
         """ Check if this customer owns the phone number <item>
         """
-        contains = False
-        for line in self._phone_lines:
-            if line.get_number() == item:
-                contains = True
-        return contains
+        return item in self._lines_by_number
+
+    def get_phone_line(self, number: str) -> Optional[PhoneLine]:
+        """ Return the PhoneLine with phone number <number> owned by this
+        customer, or None if this customer does not own <number>.
+        """
+        return self._lines_by_number.get(number)
 
     def generate_bill(self, month: int, year: int) \
             -> tuple[int, float, list[dict]]:
         """ Return a bill summary for the <month> and <year> billing cycle,
         as a Tuple containing the customer id, total cost for all phone lines,
         and a List of bill summaries generated for each phone line.
+
+        Each phone line only summarizes the bills of its closed months once.
         """
         bills = []
         total = 0
@@ -150,12 +159,23 @@ class Customer:
         customer, as a tuple in the following format:
         (outgoing calls, incoming calls)
         """
-        history = ([], [])
-        for line in self._phone_lines:
-            line_history = line.get_monthly_history()
-            history[0].extend(line_history[0])
-            history[1].extend(line_history[1])
-        return history
+        return list(self.iter_outgoing()), list(self.iter_incoming())
+
+    def iter_outgoing(self) -> Iterator[Call]:
+        """ Return an iterator over all the outgoing calls from the call
+        history of this customer, in the order of get_history, without
+        copying them.
+        """
+        return chain.from_iterable(line.iter_outgoing()
+                                   for line in self._phone_lines)
+
+    def iter_incoming(self) -> Iterator[Call]:
+        """ Return an iterator over all the incoming calls from the call
+        history of this customer, in the order of get_history, without
+        copying them.
+        """
+        return chain.from_iterable(line.iter_incoming()
+                                   for line in self._phone_lines)
 
     def get_call_history(self, number: str = None) -> list[CallHistory]:
         """ Return the call history for <number>, stored into a list.
@@ -177,7 +197,8 @@ if __name__ == '__main__':
 
     python_ta.check_all(config={
         'allowed-import-modules': [
-            'python_ta', 'typing', 'phoneline', 'call', 'callhistory'
+            'python_ta', 'typing', 'itertools', 'phoneline', 'call',
+            'callhistory'
         ],
         'allowed-io': ['print_bill'],
         'disable': ['R0902', 'R0913'],
@@ -0,0 +1,110 @@
+"""
+CSC148, Winter 2025
+Assignment 1
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) 2025 Bogdan Simion, Diane Horton, Jacqueline Smith
+
+=== Module Description ===
+
+This file contains the Drawable class, for the objects drawn by the Visualizer,
+along with the cache of sprite images that they share. It is only needed when
+calls are displayed, so it is kept apart from the Call class to keep Pygame out
+of the billing and filtering code.
+"""
+import os
+from typing import Optional
+import pygame
+
+
+# Size in pixels of the sprites displayed for a call
+SPRITE_SIZE = (13, 13)
+
+# Scaled sprite images, keyed by (sprite file, size), shared by all drawables
+_sprite_cache: dict[tuple[str, tuple[int, int]], pygame.Surface] = {}
+
+
+def load_sprite(sprite_file: str,
+                size: tuple[int, int] = SPRITE_SIZE) -> pygame.Surface:
+    """ Return the image in <sprite_file>, scaled to <size>.
+
+    The image is only loaded and scaled the first time it is requested for a
+    given size; afterwards, the same Surface is returned. The returned Surface
+    is shared, so it must not be modified.
+    """
+    key = (sprite_file, size)
+    sprite = _sprite_cache.get(key)
+    if sprite is None:
+        sprite = pygame.transform.smoothscale(
+            pygame.image.load(os.path.join(os.path.dirname(__file__),
+                                           sprite_file)), size)
+        _sprite_cache[key] = sprite
+    return sprite
+
+
+# ----------------------------------------------------------------------------
+# NOTE: You do not need to understand the implementation of the Drawable class
+# to be able to solve this assignment. However, feel feel free to read it for
+# the fun of understanding the visualization system.
+# ----------------------------------------------------------------------------
+
+class Drawable:
+    """A class for objects that the graphical renderer can draw.
+
+    === Public Attributes ===
+    sprite:
+        image object for this drawable or None.
+        If none, then must have linelimits
+    linelimits:
+        limits for the line of the connection or None.
+        If none, then must have sprite
+    loc: location (longitude/latitude pair)
+    """
+    sprite: Optional[pygame.Surface]
+    linelimits: Optional[tuple[float, float]]
+    loc: Optional[tuple[float, float]]
+
+    def __init__(self, sprite_file: Optional[str] = None,
+                 location: Optional[tuple[float, float]] = None,
+                 linelimits: Optional[tuple[tuple[float, float],
+                                            tuple[float, float]]] = None) \
+            -> None:
+        """Initialize this drawable object with the <sprite_file>, <location>
+        and <linelimits>.
+        """
+        self.linelimits = None
+        self.sprite = None
+        self.loc = None
+
+        if sprite_file is not None and location is not None:
+            self.sprite = load_sprite(sprite_file)
+            self.loc = location
+        else:
+            self.linelimits = linelimits
+
+    def get_position(self) -> tuple[float, float]:
+        """Return the (long, lat) position of this object at the given time.
+        """
+        return self.loc
+
+    def get_linelimits(self) -> Optional[tuple[float, float]]:
+        """Return the limits for the line if the drawable is a line type
+        (otherwise None)
+        """
+        return self.linelimits
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'typing', 'os', 'pygame'
+        ],
+        'generated-members': 'pygame.*'
+    })
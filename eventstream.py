@@ -0,0 +1,285 @@
+"""
+CSC148, Winter 2025
+Assignment 1
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) 2025 Bogdan Simion, Diane Horton, Jacqueline Smith
+
+=== Module Description ===
+
+This file contains readers that produce the records of a dataset one at a
+time, instead of loading the whole file into memory with json.load.
+
+Two formats are supported:
+- the JSON format of dataset.json, where the records are the items of the
+  top-level "events" and "customers" arrays
+- a JSON-Lines format, where each line of the file holds one record
+"""
+import json
+import re
+import time
+from typing import Any, Callable, Iterator, Optional, TextIO
+
+# Number of characters read from the file at a time
+CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = ' \t\n\r'
+
+# The characters that open or close an array, an object or a string, a whole
+# string, and the ASCII characters other than brackets, which are all that
+# skipping a value needs to find
+_STRUCTURE = re.compile(r'[\[\]{}"]')
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+_NOT_BRACKET = bytes(c for c in range(128) if chr(c) not in '[]{}')
+
+
+def _match_brackets(brackets: bytes) -> bytes:
+    """ Return the <brackets> without the pairs of brackets that match each
+    other, like b"[]" and b"{[]}".
+    """
+    while True:
+        matched = brackets.replace(b'[]', b'').replace(b'{}', b'')
+        if len(matched) == len(brackets):
+            return matched
+        brackets = matched
+
+
+class _JSONStream:
+    """ A buffered reader over a JSON document, which decodes one value at a
+    time.
+    """
+    # === Private Attributes ===
+    # _file:
+    #     the file the JSON document is read from
+    # _chunk_size:
+    #     the number of characters read from <_file> at a time
+    # _buffer:
+    #     the characters read from <_file> that have not been discarded yet
+    # _pos:
+    #     the position of the next unread character in <_buffer>
+    # _eof:
+    #     whether the whole of <_file> has been read into <_buffer>
+    # _decoder:
+    #     the decoder used to parse each JSON value from <_buffer>
+    _file: TextIO
+    _chunk_size: int
+    _buffer: str
+    _pos: int
+    _eof: bool
+    _decoder: json.JSONDecoder
+
+    def __init__(self, file: TextIO, chunk_size: int = CHUNK_SIZE) -> None:
+        """ Create a new stream over the JSON document in <file>.
+        """
+        self._file = file
+        self._chunk_size = chunk_size
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        """ Read the next chunk of the file into the buffer, discarding the
+        characters that were already consumed. Return False if the end of the
+        file was reached.
+        """
+        if self._eof:
+            return False
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """ Return the next non-whitespace character without consuming it, or
+        the empty string at the end of the document.
+        """
+        while True:
+            while (self._pos < len(self._buffer)
+                   and self._buffer[self._pos] in _WHITESPACE):
+                self._pos += 1
+            if self._pos < len(self._buffer) or not self._fill():
+                break
+        return self._buffer[self._pos:self._pos + 1]
+
+    def next_char(self) -> str:
+        """ Consume and return the next non-whitespace character.
+        """
+        char = self.peek()
+        if not char:
+            raise ValueError("unexpected end of JSON document")
+        self._pos += 1
+        return char
+
+    def expect(self, char: str) -> None:
+        """ Consume the next non-whitespace character, which must be <char>.
+        """
+        found = self.next_char()
+        if found != char:
+            raise ValueError(f"expected {char!r} in JSON document, "
+                             f"found {found!r}")
+
+    def decode(self) -> Any:
+        """ Consume and return the next JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # a number may continue in the part of the file not read yet
+            if end < len(self._buffer) or not self._fill():
+                self._pos = end
+                return value
+
+    def skip(self) -> None:
+        """ Consume the next JSON value without decoding it.
+
+        The characters of an array or object are only scanned for its
+        brackets, outside of its strings, a whole chunk at a time, which is
+        much faster than building its items.
+        """
+        if self.peek() not in ('[', '{'):
+            self.decode()
+            return
+        self._pos += 1
+        depth = 1
+        while True:
+            segment = self._buffer[self._pos:]
+            # the escaped characters are blanked out, so that the quotes left
+            # delimit the strings, at the same positions as in <segment>
+            parts = segment.replace('\\\\', '  ').replace('\\"', '  ') \
+                .split('"')
+            used = len(segment)
+            if len(parts) % 2 == 0:
+                # the last string continues in the part of the file not read
+                # yet, so it is scanned once the rest of it is read
+                used -= len(parts.pop()) + 1
+            # once the pairs of brackets that match are removed, the closing
+            # brackets left come first, and the value ends in this segment if
+            # there are at least <depth> of them
+            # outside of its strings, a JSON document is only made of ASCII
+            # characters
+            brackets = _match_brackets(''.join(parts[::2]).encode('ascii')
+                                       .translate(None, _NOT_BRACKET))
+            closing = len(brackets) - len(brackets.lstrip(b']}'))
+            if closing >= depth:
+                self._skip_to_depth(depth)
+                return
+            depth += len(brackets) - 2 * closing
+            self._pos += used
+            if not self._fill():
+                raise ValueError("unexpected end of JSON document")
+
+    def _skip_to_depth(self, depth: int) -> None:
+        """ Consume the characters of the buffer up to the bracket closing the
+        <depth> arrays and objects that the next character is nested in.
+
+        Precondition: that bracket is in the buffer.
+        """
+        while depth > 0:
+            match = _STRUCTURE.search(self._buffer, self._pos)
+            if match.group() == '"':
+                self._pos = _STRING.match(self._buffer, match.start()).end()
+            else:
+                self._pos = match.end()
+                depth += 1 if match.group() in '[{' else -1
+
+    def iter_array(self) -> Iterator[Any]:
+        """ Consume the next JSON array, yielding its items one at a time.
+        """
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self.decode()
+            char = self.next_char()
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f"expected ',' or ']' in JSON array, "
+                                 f"found {char!r}")
+
+
+def iter_json_array(file: TextIO, key: str,
+                    chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """ Yield the items of the array stored under <key> in the top-level JSON
+    object read from <file>, one at a time.
+
+    Values stored under other keys that come before <key> are skipped without
+    being decoded, so that at most one item is held in memory at a time. If
+    <key> is not in the object, nothing is yielded.
+    """
+    stream = _JSONStream(file, chunk_size)
+    stream.expect('{')
+    if stream.peek() == '}':
+        return
+    while True:
+        name = stream.decode()
+        stream.expect(':')
+        if name == key:
+            yield from stream.iter_array()
+            return
+        stream.skip()
+        if stream.next_char() == '}':
+            return
+
+
+def iter_jsonl(file: TextIO) -> Iterator[Any]:
+    """ Yield the records stored one per line in the JSON-Lines <file>.
+    Blank lines are skipped.
+    """
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def tail_jsonl(filename: str, poll_interval: float = 1.0,
+               stop: Optional[Callable[[], bool]] = None) -> Iterator[Any]:
+    """ Yield the records stored one per line in the JSON-Lines file
+    <filename>, then keep following the file and yield every record appended
+    to it, similar to "tail -f".
+
+    A line is only decoded once it is complete (ends in a newline). When no
+    new data is available, wait <poll_interval> seconds before checking the
+    file again. Stop once the end of the file is reached and <stop> returns
+    True; if <stop> is None, follow the file forever.
+    """
+    with open(filename) as f:
+        pending = ''
+        while True:
+            line = f.readline()
+            if line:
+                pending += line
+                if pending.endswith('\n'):
+                    if pending.strip():
+                        yield json.loads(pending)
+                    pending = ''
+            elif stop is not None and stop():
+                return
+            else:
+                time.sleep(poll_interval)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'typing', 'json', 're', 'time'
+        ],
+        'allowed-io': ['tail_jsonl']
+    })
@@ -13,7 +13,12 @@ Copyright (c) 2025 Bogdan Simion, Diane Horton, Jacqueline Smith
 """
 import time
 import datetime
+from typing import Union
+
+import numpy as np
+
 from call import Call
+from callstore import CallStore
 from customer import Customer
 
 
@@ -28,9 +33,9 @@ class Filter:
         pass
 
     def apply(self, customers: list[Customer],
-              data: list[Call],
+              data: Union[list[Call], CallStore],
               filter_string: str) \
-            -> list[Call]:
+            -> Union[list[Call], CallStore]:
         """ Return a list of all calls from <data>, which match the filter
         specified in <filter_string>.
 
@@ -46,12 +51,25 @@ class Filter:
         should have calls ordered in the same manner as they were given, except
         for calls which have been removed.
 
+        The <data> may also be a CallStore, in which case the calls are
+        selected with vectorized operations over its columns, and the result
+        is a CallStore as well.
+
         Precondition:
         - <customers> contains the list of all customers from the input dataset
         - all calls included in <data> are valid calls from the input dataset
         """
         raise NotImplementedError
 
+    def normalize(self, filter_string: str) -> str:
+        """ Return a filter string that this filter treats exactly like
+        <filter_string>, and that is the same for all of the filter strings
+        treated like it, as far as they can be told apart without the data.
+
+        The filter strings of this filter are only the same as themselves.
+        """
+        return filter_string
+
     def __str__(self) -> str:
         """ Return a description of this filter to be displayed in the UI menu
         """
@@ -64,22 +82,27 @@ class ResetFilter(Filter):
     """
 
     def apply(self, customers: list[Customer],
-              data: list[Call],
+              data: Union[list[Call], CallStore],
               filter_string: str) \
-            -> list[Call]:
+            -> Union[list[Call], CallStore]:
         """ Reset all of the applied filters. Return a List containing all the
         calls corresponding to <customers>.
         The <data> and <filter_string> arguments for this type of filter are
         ignored.
 
+        If <data> is a CallStore, return the store that it was selected from,
+        which holds all of the calls made by <customers>.
+
         Precondition:
         - <customers> contains the list of all customers from the input dataset
         """
+        if isinstance(data, CallStore):
+            return data.root
+
         filtered_calls = []
         for c in customers:
-            customer_history = c.get_history()
             # only take outgoing calls, we don't want to include calls twice
-            filtered_calls.extend(customer_history[0])
+            filtered_calls.extend(c.iter_outgoing())
         return filtered_calls
 
     def __str__(self) -> str:
@@ -94,9 +117,9 @@ class CustomerFilter(Filter):
     """
 
     def apply(self, customers: list[Customer],
-              data: list[Call],
+              data: Union[list[Call], CallStore],
               filter_string: str) \
-            -> list[Call]:
+            -> Union[list[Call], CallStore]:
         """ Return a list of all unique calls from <data> made or
         received by the customer with the id specified in <filter_string>.
 
@@ -123,19 +146,35 @@ class CustomerFilter(Filter):
             # returns original list if the filter string is invalid
             return data
 
-        target_customer = None
-        for customer in customers:
-            # find if given filter_string id exists in customers list
-            if customer.get_id() == customer_id:
-                target_customer = customer
-                break
-
-        if target_customer is None:
+        if isinstance(data, CallStore) and data.has_customers():
+            # the customers recorded by the root store as the calls were added
+            # are found by id directly
+            numbers = data.customer_numbers(customer_id)
+        else:
+            numbers = None
+            for customer in customers:
+                # find if given filter_string id exists in customers list
+                if customer.get_id() == customer_id:
+                    numbers = customer.get_phone_numbers()
+                    break
+
+        if numbers is None:
             # if no match is found return original data
             return data
 
+        if isinstance(data, CallStore):
+            line_ids = data.line_ids(numbers)
+            if data.index_range() is not None:
+                # the root store lists the calls of each line as they are
+                # added, so only the calls of the customer are looked at
+                return data.select_root_positions(
+                    data.root.line_positions(line_ids.tolist()))
+            return data.select(np.isin(data.src_lines, line_ids)
+                               | np.isin(data.dst_lines, line_ids))
+
+        # a set gives constant time membership checks for every call
+        customer_lines = set(numbers)
         unique_calls = []
-        customer_lines = target_customer.get_phone_numbers()
 
         for call in data:
 
@@ -163,9 +202,9 @@ class DurationFilter(Filter):
     """
 
     def apply(self, customers: list[Customer],
-              data: list[Call],
+              data: Union[list[Call], CallStore],
               filter_string: str) \
-            -> list[Call]:
+            -> Union[list[Call], CallStore]:
         """ Return a list of all unique calls from <data> with a duration
         of under or over the time indicated in the <filter_string>.
 
@@ -194,31 +233,34 @@ class DurationFilter(Filter):
             return data
 
         if call_length == 0:
+            if isinstance(data, CallStore):
+                return data.select(np.zeros(len(data), dtype=bool))
             return []
 
-        calls = []
-        # track unique calls to prevent duplicates
-        unique_calls = set()
-
-        for call in data:
-            call_id = None
+        if isinstance(data, CallStore):
+            if data.index_range() is None:
+                # the calls selected by other filters, and small slices, are
+                # checked directly, which is cheaper than matching them
+                # against the index of the root store
+                if filter_string[0] == 'L':
+                    return data.select(data.durations < call_length)
+                return data.select(data.durations > call_length)
+            index = data.root.duration_index()
+            if filter_string[0] == 'L':
+                return data.select_root_positions(index.less_than(call_length))
+            return data.select_root_positions(index.greater_than(call_length))
+
+        if filter_string[0] == 'L':
             # return calls less than given duration
+            return [call for call in data if call.duration < call_length]
+        # return calls greater than given duration
+        return [call for call in data if call.duration > call_length]
 
-            if filter_string[0] == 'L' and call.duration < call_length:
-                call_id = (call.src_number, call.dst_number,
-                           call.duration, call.time)
-
-            # return calls greater than given duration
-            elif filter_string[0] == 'G' and call.duration > call_length:
-                call_id = (call.src_number, call.dst_number,
-                           call.duration, call.time)
-
-            if call_id:
-                if call not in unique_calls:
-                    # add call id if its valid and is not a repeat
-                    calls.append(call)
-                    unique_calls.add(call_id)
-        return calls
+    def normalize(self, filter_string: str) -> str:
+        """ Return <filter_string> without its leading and trailing whitespace,
+        which this filter ignores.
+        """
+        return filter_string.strip()
 
     def __str__(self) -> str:
         """ Return a description of this filter to be displayed in the UI menu
@@ -233,9 +275,9 @@ class LocationFilter(Filter):
     """
 
     def apply(self, customers: list[Customer],
-              data: list[Call],
+              data: Union[list[Call], CallStore],
               filter_string: str) \
-            -> list[Call]:
+            -> Union[list[Call], CallStore]:
         """ Return a list of all unique calls from <data>, which took
         place within a location specified by the <filter_string>
         (at least the source or the destination of the event was
@@ -278,6 +320,24 @@ class LocationFilter(Filter):
         except ValueError:
             return data
 
+        if isinstance(data, CallStore):
+            if data.index_range() is None:
+                # the calls selected by other filters, and small slices, are
+                # checked directly, which is cheaper than matching them
+                # against the index of the root store
+                return data.select(
+                    ((lower_long <= data.src_lon) & (data.src_lon <= upper_long)
+                     & (lower_lat <= data.src_lat)
+                     & (data.src_lat <= upper_lat))
+                    | ((lower_long <= data.dst_lon)
+                       & (data.dst_lon <= upper_long)
+                       & (lower_lat <= data.dst_lat)
+                       & (data.dst_lat <= upper_lat)))
+            # the spatial index of the root store is built once, and shared
+            # by the stores sliced from it
+            return data.select_root_positions(data.root.spatial_index().query(
+                lower_long, lower_lat, upper_long, upper_lat))
+
         filter_calls = []
 
         for call in data:
@@ -295,6 +355,19 @@ class LocationFilter(Filter):
 
         return filter_calls
 
+    def normalize(self, filter_string: str) -> str:
+        """ Return the four coordinates of <filter_string> written in the same
+        way, if it has four valid numbers, or <filter_string> itself
+        otherwise.
+        """
+        coordinates = filter_string.split(",")
+        if len(coordinates) != 4:
+            return filter_string
+        try:
+            return ", ".join(repr(float(c)) for c in coordinates)
+        except ValueError:
+            return filter_string
+
     def __str__(self) -> str:
         """ Return a description of this filter to be displayed in the UI menu
         """
@@ -308,7 +381,8 @@ if __name__ == '__main__':
 
     python_ta.check_all(config={
         'allowed-import-modules': [
-            'python_ta', 'typing', 'time', 'datetime', 'call', 'customer'
+            'python_ta', 'typing', 'time', 'datetime', 'numpy', 'call',
+            'callstore', 'customer'
         ],
         'max-nested-blocks': 4,
         'allowed-io': ['apply', '__str__'],
@@ -0,0 +1,151 @@
+"""
+CSC148, Winter 2025
+Assignment 1
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) 2025 Bogdan Simion, Diane Horton, Jacqueline Smith
+
+=== Module Description ===
+
+This file contains the FilterCache class, which remembers the calls matched
+by the filters applied most recently, so that applying the same filter to the
+same calls again, such as the same customer ID or location, does not need to
+look at the calls.
+"""
+from collections import OrderedDict
+from typing import Optional, Union
+
+from call import Call
+from callstore import CallStore
+from customer import Customer
+from filter import Filter, ResetFilter
+from pipeline import ApplyFunction, _apply_filter
+
+# Default number of results kept by a cache
+CACHE_SIZE = 16
+
+
+class FilterCache:
+    """ The results of the filters applied most recently to the calls of a
+    root CallStore, or to slices of it.
+
+    A result is found by the type of the filter, its normalized filter string,
+    and the slice of the root store it was applied to. Once the cache is full,
+    the result used least recently is removed to make room for a new one.
+
+    The results only hold for the calls the root store had when they were
+    found: the cache is emptied when calls are appended to the root store, or
+    when the filters are applied to the calls of another root store.
+
+    Filters applied to a list of calls, or to calls selected by other
+    filters, are applied every time, since a list may be changed, and the
+    selected calls cannot be told apart cheaply.
+
+    === Public Attributes ===
+    size:
+         the largest number of results kept
+    hits:
+         the number of filters whose result was found in this cache
+    misses:
+         the number of filters applied to calls they could be cached for,
+         whose result was not in this cache
+
+    === Representation Invariants ===
+    - size >= 1
+    - hits >= 0 and misses >= 0
+    """
+    size: int
+    hits: int
+    misses: int
+    # === Private Attributes ===
+    # _apply:
+    #     the function used to apply the filters whose result is not cached
+    # _store:
+    #     the root store that the cached results were selected from, or None
+    #     if no result was cached yet
+    # _version:
+    #     the version of <_store> when the cached results were found
+    # _results:
+    #     the cached results, by filter type, normalized filter string, and
+    #     the (start, end) positions of the calls they were found in, from the
+    #     least to the most recently used
+    _apply: ApplyFunction
+    _store: Optional[CallStore]
+    _version: int
+    _results: OrderedDict[tuple[type, str, tuple[int, int]], CallStore]
+
+    def __init__(self, apply: ApplyFunction = _apply_filter,
+                 size: int = CACHE_SIZE) -> None:
+        """ Create a new empty cache, keeping at most <size> results, and
+        applying the filters with <apply>, such as the apply method of a
+        FilterPool.
+        """
+        self.size = max(1, size)
+        self.hits = 0
+        self.misses = 0
+        self._apply = apply
+        self._store = None
+        self._version = 0
+        self._results = OrderedDict()
+
+    def __len__(self) -> int:
+        """ Return the number of results in this cache.
+        """
+        return len(self._results)
+
+    def apply(self, f: Filter, customers: list[Customer],
+              data: Union[list[Call], CallStore],
+              filter_string: str) -> Union[list[Call], CallStore]:
+        """ Return the calls from <data> which match the filter <f> specified
+        in <filter_string>, as f.apply(customers, data, filter_string) would,
+        using the cached result if there is one.
+        """
+        if isinstance(f, ResetFilter) or not isinstance(data, CallStore):
+            return self._apply(f, customers, data, filter_string)
+        span = data.root_range()
+        if span is None:
+            return self._apply(f, customers, data, filter_string)
+
+        if data.root is not self._store or data.root.version != self._version:
+            self.clear()
+            self._store = data.root
+            self._version = data.root.version
+
+        key = (type(f), f.normalize(filter_string), span)
+        result = self._results.get(key)
+        if result is not None:
+            self.hits += 1
+            self._results.move_to_end(key)
+            return result
+
+        self.misses += 1
+        result = self._apply(f, customers, data, filter_string)
+        self._results[key] = result
+        if len(self._results) > self.size:
+            self._results.popitem(last=False)
+        return result
+
+    def clear(self) -> None:
+        """ Remove all of the results from this cache. The counts of hits and
+        misses are kept.
+        """
+        self._results.clear()
+        self._store = None
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'typing', 'collections', 'call', 'callstore',
+            'customer', 'filter', 'pipeline'
+        ],
+        'generated-members': 'pygame.*'
+    })
@@ -0,0 +1,235 @@
+"""
+CSC148, Winter 2025
+Assignment 1
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) 2025 Bogdan Simion, Diane Horton, Jacqueline Smith
+
+=== Module Description ===
+
+This file contains the FilterPool class, which applies filters to the calls
+of a CallStore in several worker processes at once.
+
+Python threads cannot run the filters in parallel, since only one thread can
+run Python code at a time. Worker processes can, but copying the calls to
+them for every filter would take longer than filtering the calls. Instead,
+the columns of the store are copied into shared memory once, when the pool
+is created, and every worker reads them from there. Each worker filters a
+chunk of the calls, and only sends back the positions of the matching calls.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import weakref
+from multiprocessing import shared_memory
+from typing import Optional, Union
+
+import numpy as np
+
+from callstore import CallStore
+from customer import Customer
+from filter import Filter, ResetFilter
+from phoneline import PhoneLine
+
+# Default number of worker processes: one per core, unless set by the
+# MEWBILE_WORKERS environment variable
+NUM_WORKERS = int(os.environ.get('MEWBILE_WORKERS', os.cpu_count() or 1))
+
+# The root store and the customers of a worker process, set up by
+# _init_worker from the data shared by the pool
+_worker_store: Optional[CallStore] = None
+_worker_customers: list[Customer] = []
+_worker_memory: list[shared_memory.SharedMemory] = []
+
+
+def _init_worker(blocks: dict[str, tuple[str, str]], count: int,
+                 numbers: list[str],
+                 customer_lines: list[tuple[int, list[str]]]) -> None:
+    """ Set up a worker process, with a root store over the columns in the
+    shared memory <blocks>, which hold <count> calls between the phone
+    <numbers>, and with customers owning the given <customer_lines>.
+
+    <blocks> maps the name of each column to the name of its shared memory
+    block and its dtype. The customers only have their id and the numbers of
+    their phone lines, which is all the filters need.
+    """
+    global _worker_store, _worker_customers
+    columns = {}
+    for name, (block, dtype) in blocks.items():
+        memory = shared_memory.SharedMemory(name=block)
+        _worker_memory.append(memory)
+        columns[name] = np.ndarray(count, dtype=dtype, buffer=memory.buf)
+    # the workers never access the Call objects, only the positions of the
+    # calls, so there are none
+    _worker_store = CallStore.from_columns(np.empty(count, dtype=object),
+                                           columns, numbers, copy=False)
+    _worker_customers = []
+    for cid, lines in customer_lines:
+        customer = Customer(cid)
+        for number in lines:
+            customer.add_phone_line(PhoneLine(number, None))
+        _worker_customers.append(customer)
+
+
+def _apply_chunk(task: tuple[Filter, str, Union[tuple[int, int],
+                                                np.ndarray]]) -> np.ndarray:
+    """ Apply the filter of <task> to a chunk of the calls of the root store
+    of this worker, and return the positions of the matching calls in the
+    root store.
+
+    <task> is made of the filter, the filter string, and either the
+    (start, end) positions of a slice of the root store or an array of the
+    increasing positions of the calls of the chunk.
+    """
+    f, filter_string, chunk = task
+    if isinstance(chunk, tuple):
+        data = _worker_store[chunk[0]:chunk[1]]
+    else:
+        data = _worker_store.select(chunk)
+    return f.apply(_worker_customers, data, filter_string).positions()
+
+
+def _release(pool: multiprocessing.pool.Pool,
+             memory: list[shared_memory.SharedMemory]) -> None:
+    """ Stop the worker processes of <pool>, and free the shared <memory>.
+    """
+    pool.terminate()
+    for block in memory:
+        block.close()
+        block.unlink()
+
+
+class FilterPool:
+    """ A pool of worker processes, which apply filters to the calls of a
+    CallStore in parallel.
+
+    The calls are split into one chunk per worker, and the positions of the
+    matching calls found by the workers are merged back in chunk order, so
+    that the result keeps the order of the calls, as if the filter was applied
+    to all of the calls at once.
+
+    Only the filters which check every call are split: the filters that use
+    the indexes of the root store, for the root store and its large slices,
+    are applied in this process.
+
+    === Public Attributes ===
+    store:
+         the root store whose calls are filtered
+    workers:
+         the number of worker processes
+
+    === Representation Invariants ===
+    - workers >= 1
+    """
+    store: CallStore
+    workers: int
+    # === Private Attributes ===
+    # _count:
+    #     the number of calls of <store> when this pool was created
+    # _pool:
+    #     the worker processes, or None if <workers> is 1, in which case the
+    #     filters are applied in this process
+    # _memory:
+    #     the shared memory blocks holding the columns of <store>
+    # _finalizer:
+    #     stops the workers and frees the shared memory, once this pool is
+    #     closed or garbage collected
+    _count: int
+    _pool: Optional[multiprocessing.pool.Pool]
+    _memory: list[shared_memory.SharedMemory]
+    _finalizer: Optional[weakref.finalize]
+
+    def __init__(self, store: CallStore, customers: list[Customer],
+                 workers: int = NUM_WORKERS) -> None:
+        """ Create a new pool of <workers> processes to filter the calls of the
+        root <store>, made by the <customers>.
+        """
+        self.store = store
+        self.workers = max(1, workers)
+        self._count = len(store)
+        self._pool = None
+        self._memory = []
+        self._finalizer = None
+        if self.workers == 1:
+            return
+
+        blocks = {}
+        for name, column in store.columns().items():
+            memory = shared_memory.SharedMemory(create=True,
+                                                size=max(column.nbytes, 1))
+            np.ndarray(len(column), dtype=column.dtype,
+                       buffer=memory.buf)[:] = column
+            self._memory.append(memory)
+            blocks[name] = (memory.name, column.dtype.str)
+        customer_lines = [(c.get_id(), c.get_phone_numbers())
+                          for c in customers]
+        self._pool = multiprocessing.Pool(
+            self.workers, _init_worker,
+            (blocks, self._count, store.numbers(), customer_lines))
+        self._finalizer = weakref.finalize(self, _release, self._pool,
+                                           self._memory)
+
+    def apply(self, f: Filter, customers: list[Customer], data: CallStore,
+              filter_string: str) -> CallStore:
+        """ Return the calls from <data> which match the filter <f> specified
+        in <filter_string>, as f.apply(customers, data, filter_string) would,
+        applying the filter to chunks of <data> in parallel.
+
+        Precondition: <data> was selected from the store of this pool, and no
+        call was appended to that store since this pool was created.
+        """
+        if (self._pool is None or isinstance(f, ResetFilter)
+                or len(data) < self.workers
+                or data.index_range() is not None):
+            # the indexes of the root store find the matching calls of all of
+            # it at once, so splitting them would only repeat the query in
+            # every worker
+            return f.apply(customers, data, filter_string)
+
+        # each chunk holds less than half of the root store, so the workers
+        # check its calls directly
+        span = data.root_range()
+        bounds = np.linspace(0, len(data), self.workers + 1).astype(int)
+        tasks = []
+        for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            if span is not None:
+                chunk = (span[0] + start, span[0] + end)
+            else:
+                chunk = data.positions()[start:end]
+            tasks.append((f, filter_string, chunk))
+        found = self._pool.map(_apply_chunk, tasks)
+        return data.select_root_positions(np.concatenate(found))
+
+    def is_current(self) -> bool:
+        """ Return whether the store of this pool still has the calls it had
+        when this pool was created, so that the pool can filter them.
+        """
+        return len(self.store) == self._count
+
+    def close(self) -> None:
+        """ Stop the worker processes of this pool, and free its shared
+        memory. The filters are applied in this process afterwards.
+        """
+        if self._finalizer is not None:
+            self._finalizer()
+        self._pool = None
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'typing', '__future__', 'multiprocessing', 'os',
+            'weakref', 'numpy', 'callstore', 'customer', 'filter', 'phoneline'
+        ],
+        'disable': ['W0603'],
+        'generated-members': 'pygame.*'
+    })
@@ -11,7 +11,7 @@ any changes, are expressly prohibited.
 All of the files in this directory and all subdirectories are:
 Copyright (c) 2025 Bogdan Simion, Diane Horton, Jacqueline Smith
 """
-from typing import Optional, Union
+from typing import Iterator, Optional, Union
 from call import Call
 from callhistory import CallHistory
 from bill import Bill
@@ -41,6 +41,13 @@ class PhoneLine:
     contract: Contract
     bills: dict[tuple[int, int], Bill]
     callhistory: CallHistory
+    # === Private Attributes ===
+    # _summaries:
+    #     the bills of closed months and their summaries, by (month, year):
+    #     once a new month starts, the contract only changes the bill of the
+    #     new month, so the summaries of the previous months never change
+    _summaries: dict[tuple[int, int],
+                     tuple[Bill, dict[str, Union[float, int, str]]]]
 
     def __init__(self, number: str, contract: Contract) -> None:
         """ Create a new PhoneLine with <number> and <contract>.
@@ -49,6 +56,7 @@ class PhoneLine:
         self.contract = contract
         self.callhistory = CallHistory()
         self.bills = {}
+        self._summaries = {}
 
     def new_month(self, month: int, year: int) -> None:
         """ Advance to a new month (specified by <month> and <year>) in the
@@ -129,6 +137,28 @@ class PhoneLine:
         """
         return self.callhistory.get_monthly_history(month, year)
 
+    def iter_outgoing(self, month: int = None, year: int = None) \
+            -> Iterator[Call]:
+        """ Return an iterator over the calls this line has made during the
+        <month> month of the <year> year, or over all of the calls it has made
+        if <month> and <year> are both None, without copying them.
+
+        Precondition: <month> and <year> are either both specified, or are
+        both missing/None
+        """
+        return self.callhistory.iter_outgoing(month, year)
+
+    def iter_incoming(self, month: int = None, year: int = None) \
+            -> Iterator[Call]:
+        """ Return an iterator over the calls this line has received during
+        the <month> month of the <year> year, or over all of the calls it has
+        received if <month> and <year> are both None, without copying them.
+
+        Precondition: <month> and <year> are either both specified, or are
+        both missing/None
+        """
+        return self.callhistory.iter_incoming(month, year)
+
     def get_bill(self, month: int, year: int) \
             -> Optional[dict[str, Union[float, int]]]:
         """ Return a bill summary for the <month>+<year> billing cycle, as a
@@ -143,12 +173,35 @@ class PhoneLine:
         "total" - total cost for this monthly bill
         The values corresponding to each key represent the respective amounts.
         If no bill exists for this month+year, return None.
+
+        The summaries of the months before the current month of the contract
+        are only computed once, since their bills no longer change.
         """
-        if (month, year) not in self.bills:
+        bill = self.bills.get((month, year))
+        if bill is None:
             return None
-
-        bill_summary = self.bills[(month, year)].get_summary()
+        if bill is self.contract.bill:
+            # the bill of the current month still changes with every call
+            bill_summary = bill.get_summary()
+            bill_summary['number'] = self.number
+            return bill_summary
+        return dict(self._summary((month, year)))
+
+    def _summary(self, date: tuple[int, int]) \
+            -> dict[str, Union[float, int, str]]:
+        """ Return the summary of the bill of the closed month <date>, as
+        returned by get_bill, computing it the first time it is asked for.
+
+        Precondition: the bill of <date> is not the bill of the current month
+        of the contract of this phone line.
+        """
+        bill = self.bills[date]
+        cached = self._summaries.get(date)
+        if cached is not None and cached[0] is bill:
+            return cached[1]
+        bill_summary = bill.get_summary()
         bill_summary['number'] = self.number
+        self._summaries[date] = (bill, bill_summary)
         return bill_summary
 
 
@@ -0,0 +1,178 @@
+"""
+CSC148, Winter 2025
+Assignment 1
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) 2025 Bogdan Simion, Diane Horton, Jacqueline Smith
+
+=== Module Description ===
+
+This file contains the FilterPipeline class, which combines the filters
+applied one after the other by the user into a single selection of calls,
+so that the last filter can be undone without applying the others again.
+"""
+from typing import Callable, Optional, Union
+
+import numpy as np
+
+from call import Call
+from callstore import CallStore
+from customer import Customer
+from filter import Filter, ResetFilter
+
+# A function applying a filter, with the same arguments as Filter.apply
+# preceded by the filter itself
+ApplyFunction = Callable[[Filter, list[Customer],
+                          Union[list[Call], CallStore], str],
+                         Union[list[Call], CallStore]]
+
+
+def _apply_filter(f: Filter, customers: list[Customer],
+                  data: Union[list[Call], CallStore],
+                  filter_string: str) -> Union[list[Call], CallStore]:
+    """ Return f.apply(<customers>, <data>, <filter_string>).
+    """
+    return f.apply(customers, data, filter_string)
+
+
+class FilterPipeline:
+    """ A sequence of filters, or stages, applied one after the other to all
+    of the calls of a dataset.
+
+    Since every filter keeps or removes each call independently of the other
+    calls, applying the stages one after the other selects the calls matched
+    by all of the stages. Each stage is evaluated once, on all of the calls,
+    where the indexes of a CallStore can be used. The calls matched by each
+    stage are then combined with those of the stages before it: with a
+    vectorized AND of their masks for a CallStore, or with a single pass over
+    the calls for a list.
+
+    The combined selection after each stage is kept, so that undoing the last
+    stage does not need to evaluate any filter.
+
+    === Public Attributes ===
+    customers:
+         all customers from the input dataset
+    calls:
+         all of the calls that the filters are applied to
+
+    === Representation Invariants ===
+    - there is one selection per stage
+    """
+    customers: list[Customer]
+    calls: Union[list[Call], CallStore]
+    # === Private Attributes ===
+    # _apply:
+    #     the function used to evaluate each stage on all of the calls
+    # _stages:
+    #     the filter and the filter string of each stage, in order
+    # _selections:
+    #     for each stage, the calls matched by that stage and all of the
+    #     stages before it: a boolean mask over <calls> if it is a CallStore,
+    #     or the set of the ids of the matched calls otherwise
+    # _result:
+    #     the calls matched by all of the stages, or None if they have not
+    #     been selected since the last change to the stages
+    _apply: ApplyFunction
+    _stages: list[tuple[Filter, str]]
+    _selections: list[Union[np.ndarray, set[int]]]
+    _result: Optional[Union[list[Call], CallStore]]
+
+    def __init__(self, customers: list[Customer],
+                 calls: Union[list[Call], CallStore],
+                 apply: ApplyFunction = _apply_filter) -> None:
+        """ Create a new pipeline with no stages, over the <calls> made by the
+        <customers>. Each stage is evaluated with <apply>, such as the apply
+        method of a FilterPool.
+
+        Precondition: if <calls> is a CallStore, it is a root store, and no
+        call is appended to it while this pipeline is used.
+        """
+        self.customers = customers
+        self.calls = calls
+        self._apply = apply
+        self._stages = []
+        self._selections = []
+        self._result = None
+
+    def __len__(self) -> int:
+        """ Return the number of stages of this pipeline.
+        """
+        return len(self._stages)
+
+    def stages(self) -> list[tuple[Filter, str]]:
+        """ Return the filter and the filter string of each stage of this
+        pipeline, in order.
+        """
+        return list(self._stages)
+
+    def push(self, f: Filter, filter_string: str) \
+            -> Union[list[Call], CallStore]:
+        """ Add a stage applying the filter <f> specified in <filter_string>
+        after the other stages, and return the calls matched by all of the
+        stages, in their original order.
+
+        Adding a ResetFilter removes all of the stages instead.
+        """
+        if isinstance(f, ResetFilter):
+            self._stages = []
+            self._selections = []
+            self._result = None
+            return self.result()
+
+        matched = self._apply(f, self.customers, self.calls, filter_string)
+        if isinstance(self.calls, CallStore):
+            selection = np.zeros(len(self.calls), dtype=bool)
+            selection[matched.positions()] = True
+        else:
+            selection = {id(call) for call in matched}
+        if self._selections:
+            selection &= self._selections[-1]
+
+        self._stages.append((f, filter_string))
+        self._selections.append(selection)
+        self._result = None
+        return self.result()
+
+    def undo(self) -> Union[list[Call], CallStore]:
+        """ Remove the last stage of this pipeline, if any, and return the
+        calls matched by the remaining stages, in their original order.
+        """
+        if self._stages:
+            self._stages.pop()
+            self._selections.pop()
+            self._result = None
+        return self.result()
+
+    def result(self) -> Union[list[Call], CallStore]:
+        """ Return the calls matched by all of the stages of this pipeline, in
+        their original order.
+        """
+        if self._result is None:
+            if not self._selections:
+                self._result = self.calls
+            elif isinstance(self.calls, CallStore):
+                self._result = self.calls.select(self._selections[-1])
+            else:
+                selection = self._selections[-1]
+                self._result = [call for call in self.calls
+                                if id(call) in selection]
+        return self._result
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'typing', 'numpy', 'call', 'callstore', 'customer',
+            'filter'
+        ],
+        'generated-members': 'pygame.*'
+    })
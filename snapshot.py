@@ -0,0 +1,458 @@
+"""
+CSC148, Winter 2025
+Assignment 1
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) 2025 Bogdan Simion, Diane Horton, Jacqueline Smith
+
+=== Module Description ===
+
+This file contains functions to save the state of the customers, after the
+events of a dataset were processed, into a binary snapshot file, and to
+restore that state without processing the events again.
+
+A snapshot file starts with the SNAPSHOT_MAGIC bytes, the format version and
+the length of a JSON header, followed by the JSON header itself. The header
+describes a number of sections, each of which is a NumPy array of fixed-size
+records stored at a given offset in the file. The sections are aligned so
+that the file can be memory-mapped, and each section used directly as a
+NumPy array without copying it:
+- numbers: every phone number, referred to by its index in the other sections
+- customers: the id of each customer and the range of its phone lines
+- lines: each phone line, its contract and the range of its bills
+- bills: each monthly bill
+- calls: each call, stored once even if it is in two call histories
+- months: the calls of each phone line in each month, in either direction,
+  as a range of the history section
+- history: the index of each call of the call histories, in order
+"""
+import datetime
+import gc
+import json
+import mmap
+import os
+import struct
+from typing import Optional
+
+import numpy as np
+
+from bill import Bill
+from call import Call
+from callstore import CallStore
+from contract import Contract, MTMContract, PrepaidContract, TermContract
+from customer import Customer
+from phoneline import PhoneLine
+
+SNAPSHOT_MAGIC = b'MEWBSNAP'
+SNAPSHOT_VERSION = 1
+
+# Layout of the start of a snapshot file: magic, version, header length
+_PREAMBLE = struct.Struct('<8sII')
+
+# Alignment in bytes of the header and of each section in a snapshot file
+_ALIGNMENT = 64
+
+# Contract classes, by the code stored for them in a snapshot
+_CONTRACTS = [MTMContract, TermContract, PrepaidContract]
+
+_CUSTOMER_DTYPE = np.dtype([('id', '<i8'), ('first_line', '<i8'),
+                            ('num_lines', '<i8')])
+_LINE_DTYPE = np.dtype([('number', '<i8'), ('contract', 'i1'),
+                        ('start', '<i8'), ('end', '<i8'),
+                        ('current_month', '<i4'), ('current_year', '<i4'),
+                        ('balance', '<f8'), ('bill', '<i8'),
+                        ('first_bill', '<i8'), ('num_bills', '<i8')])
+_BILL_DTYPE = np.dtype([('month', '<i4'), ('year', '<i4'),
+                        ('billed_min', '<i8'), ('free_min', '<i8'),
+                        ('min_rate', '<f8'), ('fixed_cost', '<f8'),
+                        ('type', '<i4')])
+_CALL_DTYPE = np.dtype([('src', '<i8'), ('dst', '<i8'),
+                        ('timestamp', '<i8'), ('duration', '<i8'),
+                        ('coords', '<f8', (4,))])
+_MONTH_DTYPE = np.dtype([('line', '<i8'), ('incoming', 'i1'),
+                         ('month', '<i4'), ('year', '<i4'),
+                         ('first_call', '<i8'), ('num_calls', '<i8')])
+
+
+class _Indexer:
+    """ Gives consecutive indices to distinct values, in the order in which
+    they are first seen.
+    """
+    # === Private Attributes ===
+    # _indices:
+    #     the index of each value seen so far
+    _indices: dict
+
+    def __init__(self) -> None:
+        """ Create a new indexer that has not seen any value.
+        """
+        self._indices = {}
+
+    def index(self, value: object) -> int:
+        """ Return the index of <value>, giving it the next index if it was
+        not seen before.
+        """
+        i = self._indices.get(value)
+        if i is None:
+            i = len(self._indices)
+            self._indices[value] = i
+        return i
+
+    def values(self) -> list:
+        """ Return all values seen so far, in the order of their indices.
+        """
+        return list(self._indices)
+
+
+def _date_ordinal(date: Optional[datetime.date]) -> int:
+    """ Return the proleptic Gregorian ordinal of <date>, or -1 if it is None.
+    """
+    return -1 if date is None else date.toordinal()
+
+
+def _ordinal_date(ordinal: int) -> Optional[datetime.date]:
+    """ Return the date with the proleptic Gregorian <ordinal>, or None if it
+    is -1.
+    """
+    return None if ordinal == -1 else datetime.date.fromordinal(ordinal)
+
+
+def save_snapshot(filename: str, customer_list: list[Customer],
+                  store: Optional[CallStore] = None,
+                  checkpoint: Optional[dict] = None) -> None:
+    """ Save the customers in <customer_list>, with their phone lines,
+    contracts, bills and call histories, into the snapshot file <filename>.
+
+    If <store> is given, the order of its calls and its line ids are saved as
+    well, so that load_snapshot can rebuild it. The JSON-serializable
+    <checkpoint> is saved in the header of the file, to be returned by
+    read_checkpoint.
+
+    The snapshot is written to a temporary file first, and then moved over
+    <filename>, so that <filename> always holds a complete snapshot, even if
+    the program stops while saving.
+
+    Precondition: every contract is a MTMContract, a TermContract or a
+    PrepaidContract, and every call in <store> is in a call history of a
+    phone line of one of the customers.
+    """
+    numbers = _Indexer()
+    bill_types = _Indexer()
+    calls = _Indexer()
+    if store is not None:
+        # the calls and line ids of the store come first, so that its columns
+        # can be saved as they are
+        for number in store.numbers():
+            numbers.index(number)
+        for call in store:
+            calls.index(id(call))
+    store_size = len(calls.values())
+    store_numbers = len(numbers.values())
+
+    call_objects = {}
+    customers = []
+    lines = []
+    bills = []
+    months = []
+    history = []
+    for customer in customer_list:
+        numbers_owned = customer.get_phone_numbers()
+        customers.append((customer.get_id(), len(lines), len(numbers_owned)))
+        for number in numbers_owned:
+            line = customer.get_phone_line(number)
+            line_index = len(lines)
+            contract = line.contract
+            current_bill = -1
+            first_bill = len(bills)
+            for (month, year), bill in line.bills.items():
+                if bill is contract.bill:
+                    current_bill = len(bills)
+                bills.append((month, year, bill.billed_min, bill.free_min,
+                              bill.min_rate, bill.fixed_cost,
+                              bill_types.index(bill.type)))
+            lines.append((
+                numbers.index(number), _contract_code(contract),
+                _date_ordinal(contract.start),
+                _date_ordinal(getattr(contract, 'end', None)),
+                getattr(contract, 'current_month', 0),
+                getattr(contract, 'current_year', 0),
+                getattr(contract, 'balance', 0.0), current_bill,
+                first_bill, len(bills) - first_bill))
+
+            for incoming, calls_by_month in \
+                    [(0, line.callhistory.outgoing_calls),
+                     (1, line.callhistory.incoming_calls)]:
+                for (month, year), month_calls in calls_by_month.items():
+                    months.append((line_index, incoming, month, year,
+                                   len(history), len(month_calls)))
+                    for call in month_calls:
+                        call_objects[id(call)] = call
+                        history.append(calls.index(id(call)))
+
+    call_records = []
+    for call_id in calls.values():
+        call = call_objects[call_id]
+        call_records.append((numbers.index(call.src_number),
+                             numbers.index(call.dst_number),
+                             call.timestamp, call.duration,
+                             call.src_loc + call.dst_loc))
+
+    number_values = [n.encode() for n in numbers.values()]
+    width = max([len(n) for n in number_values], default=1)
+    sections = {
+        'numbers': np.array(number_values, dtype=f'S{width}'),
+        'customers': np.array(customers, dtype=_CUSTOMER_DTYPE),
+        'lines': np.array(lines, dtype=_LINE_DTYPE),
+        'bills': np.array(bills, dtype=_BILL_DTYPE),
+        'calls': np.array(call_records, dtype=_CALL_DTYPE),
+        'months': np.array(months, dtype=_MONTH_DTYPE),
+        'history': np.array(history, dtype='<i8'),
+    }
+    _write_sections(filename, sections, {'bill_types': bill_types.values(),
+                                         'store_size': store_size,
+                                         'store_numbers': store_numbers,
+                                         'checkpoint': checkpoint})
+
+
+def _contract_code(contract: Contract) -> int:
+    """ Return the code stored in a snapshot for the type of <contract>.
+    """
+    for code, contract_class in enumerate(_CONTRACTS):
+        if type(contract) is contract_class:
+            return code
+    raise ValueError(f"cannot save a {type(contract).__name__} "
+                     f"in a snapshot")
+
+
+def _align(offset: int) -> int:
+    """ Return the smallest multiple of _ALIGNMENT that is >= <offset>.
+    """
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def _write_sections(filename: str, sections: dict[str, np.ndarray],
+                    metadata: dict) -> None:
+    """ Write the snapshot file <filename>, holding the <sections> and the
+    <metadata> in its header.
+    """
+    # the offsets depend on the length of the header, which contains them, so
+    # reserve enough room for the largest possible offsets first
+    table = {name: {'dtype': (array.dtype.descr if array.dtype.names
+                              else array.dtype.str),
+                    'count': len(array),
+                    'offset': 2 ** 63 - 1}
+             for name, array in sections.items()}
+    reserved = len(json.dumps({'sections': table, **metadata}).encode())
+    offset = _align(_PREAMBLE.size + reserved)
+    for name, array in sections.items():
+        table[name]['offset'] = offset
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({'sections': table, **metadata}).encode()
+    header = header.ljust(reserved)
+
+    temporary = filename + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header)))
+        f.write(header)
+        for name, array in sections.items():
+            f.seek(table[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, filename)
+
+
+def read_sections(filename: str) -> tuple[dict[str, np.ndarray], dict]:
+    """ Memory-map the snapshot file <filename>, and return its sections, as
+    NumPy arrays backed by the file, along with the metadata in its header.
+
+    Raise a ValueError if <filename> is not a snapshot file, or if it was
+    written with a different version of the snapshot format.
+    """
+    with open(filename, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(buffer) < _PREAMBLE.size:
+        raise ValueError(f"{filename} is not a snapshot file")
+    magic, version, header_size = _PREAMBLE.unpack_from(buffer)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"{filename} is not a snapshot file")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"{filename} has snapshot version {version}, "
+                         f"expected {SNAPSHOT_VERSION}")
+    metadata = json.loads(buffer[_PREAMBLE.size:
+                                 _PREAMBLE.size + header_size])
+    sections = {}
+    for name, info in metadata.pop('sections').items():
+        dtype = info['dtype']
+        if isinstance(dtype, list):
+            dtype = [tuple(field) for field in dtype]
+        dtype = np.dtype(dtype)
+        sections[name] = np.frombuffer(buffer, dtype=dtype,
+                                       count=info['count'],
+                                       offset=info['offset'])
+    return sections, metadata
+
+
+def read_checkpoint(filename: str) -> Optional[dict]:
+    """ Return the checkpoint saved in the snapshot file <filename>, or None
+    if it was saved without one.
+
+    Raise a ValueError if <filename> is not a snapshot file, or if it was
+    written with a different version of the snapshot format.
+    """
+    return read_sections(filename)[1]['checkpoint']
+
+
+def load_snapshot(filename: str) \
+        -> tuple[list[Customer], Optional[CallStore]]:
+    """ Return the customers saved in the snapshot file <filename>, along with
+    the CallStore saved with them, or None if no store was saved.
+
+    Raise a ValueError if <filename> is not a snapshot file, or if it was
+    written with a different version of the snapshot format.
+    """
+    sections, metadata = read_sections(filename)
+    # only new objects are created, none of which can be garbage yet, so the
+    # collector would only slow the restore down
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _restore(sections, metadata)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _restore(sections: dict[str, np.ndarray], metadata: dict) \
+        -> tuple[list[Customer], Optional[CallStore]]:
+    """ Return the customers and the CallStore saved in the <sections> of a
+    snapshot file, with the <metadata> of its header, as described in
+    load_snapshot.
+    """
+    numbers = [n.decode() for n in sections['numbers'].tolist()]
+    calls = _restore_calls(sections['calls'], numbers)
+
+    bills = []
+    for month, year, billed_min, free_min, min_rate, fixed_cost, bill_type \
+            in sections['bills'].tolist():
+        bill = Bill()
+        bill.billed_min = billed_min
+        bill.free_min = free_min
+        bill.min_rate = min_rate
+        bill.fixed_cost = fixed_cost
+        bill.type = metadata['bill_types'][bill_type]
+        bills.append(((month, year), bill))
+
+    lines = []
+    for record in sections['lines'].tolist():
+        lines.append(_restore_line(record, numbers, bills))
+
+    history = sections['history'].tolist()
+    for line_index, incoming, month, year, first_call, num_calls in \
+            sections['months'].tolist():
+        callhistory = lines[line_index].callhistory
+        if incoming:
+            calls_by_month = callhistory.incoming_calls
+        else:
+            calls_by_month = callhistory.outgoing_calls
+        calls_by_month[(month, year)] = \
+            [calls[i] for i in history[first_call:first_call + num_calls]]
+
+    customer_list = []
+    for cid, first_line, num_lines in sections['customers'].tolist():
+        customer = Customer(cid)
+        for line in lines[first_line:first_line + num_lines]:
+            customer.add_phone_line(line)
+        customer_list.append(customer)
+
+    store = None
+    if metadata['store_size'] > 0:
+        records = sections['calls'][:metadata['store_size']]
+        coords = records['coords']
+        columns = {
+            'durations': records['duration'],
+            'timestamps': records['timestamp'],
+            'src_lines': records['src'],
+            'dst_lines': records['dst'],
+            'src_lon': coords[:, 0],
+            'src_lat': coords[:, 1],
+            'dst_lon': coords[:, 2],
+            'dst_lat': coords[:, 3],
+        }
+        store = CallStore.from_columns(calls[:metadata['store_size']],
+                                       columns,
+                                       numbers[:metadata['store_numbers']])
+        for customer in customer_list:
+            store.add_customer(customer)
+    return customer_list, store
+
+
+def _restore_calls(records: np.ndarray, numbers: list[str]) -> list[Call]:
+    """ Return the calls saved as the calls section <records>, using the saved
+    phone <numbers>.
+    """
+    packed = np.ascontiguousarray(records['coords'], dtype='=f8').tobytes()
+    size = records['coords'].shape[1] * 8
+    months = records['timestamp'].astype('datetime64[s]') \
+        .astype('datetime64[M]').astype(np.int64)
+    bill_dates = {k: (k % 12 + 1, k // 12 + 1970)
+                  for k in np.unique(months).tolist()}
+
+    calls = []
+    for i, (src, dst, timestamp, duration, month) in enumerate(zip(
+            records['src'].tolist(), records['dst'].tolist(),
+            records['timestamp'].tolist(), records['duration'].tolist(),
+            months.tolist())):
+        calls.append(Call.from_packed(
+            numbers[src], numbers[dst], timestamp, duration,
+            packed[i * size:(i + 1) * size], bill_dates[month]))
+    return calls
+
+
+def _restore_line(record: tuple, numbers: list[str],
+                  bills: list[tuple[tuple[int, int], Bill]]) -> PhoneLine:
+    """ Return the PhoneLine saved as the lines section <record>, without its
+    call history, using the saved <numbers> and <bills>.
+    """
+    number, code, start, end, current_month, current_year, balance, \
+        current_bill, first_bill, num_bills = record
+    start_date = _ordinal_date(start)
+    contract_class = _CONTRACTS[code]
+    if contract_class is TermContract:
+        contract = TermContract(start_date or datetime.date.min,
+                                _ordinal_date(end))
+        contract.current_month = current_month
+        contract.current_year = current_year
+    elif contract_class is PrepaidContract:
+        contract = PrepaidContract(start_date, -balance)
+    else:
+        contract = MTMContract(start_date)
+    contract.start = start_date
+
+    line = PhoneLine(numbers[number], contract)
+    line.bills = dict(bills[first_bill:first_bill + num_bills])
+    if current_bill != -1:
+        contract.bill = bills[current_bill][1]
+    return line
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'typing', 'datetime', 'gc', 'json', 'mmap', 'os',
+            'struct', 'numpy', 'bill', 'call', 'callstore', 'contract',
+            'customer', 'phoneline'
+        ],
+        'allowed-io': ['_write_sections', 'read_sections'],
+        'disable': ['R0914'],
+        'generated-members': 'pygame.*'
+    })
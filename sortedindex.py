@@ -0,0 +1,79 @@
+"""
+CSC148, Winter 2025
+Assignment 1
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) 2025 Bogdan Simion, Diane Horton, Jacqueline Smith
+
+=== Module Description ===
+
+This file contains the SortedIndex class, an index over a column of values,
+such as the durations of calls, used to find the values above or below a
+threshold with a binary search instead of looking at every value.
+"""
+import numpy as np
+
+# Queries matching more than one in SCAN_RATIO values check the whole column
+SCAN_RATIO = 8
+
+
+class SortedIndex:
+    """ The positions of the values of a column, sorted by value.
+
+    A threshold query finds the matching values with a binary search, in
+    O(log n) time, then returns their k positions in their original order,
+    in O(k log k) time. When more than one in SCAN_RATIO values match, sorting
+    their positions would take longer than checking every value of the
+    column, so the column is checked instead.
+    """
+    # === Private Attributes ===
+    # _column:
+    #     the values of the column, in their original order
+    # _values:
+    #     the values of the column, in increasing order
+    # _positions:
+    #     the position in the column of each value of <_values>
+    _column: np.ndarray
+    _values: np.ndarray
+    _positions: np.ndarray
+
+    def __init__(self, values: np.ndarray) -> None:
+        """ Create a new index over the column <values>.
+        """
+        self._column = values
+        self._positions = np.argsort(values, kind='stable')
+        self._values = values[self._positions]
+
+    def less_than(self, value: float) -> np.ndarray:
+        """ Return the increasing positions of the values less than <value>.
+        """
+        end = np.searchsorted(self._values, value, side='left')
+        if end * SCAN_RATIO > len(self._values):
+            return np.flatnonzero(self._column < value)
+        return np.sort(self._positions[:end])
+
+    def greater_than(self, value: float) -> np.ndarray:
+        """ Return the increasing positions of the values greater than
+        <value>.
+        """
+        start = np.searchsorted(self._values, value, side='right')
+        if (len(self._values) - start) * SCAN_RATIO > len(self._values):
+            return np.flatnonzero(self._column > value)
+        return np.sort(self._positions[start:])
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'numpy'
+        ],
+        'generated-members': 'pygame.*'
+    })
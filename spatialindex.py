@@ -0,0 +1,155 @@
+"""
+CSC148, Winter 2025
+Assignment 1
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) 2025 Bogdan Simion, Diane Horton, Jacqueline Smith
+
+=== Module Description ===
+
+This file contains the GridIndex class, a spatial index over the sources and
+destinations of calls, used to find the calls made or received in a
+rectangular area without looking at every call.
+"""
+import numpy as np
+
+# Lower-left and upper-right corners (long, lat) of the area covered by the
+# grid: the boundaries of the map
+GRID_MIN = (-79.697878, 43.576959)
+GRID_MAX = (-79.196382, 43.799568)
+
+# Default number of cells of the grid, along each axis
+GRID_CELLS = 128
+
+
+class GridIndex:
+    """ A uniform grid over the map, where each cell lists the calls whose
+    source or destination is in that cell.
+
+    A rectangle query only looks at the cells overlapping the rectangle. The
+    calls in cells entirely inside the rectangle match without being checked;
+    only the calls in the cells on the border of the rectangle have their
+    coordinates compared with it.
+
+    Sources and destinations outside of the map are not indexed, since they
+    can never be in a rectangle within the map.
+    """
+    # === Private Attributes ===
+    # _cells:
+    #     the number of cells of the grid along each axis
+    # _calls:
+    #     the position of the call of each indexed source and destination,
+    #     ordered by cell
+    # _lon:
+    #     the longitude of each indexed source and destination, in the same
+    #     order as <_calls>
+    # _lat:
+    #     the latitude of each indexed source and destination, in the same
+    #     order as <_calls>
+    # _starts:
+    #     the start of the entries of each cell in <_calls>, followed by the
+    #     number of entries; cell (x, y) is number y * <_cells> + x
+    _cells: int
+    _calls: np.ndarray
+    _lon: np.ndarray
+    _lat: np.ndarray
+    _starts: np.ndarray
+
+    def __init__(self, src_lon: np.ndarray, src_lat: np.ndarray,
+                 dst_lon: np.ndarray, dst_lat: np.ndarray,
+                 cells: int = GRID_CELLS) -> None:
+        """ Create a new index over the calls with the given source and
+        destination coordinates, where the call at position i has its source
+        at (<src_lon>[i], <src_lat>[i]) and its destination at
+        (<dst_lon>[i], <dst_lat>[i]). The grid has <cells> cells along each
+        axis.
+        """
+        count = len(src_lon)
+        lon = np.concatenate([src_lon, dst_lon])
+        lat = np.concatenate([src_lat, dst_lat])
+        calls = np.concatenate([np.arange(count), np.arange(count)])
+        inside = ((GRID_MIN[0] <= lon) & (lon <= GRID_MAX[0])
+                  & (GRID_MIN[1] <= lat) & (lat <= GRID_MAX[1]))
+        lon = lon[inside]
+        lat = lat[inside]
+        calls = calls[inside]
+
+        self._cells = cells
+        cell = self._cell_y(lat) * cells + self._cell_x(lon)
+        # the order of the entries within a cell does not matter, since the
+        # results of a query are sorted
+        order = np.argsort(cell)
+        self._calls = calls[order]
+        self._lon = lon[order]
+        self._lat = lat[order]
+        self._starts = np.searchsorted(cell[order],
+                                       np.arange(cells * cells + 1))
+
+    def _cell_x(self, lon: np.ndarray) -> np.ndarray:
+        """ Return the column of the grid of each of the longitudes <lon>.
+        """
+        scaled = (lon - GRID_MIN[0]) / (GRID_MAX[0] - GRID_MIN[0])
+        return np.clip((scaled * self._cells).astype(np.int64),
+                       0, self._cells - 1)
+
+    def _cell_y(self, lat: np.ndarray) -> np.ndarray:
+        """ Return the row of the grid of each of the latitudes <lat>.
+        """
+        scaled = (lat - GRID_MIN[1]) / (GRID_MAX[1] - GRID_MIN[1])
+        return np.clip((scaled * self._cells).astype(np.int64),
+                       0, self._cells - 1)
+
+    def query(self, lower_long: float, lower_lat: float,
+              upper_long: float, upper_lat: float) -> np.ndarray:
+        """ Return the increasing positions of the calls whose source or
+        destination is in the rectangle from (<lower_long>, <lower_lat>) to
+        (<upper_long>, <upper_lat>), including its boundary.
+        """
+        x0, x1 = self._cell_x(np.array([lower_long, upper_long])).tolist()
+        y0, y1 = self._cell_y(np.array([lower_lat, upper_lat])).tolist()
+        starts = self._starts
+        cells = self._cells
+
+        # the cells strictly between the cells of the corners can only hold
+        # points inside the rectangle, since the cell of a point grows with
+        # its coordinates
+        matched = []
+        border = []
+        for y in range(y0, y1 + 1):
+            row = y * cells
+            if y in (y0, y1) or x1 - x0 < 2:
+                border.append((starts[row + x0], starts[row + x1 + 1]))
+            else:
+                border.append((starts[row + x0], starts[row + x0 + 1]))
+                matched.append((starts[row + x0 + 1], starts[row + x1]))
+                border.append((starts[row + x1], starts[row + x1 + 1]))
+
+        found = [self._calls[start:end] for start, end in matched]
+        for start, end in border:
+            lon = self._lon[start:end]
+            lat = self._lat[start:end]
+            found.append(self._calls[start:end][
+                (lower_long <= lon) & (lon <= upper_long)
+                & (lower_lat <= lat) & (lat <= upper_lat)])
+        # a call with both ends in the rectangle is found twice
+        positions = np.sort(np.concatenate(found + [np.empty(0, np.int64)]))
+        distinct = np.ones(len(positions), dtype=bool)
+        distinct[1:] = positions[1:] != positions[:-1]
+        return positions[distinct]
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'numpy'
+        ],
+        'generated-members': 'pygame.*'
+    })
@@ -1,11 +1,22 @@
 import datetime
+import io
+import json
 import math
+import os
+import subprocess
+import sys
 
 from assignments.a1.starter_code.starter_code.callhistory import CallHistory
+from benchmark import make_log
 from bill import Bill
+from billing import bill_calls, bill_store
+import numpy as np
+import pygame
 import pytest
 
-from application import create_customers, process_event_history
+from application import create_customers, process_event_history, \
+    build_number_directory, stream_data, parse_time, TIME_FORMAT, \
+    load_dataset, EventProcessor
 from contract import MTM_MINS_COST, MTM_MONTHLY_FEE, PREPAID_MINS_COST, \
     TERM_DEPOSIT, \
     TERM_MINS_COST, \
@@ -16,6 +27,18 @@ from customer import Customer
 from filter import CustomerFilter, DurationFilter, LocationFilter, ResetFilter
 from phoneline import PhoneLine
 from call import Call
+from billrun import CSV_COLUMNS, FORMATS, run_bills
+from callstore import CallStore
+from drawable import Drawable
+from eventstream import iter_json_array, tail_jsonl
+from parallel import FilterPool
+from pipeline import FilterPipeline
+from filtercache import FilterCache
+from snapshot import SNAPSHOT_VERSION, load_snapshot, save_snapshot
+from sortedindex import SortedIndex
+from spatialindex import GRID_MAX, GRID_MIN, GridIndex
+from visualizer import CLUSTER_COLOUR, CLUSTER_SIZE, LOD_THRESHOLD, Map, \
+    PYRAMID_ZOOMS, SCREEN_SIZE
 
 """
 This is a sample test file with a limited set of cases, which are similar in
@@ -1851,5 +1874,1215 @@ def test_process_event_history_chronological(dummy_customers_for_events):
     assert len(feb_incoming) == 1, "There should be 1 incoming call in February for Customer B."
 
 
+
+###############################################################################
+# Tests for the phone number directory
+
+
+def test_build_number_directory():
+    """
+    Test that every phone number maps to its owning customer and phone line,
+    and that create_customers fills in the same directory.
+    """
+    directory = {}
+    customers = create_customers(test_dict1, directory)
+    assert directory == build_number_directory(customers)
+    assert set(directory) == {'867-5309', '273-8255', '649-2568'}
+    customer, line = directory['273-8255']
+    assert customer is customers[0]
+    assert line.get_number() == '273-8255'
+    assert customer.get_phone_line('273-8255') is line
+    assert customer.get_phone_line('000-0000') is None
+
+
+def test_process_event_history_unknown_number(dummy_customers_for_events):
+    """
+    Test that a call to a number that does not belong to any customer is
+    still recorded for the customer that made it.
+    """
+    log = {
+        "events": [
+            make_event("call", "1111", "9999", "2020-01-15 10:00:00", 60,
+                       [-79.5, 43.7], [-79.6, 43.8])
+        ]
+    }
+    process_event_history(log, dummy_customers_for_events)
+    custA = dummy_customers_for_events[0]
+    assert len(custA.get_history()[0]) == 1
+    assert '9999' not in custA
+
+
+def test_customer_cancel_phone_line_updates_lookup():
+    """
+    Test that a cancelled phone line can no longer be found by its number.
+    """
+    customer = create_customer()
+    assert '273-8255' in customer
+    assert customer.cancel_phone_line('273-8255') == 50
+    assert '273-8255' not in customer
+    assert customer.get_phone_line('273-8255') is None
+    assert customer.cancel_phone_line('273-8255') is None
+
+
+
+###############################################################################
+# Tests for streaming event ingestion
+
+
+def test_iter_json_array_small_chunks():
+    """
+    Test that the items of an array are streamed correctly even when values
+    are split across the chunks read from the file.
+    """
+    text = json.dumps(test_dict1)
+    for chunk_size in [1, 3, 16]:
+        events = iter_json_array(io.StringIO(text), 'events', chunk_size)
+        assert list(events) == test_dict1['events']
+        customers = iter_json_array(io.StringIO(text), 'customers',
+                                    chunk_size)
+        assert list(customers) == test_dict1['customers']
+    assert list(iter_json_array(io.StringIO('{"a": 12345}'), 'b')) == []
+
+
+def test_stream_data_customers_after_events(tmp_path):
+    """
+    Test that the customers stored after the events, as in dataset.json, are
+    read the same as with json.load, when the events are skipped without
+    being decoded, including strings holding brackets, quotes and escapes.
+    """
+    log = {'events': test_dict1['events'] + [
+        {'type': 'note', 'text': 'a ]}" [{ \\', 'nested': [[], {'a': [1]}]}],
+        'notes': '"]}',
+        'customers': test_dict1['customers']}
+    filename = str(tmp_path / 'dataset.json')
+    with open(filename, 'w') as f:
+        json.dump(log, f)
+    with open(filename) as f:
+        expected = json.load(f)['customers']
+    assert stream_data(filename)['customers'] == expected
+    text = json.dumps(log)
+    for chunk_size in [1, 2, 3, 7, 64]:
+        customers = iter_json_array(io.StringIO(text), 'customers',
+                                    chunk_size)
+        assert list(customers) == expected
+
+
+def test_stream_data_json(tmp_path):
+    """
+    Test that processing a streamed dataset produces the same bills as
+    processing the dataset loaded all at once.
+    """
+    filename = str(tmp_path / 'dataset.json')
+    with open(filename, 'w') as f:
+        json.dump(test_dict1, f)
+
+    log = stream_data(filename)
+    assert log['customers'] == test_dict1['customers']
+    customers = create_customers(log)
+    process_event_history(log, customers)
+
+    expected = create_customers(test_dict1)
+    process_event_history(test_dict1, expected)
+    assert customers[0].generate_bill(1, 2018) == \
+           expected[0].generate_bill(1, 2018)
+
+
+def test_stream_data_jsonl(tmp_path):
+    """
+    Test that a JSON-Lines dataset lists its customers first and then streams
+    its events.
+    """
+    filename = str(tmp_path / 'dataset.jsonl')
+    with open(filename, 'w') as f:
+        for record in test_dict1['customers'] + test_dict1['events']:
+            f.write(json.dumps(record) + '\n')
+
+    log = stream_data(filename)
+    assert log['customers'] == test_dict1['customers']
+    assert list(log['events']) == test_dict1['events']
+
+
+def test_tail_jsonl_partial_line(tmp_path):
+    """
+    Test that a line which has not been completely written yet is only read
+    once its newline is appended.
+    """
+    filename = str(tmp_path / 'feed.jsonl')
+    with open(filename, 'w') as f:
+        f.write(json.dumps(test_dict1['events'][0]) + '\n')
+        f.write(json.dumps(test_dict1['events'][1])[:10])
+
+    appended = []
+
+    def stop() -> bool:
+        """ Finish writing the second line the first time the end of the
+        file is reached, then stop.
+        """
+        if appended:
+            return True
+        with open(filename, 'a') as feed:
+            feed.write(json.dumps(test_dict1['events'][1])[10:] + '\n')
+        appended.append(True)
+        return False
+
+    records = list(tail_jsonl(filename, poll_interval=0, stop=stop))
+    assert records == test_dict1['events'][:2]
+
+
+
+###############################################################################
+# Tests for the shared sprite cache
+
+
+def test_call_drawables_share_sprites():
+    """
+    Test that the sprites of different calls are loaded once and shared.
+    """
+    call1 = create_call2('111-1111', '222-2222', 60)
+    call2 = create_call2('333-3333', '444-4444', 120)
+    assert call1.get_drawables()[0].sprite is call2.get_drawables()[0].sprite
+    assert call1.get_drawables()[1].sprite is call2.get_drawables()[1].sprite
+    assert call1.get_drawables()[0].sprite is not \
+           call1.get_drawables()[1].sprite
+    assert call1.get_drawables()[0].sprite.get_size() == (13, 13)
+
+
+
+def test_headless_modules_do_not_import_pygame():
+    """
+    Test that billing and filtering can be used without importing Pygame, and
+    that creating calls does not create any drawables.
+    """
+    code = ("import sys, application, filter\n"
+            "assert 'pygame' not in sys.modules\n"
+            "assert 'drawable' not in sys.modules\n")
+    result = subprocess.run([sys.executable, '-c', code],
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0
+
+
+
+def test_call_compact_representation():
+    """
+    Test that a Call has no __dict__, shares its phone number strings with
+    other calls, and still gives back the values it was created with.
+    """
+    t = datetime.datetime(2018, 3, 4, 5, 6, 7)
+    call1 = Call(''.join(['123', '-4567']), '765-4321', t, 30,
+                 (-79.5, 43.7), (-79.4, 43.65))
+    call2 = Call(''.join(['123-', '4567']), '765-4321', t, 45,
+                 (-79.3, 43.6), (-79.2, 43.75))
+    assert not hasattr(call1, '__dict__')
+    assert call1.src_number is call2.src_number
+    assert call1.time == t
+    assert call1.timestamp == int(t.replace(
+        tzinfo=datetime.timezone.utc).timestamp())
+    assert call1.get_bill_date() == (3, 2018)
+    assert call1.src_loc == (-79.5, 43.7)
+    assert call2.dst_loc == (-79.2, 43.75)
+
+
+
+###############################################################################
+# Tests for the columnar CallStore
+
+
+def make_store_dataset() -> tuple[list[Customer], CallStore, list[Call]]:
+    """ Return the customers created from a synthetic dataset, the CallStore
+    filled in while processing its events, and the list of all outgoing
+    calls in the same order as the store.
+    """
+    log = make_log(30, 400)
+    customers = create_customers(log)
+    store = CallStore()
+    process_event_history(log, customers, store=store)
+    return customers, store, list(store)
+
+
+@pytest.fixture
+def store_dataset():
+    """
+    Create the customers, the CallStore and the calls of make_store_dataset.
+    """
+    return make_store_dataset()
+
+
+def test_call_store_columns():
+    """
+    Test that the columns of a CallStore match the attributes of its calls.
+    """
+    customers, store, calls = make_store_dataset()
+    assert len(store) == len(calls) == 400
+    assert sorted(calls, key=id) == sorted(
+        [c for cust in customers for c in cust.get_history()[0]], key=id)
+    assert list(store.durations) == [c.duration for c in calls]
+    assert list(store.timestamps) == [c.timestamp for c in calls]
+    assert list(store.src_lon) == [c.src_loc[0] for c in calls]
+    assert list(store.dst_lat) == [c.dst_loc[1] for c in calls]
+    assert store.line_id(calls[0].src_number) == store.src_lines[0]
+    assert store.line_id('not a number') == -1
+    assert list(store[10:20]) == calls[10:20]
+    assert store[5] is calls[5]
+
+
+@pytest.mark.parametrize('filter_class, filter_string', [
+    (CustomerFilter, '1003'),
+    (CustomerFilter, '9999'),
+    (CustomerFilter, 'abc'),
+    (DurationFilter, 'L100'),
+    (DurationFilter, 'G300'),
+    (DurationFilter, 'L000'),
+    (DurationFilter, 'X100'),
+    (LocationFilter, '-79.6, 43.6, -79.4, 43.7'),
+    (LocationFilter, '-79.6, 43.6'),
+])
+def test_call_store_filters_match_lists(filter_class, filter_string):
+    """
+    Test that filtering a CallStore selects the same calls, in the same
+    order, as filtering the list of its calls.
+    """
+    customers, store, calls = make_store_dataset()
+    expected = filter_class().apply(customers, calls, filter_string)
+    result = filter_class().apply(customers, store, filter_string)
+    assert isinstance(result, CallStore)
+    assert list(result) == list(expected)
+
+    # filters can be applied again to the result
+    again = DurationFilter().apply(customers, result, 'G200')
+    assert list(again) == DurationFilter().apply(customers, list(expected),
+                                                 'G200')
+
+
+def test_call_store_reset_filter():
+    """
+    Test that resetting the filters on a CallStore returns all of the calls.
+    """
+    customers, store, calls = make_store_dataset()
+    filtered = DurationFilter().apply(customers, store, 'G300')
+    assert ResetFilter().apply(customers, filtered, '') is store
+    combined = CallStore.concatenate([store[:100], store[100:]])
+    assert list(combined) == calls
+
+
+
+###############################################################################
+# Tests for batch billing
+
+
+def test_bill_calls_matches_bill_call():
+    """
+    Test that billing a batch of calls gives the same bills as billing each
+    call in turn, including when the free minutes of a term contract run out
+    part way through the month.
+    """
+    durations = [300, 120, 121, 3000, 30, 0, 600]
+    expected = create_customer()
+    for number in expected.get_phone_numbers():
+        for duration in durations:
+            call = Call(number, '000-0000', datetime.datetime(2017, 12, 5),
+                        duration, (0.0, 0.0), (0.0, 0.0))
+            expected.get_phone_line(number).contract.bill_call(call)
+
+    customer = create_customer()
+    lines = [customer.get_phone_line(n) for n in customer.get_phone_numbers()]
+    line_index = np.repeat(np.arange(len(lines)), len(durations))
+    bill_calls(lines, line_index, np.array(durations * len(lines)))
+
+    for line_bill, exp_bill in zip(customer.generate_bill(12, 2017)[2],
+                                   expected.generate_bill(12, 2017)[2]):
+        assert line_bill == pytest.approx(exp_bill)
+    assert lines[2].contract.balance == pytest.approx(
+        expected.get_phone_line('649-2568').contract.balance)
+
+
+def test_bill_store_matches_process_event_history():
+    """
+    Test that billing all of the calls of a dataset month by month in batches
+    gives exactly the same bills and prepaid balances as processing the
+    events one at a time.
+    """
+    log = make_log(10, 2000)
+    expected = create_customers(log)
+    store = CallStore()
+    process_event_history(log, expected, store=store)
+
+    customers = create_customers(log)
+    bill_store(customers, store)
+    for month in range(1, 13):
+        for cust, exp in zip(customers, expected):
+            assert cust.generate_bill(month, 2018) == \
+                exp.generate_bill(month, 2018)
+    for cust, exp in zip(customers, expected):
+        for number in exp.get_phone_numbers():
+            contract = exp.get_phone_line(number).contract
+            if isinstance(contract, PrepaidContract):
+                assert cust.get_phone_line(number).contract.balance == \
+                    contract.balance
+
+
+
+###############################################################################
+# Tests for parsing event times
+
+
+@pytest.mark.parametrize('text', [
+    '2018-01-01 09:44:14',
+    '2019-12-31 23:59:59',
+    '2018-1-1 9:04:14',
+])
+def test_parse_time_matches_strptime(text):
+    """
+    Test that parse_time gives the same result as datetime.strptime.
+    """
+    assert parse_time(text) == datetime.datetime.strptime(text, TIME_FORMAT)
+
+
+@pytest.mark.parametrize('text', [
+    '2018-01-01T09:44:14',
+    '2018-02-30 09:44:14',
+    '2018-01-01 09:44',
+    '2018-01-01 09:44+01',
+    '2018-W01-1 09:44:14',
+])
+def test_parse_time_invalid(text):
+    """
+    Test that parse_time rejects the strings that datetime.strptime rejects.
+    """
+    with pytest.raises(ValueError):
+        parse_time(text)
+
+
+def test_call_bill_dates_are_shared():
+    """
+    Test that calls made in the same month share their billing date.
+    """
+    call1 = create_dummy_call2('111', '222', 10, '2018-05-01 00:00:00')
+    call2 = create_dummy_call2('111', '222', 10, '2018-05-31 23:59:59')
+    call3 = create_dummy_call2('111', '222', 10, '2018-06-01 00:00:00')
+    assert call1.get_bill_date() == (5, 2018)
+    assert call1.get_bill_date() is call2.get_bill_date()
+    assert call3.get_bill_date() == (6, 2018)
+
+
+
+###############################################################################
+# Tests for snapshots
+
+
+def _customer_state(customers):
+    """ Return the bills and call histories of all <customers>, to compare
+    them. """
+    state = []
+    for cust in customers:
+        for number in cust.get_phone_numbers():
+            line = cust.get_phone_line(number)
+            state.append((cust.get_id(), number, type(line.contract),
+                          getattr(line.contract, 'balance', None),
+                          line.contract.bill.get_summary(),
+                          {k: b.get_summary() for k, b in line.bills.items()},
+                          [(k, [str(c) for c in v]) for k, v in
+                           line.callhistory.outgoing_calls.items()],
+                          [(k, [str(c) for c in v]) for k, v in
+                           line.callhistory.incoming_calls.items()]))
+    return state
+
+
+def test_snapshot_round_trip(tmp_path):
+    """
+    Test that restoring a snapshot gives the same customers and calls.
+    """
+    log = make_log(30, 2000)
+    customers = create_customers(log)
+    store = CallStore()
+    process_event_history(log, customers, store=store)
+    customers[0].cancel_phone_line(customers[0].get_phone_numbers()[0])
+
+    filename = str(tmp_path / 'test.snapshot')
+    save_snapshot(filename, customers, store)
+    restored, restored_store = load_snapshot(filename)
+    assert _customer_state(restored) == _customer_state(customers)
+    assert [str(c) for c in restored_store] == [str(c) for c in store]
+    assert np.array_equal(restored_store.src_lines, store.src_lines)
+
+    # a call in two histories is restored as one object
+    call = restored_store[0]
+    dst = [c for c in restored if call.dst_number in c]
+    if dst:
+        incoming = dst[0].get_phone_line(call.dst_number) \
+            .callhistory.incoming_calls[call.get_bill_date()]
+        assert any(c is call for c in incoming)
+
+    # the restored customers keep working
+    restored[1].new_month(1, 2019)
+    customers[1].new_month(1, 2019)
+    assert restored[1].generate_bill(1, 2019) == \
+        customers[1].generate_bill(1, 2019)
+
+
+def test_snapshot_rejects_other_versions(tmp_path):
+    """
+    Test that a snapshot with another format version, or a file that is not a
+    snapshot, is rejected.
+    """
+    filename = tmp_path / 'test.snapshot'
+    save_snapshot(str(filename), create_customers(make_log(2, 0)))
+    data = bytearray(filename.read_bytes())
+    data[8:12] = (SNAPSHOT_VERSION + 1).to_bytes(4, 'little')
+    filename.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        load_snapshot(str(filename))
+    filename.write_bytes(b'{"events": []}')
+    with pytest.raises(ValueError):
+        load_snapshot(str(filename))
+
+
+def test_load_dataset_uses_snapshot(tmp_path):
+    """
+    Test that load_dataset saves a snapshot, then restores from it until the
+    dataset changes.
+    """
+    dataset = tmp_path / 'dataset.json'
+    snapshot = tmp_path / 'dataset.snapshot'
+    dataset.write_text(json.dumps(make_log(10, 200)))
+    customers, store = load_dataset(str(dataset), str(snapshot))
+    assert snapshot.exists()
+
+    restored, restored_store = load_dataset(str(dataset), str(snapshot))
+    assert _customer_state(restored) == _customer_state(customers)
+    assert len(restored_store) == len(store)
+
+    os.utime(snapshot, (0, 0))
+    reloaded, _ = load_dataset(str(dataset), str(snapshot))
+    assert _customer_state(reloaded) == _customer_state(customers)
+    assert os.path.getmtime(snapshot) > 0
+
+
+
+###############################################################################
+# Tests for incremental event processing
+
+
+def test_event_processor_batches_match_one_shot():
+    """
+    Test that processing the events in batches gives the same result as
+    processing them all at once.
+    """
+    log = make_log(20, 1500)
+    expected = create_customers(log)
+    expected_store = CallStore()
+    process_event_history(log, expected, store=expected_store)
+
+    customers = create_customers(log)
+    processor = EventProcessor(customers, CallStore())
+    for start in range(0, 1500, 400):
+        assert processor.process(log['events'][start:start + 400]) == \
+            min(400, 1500 - start)
+    assert processor.offset == 1500
+    assert processor.billing_month == (12, 2018)
+    assert _customer_state(customers) == _customer_state(expected)
+    assert [str(c) for c in processor.store] == \
+        [str(c) for c in expected_store]
+
+
+def test_event_processor_resumes_from_checkpoint(tmp_path):
+    """
+    Test that a processor resumed from a checkpoint only processes the events
+    after it, and ends in the same state as a processor that never stopped.
+    """
+    log = make_log(20, 1500)
+    expected = create_customers(log)
+    expected_store = CallStore()
+    process_event_history(log, expected, store=expected_store)
+
+    filename = str(tmp_path / 'feed.snapshot')
+    processor = EventProcessor(create_customers(log), CallStore())
+    processor.process(log['events'][:700])
+    processor.save_checkpoint(filename)
+    billing_month = processor.billing_month
+    # events processed after the checkpoint are lost in a crash
+    processor.process(log['events'][700:900])
+
+    resumed = EventProcessor.resume(filename)
+    assert resumed.offset == 700
+    assert resumed.billing_month == billing_month
+    assert resumed.process(resumed.unprocessed(iter(log['events']))) == 800
+    assert _customer_state(resumed.customers) == _customer_state(expected)
+    assert [str(c) for c in resumed.store] == \
+        [str(c) for c in expected_store]
+
+
+def test_event_processor_keeps_calls_at_repeated_times():
+    """
+    Test that a call made at a time already passed, like in the hour repeated
+    when daylight saving time ends, is processed as the next event.
+    """
+    customers = create_customers(make_log(5, 0))
+    call = {'type': 'call', 'src_number': '000-0000',
+            'dst_number': '000-0001', 'time': '2018-11-04 01:30:00',
+            'duration': 60, 'src_loc': [-79.4, 43.6],
+            'dst_loc': [-79.4, 43.6]}
+    log = {'events': [call, dict(call, time='2018-11-04 01:10:00')]}
+    process_event_history(log, customers)
+    assert len(customers[0].get_history()[0]) == 2
+
+
+def test_event_processor_checks_index_of_events():
+    """
+    Test that the events given with their index in the feed skip the events
+    already processed, and are rejected if events would be missed.
+    """
+    log = make_log(5, 100)
+    expected = create_customers(log)
+    process_event_history(log, expected)
+
+    processor = EventProcessor(create_customers(log))
+    assert processor.process(log['events'][:60]) == 60
+    with pytest.raises(ValueError):
+        processor.process(log['events'][70:], start=70)
+    assert processor.offset == 60
+    assert processor.process(log['events'][50:], start=50) == 40
+    assert processor.offset == 100
+    assert _customer_state(processor.customers) == _customer_state(expected)
+    with pytest.raises(ValueError):
+        EventProcessor.resume(__file__)
+
+
+
+###############################################################################
+# Tests for the spatial index
+
+
+@pytest.mark.parametrize('cells', [1, 3, 16])
+def test_grid_index_matches_scan(cells):
+    """
+    Test that the grid index finds the same calls as checking every call,
+    including calls on the boundary of the rectangle and outside the map.
+    """
+    rng = np.random.default_rng(148)
+    count = 5000
+    lon = rng.uniform(GRID_MIN[0] - 0.05, GRID_MAX[0] + 0.05, (2, count))
+    lat = rng.uniform(GRID_MIN[1] - 0.05, GRID_MAX[1] + 0.05, (2, count))
+    lon[0, :10] = -79.5
+    lat[0, :10] = 43.65
+    lon[1, 10:20] = GRID_MAX[0]
+    lat[1, 10:20] = GRID_MIN[1]
+    index = GridIndex(lon[0], lat[0], lon[1], lat[1], cells)
+
+    for box in [(-79.5, 43.6, -79.3, 43.65),
+                (-79.5, 43.65, -79.5, 43.65),
+                (GRID_MIN[0], GRID_MIN[1], GRID_MAX[0], GRID_MAX[1]),
+                (-79.2, 43.576959, -79.196382, 43.58),
+                (-79.6, 43.7, -79.6, 43.7)]:
+        inside = [(box[0] <= lon[i]) & (lon[i] <= box[2])
+                  & (box[1] <= lat[i]) & (lat[i] <= box[3]) for i in (0, 1)]
+        expected = np.flatnonzero(inside[0] | inside[1])
+        assert index.query(*box).tolist() == expected.tolist()
+
+
+def test_location_filter_on_selected_store():
+    """
+    Test that the location filter keeps the order of the calls of a store
+    selected by another filter.
+    """
+    customers, store, calls = make_store_dataset()
+    filtered = DurationFilter().apply(customers, store, 'G200')
+    result = LocationFilter().apply(customers, filtered,
+                                    '-79.6, 43.6, -79.4, 43.7')
+    expected = LocationFilter().apply(customers, list(filtered),
+                                      '-79.6, 43.6, -79.4, 43.7')
+    assert list(result) == expected
+    assert store.spatial_index() is store.spatial_index()
+    assert result.positions().tolist() == [calls.index(c) for c in result]
+
+
+
+###############################################################################
+# Tests for the duration index
+
+
+def test_sorted_index_thresholds():
+    """
+    Test that the sorted index finds the positions of the values strictly
+    below or above a threshold, in their original order.
+    """
+    values = np.array([300, 5, 120, 5, 600, 120, 0, 999])
+    index = SortedIndex(values)
+    for threshold in [-1, 0, 5, 6, 120, 600, 999, 1000]:
+        assert index.less_than(threshold).tolist() == \
+            np.flatnonzero(values < threshold).tolist()
+        assert index.greater_than(threshold).tolist() == \
+            np.flatnonzero(values > threshold).tolist()
+    assert SortedIndex(np.array([], dtype=np.int64)).less_than(10).size == 0
+
+
+def test_duration_filter_uses_index():
+    """
+    Test that the duration filter on a root store selects the same calls, in
+    the same order, as on the list of its calls, and reuses the index.
+    """
+    customers, store, calls = make_store_dataset()
+    for threshold in sorted({c.duration for c in calls})[::7]:
+        for op in 'LG':
+            filter_string = f'{op}{min(threshold, 999):03d}'
+            result = DurationFilter().apply(customers, store, filter_string)
+            assert list(result) == DurationFilter().apply(
+                customers, calls, filter_string)
+    assert store.duration_index() is store.duration_index()
+
+
+
+###############################################################################
+# Tests for the per-line call index
+
+
+def test_line_positions_match_scan():
+    """
+    Test that the calls listed for a set of lines are the calls made or
+    received by these lines, in order, including after restoring a store from
+    its columns.
+    """
+    customers, store, calls = make_store_dataset()
+    restored = CallStore.from_columns(calls, store.columns(), store.numbers())
+    for customer in customers[:10]:
+        line_ids = store.line_ids(customer.get_phone_numbers())
+        expected = np.flatnonzero(np.isin(store.src_lines, line_ids)
+                                  | np.isin(store.dst_lines, line_ids))
+        assert store.line_positions(line_ids.tolist()).tolist() == \
+            expected.tolist()
+        assert restored.line_positions(line_ids.tolist()).tolist() == \
+            expected.tolist()
+    assert store.line_positions([]).size == 0
+
+
+@pytest.mark.parametrize('filter_class, filter_string', [
+    (CustomerFilter, '1003'),
+    (DurationFilter, 'G300'),
+    (LocationFilter, '-79.6, 43.6, -79.4, 43.7'),
+])
+def test_filters_on_store_slices(filter_class, filter_string):
+    """
+    Test that the filters give the same calls on slices of a store, as used
+    by the visualizer to split the work, as on lists of the same calls.
+    """
+    customers, store, calls = make_store_dataset()
+    for start, end in [(0, len(calls)), (100, 300), (0, 0)]:
+        part = store[start:end]
+        assert part.root_range() == (start, end)
+        result = filter_class().apply(customers, part, filter_string)
+        assert list(result) == list(filter_class().apply(
+            customers, calls[start:end], filter_string))
+
+
+def test_customer_filter_finds_recorded_customers(tmp_path):
+    """
+    Test that a store records the customers as the events are processed and
+    when it is restored from a snapshot, so that the customer filter finds a
+    customer by id without the list of customers, and that their phone
+    numbers stay up to date.
+    """
+    customers, store, calls = make_store_dataset()
+    filename = str(tmp_path / 'dataset.snapshot')
+    save_snapshot(filename, customers, store)
+    _, restored = load_snapshot(filename)
+    for s in [store, restored, store[100:300]]:
+        assert s.has_customers()
+        for customer in customers:
+            assert s.customer_numbers(customer.get_id()) == \
+                customer.get_phone_numbers()
+        assert list(CustomerFilter().apply([], s, '1003')) == \
+            list(CustomerFilter().apply(customers, list(s), '1003'))
+        assert CustomerFilter().apply([], s, '9999') is s
+
+    unrecorded = CallStore(calls)
+    assert list(CustomerFilter().apply(customers, unrecorded, '1003')) == \
+        list(CustomerFilter().apply(customers, calls, '1003'))
+    assert not unrecorded.has_customers()
+
+    customer = customers[0]
+    customer.cancel_phone_line(customer.get_phone_numbers()[0])
+    customer.add_phone_line(PhoneLine('999-9999', None))
+    assert '999-9999' in store.customer_numbers(customer.get_id())
+    assert store.customer_numbers(customer.get_id()) == \
+        customer.get_phone_numbers()
+
+
+
+###############################################################################
+# Tests for the parallel filters
+
+
+@pytest.mark.parametrize('filter_class, filter_string', [
+    (CustomerFilter, '1003'),
+    (DurationFilter, 'G300'),
+    (LocationFilter, '-79.6, 43.6, -79.4, 43.7'),
+    (DurationFilter, 'X300'),
+    (ResetFilter, ''),
+])
+def test_filter_pool_matches_filters(filter_class, filter_string):
+    """
+    Test that applying a filter with worker processes selects the same calls,
+    in the same order, as applying it in this process, for the whole store,
+    a slice of it, and the result of another filter.
+    """
+    customers, store, calls = make_store_dataset()
+    pool = FilterPool(store, customers, 3)
+    try:
+        for data in [store, store[50:250],
+                     DurationFilter().apply(customers, store, 'L400')]:
+            result = pool.apply(filter_class(), customers, data,
+                                filter_string)
+            expected = filter_class().apply(customers, data, filter_string)
+            assert list(result) == list(expected)
+        assert pool.is_current()
+    finally:
+        pool.close()
+
+
+def test_filter_pool_applies_indexed_filters_in_process(monkeypatch):
+    """
+    Test that the filters answered by the indexes of the root store, for the
+    root store and its slices holding at least half of its calls, are not
+    split between the workers, while the other calls are.
+    """
+    customers, store, calls = make_store_dataset()
+    assert store.index_range() == (0, 400)
+    assert store[100:300].index_range() == (100, 300)
+    assert store[100:299].index_range() is None
+    assert store[100:299].root_range() == (100, 299)
+
+    pool = FilterPool(store, customers, 2)
+    mapped = []
+    real_map = pool._pool.map
+
+    def counting_map(func, tasks):
+        mapped.append(len(tasks))
+        return real_map(func, tasks)
+
+    monkeypatch.setattr(pool._pool, 'map', counting_map)
+    try:
+        for data in [store, store[100:300]]:
+            assert list(pool.apply(DurationFilter(), customers, data,
+                                   'G300')) == \
+                list(DurationFilter().apply(customers, data, 'G300'))
+        assert mapped == []
+        for data in [store[0:100],
+                     LocationFilter().apply(customers, store,
+                                            '-79.6, 43.6, -79.4, 43.7')]:
+            assert list(pool.apply(DurationFilter(), customers, data,
+                                   'G300')) == \
+                list(DurationFilter().apply(customers, data, 'G300'))
+        assert mapped == [2, 2]
+    finally:
+        pool.close()
+
+
+
+###############################################################################
+# Tests for the filter pipeline
+
+
+@pytest.mark.parametrize('use_store', [True, False])
+def test_filter_pipeline_matches_sequential_filters(use_store):
+    """
+    Test that a pipeline selects the same calls, in the same order, as
+    applying its filters one after the other, and that undoing a stage does
+    not apply any filter again.
+    """
+    customers, store, calls = make_store_dataset()
+    applied = []
+
+    def counting_apply(f, customers, data, filter_string):
+        applied.append(filter_string)
+        return f.apply(customers, data, filter_string)
+
+    pipeline = FilterPipeline(customers, store if use_store else calls,
+                              counting_apply)
+    stages = [(DurationFilter(), 'G100'),
+              (LocationFilter(), '-79.6, 43.6, -79.3, 43.75'),
+              (CustomerFilter(), 'abc'),
+              (CustomerFilter(), '1003')]
+    expected = [calls]
+    for f, filter_string in stages:
+        expected.append(f.apply(customers, expected[-1], filter_string))
+        assert list(pipeline.push(f, filter_string)) == expected[-1]
+    assert len(pipeline) == 4
+    assert len(applied) == 4
+
+    for count in range(3, -1, -1):
+        assert list(pipeline.undo()) == expected[count]
+    assert pipeline.result() is pipeline.calls
+    assert list(pipeline.undo()) == calls
+    assert len(applied) == 4
+
+    pipeline.push(DurationFilter(), 'L200')
+    assert list(pipeline.push(ResetFilter(), '')) == calls
+    assert pipeline.stages() == []
+
+
+
+def test_filter_cache_hits_normalized_strings(store_dataset):
+    """
+    Test that the filter cache returns the same calls as the filters, and
+    finds the results of filter strings which the filters treat the same.
+    """
+    customers, store, _ = store_dataset
+    cache = FilterCache(size=2)
+    lf = LocationFilter()
+    box = "-79.6, 43.6, -79.3, 43.7"
+    first = cache.apply(lf, customers, store, box)
+    assert list(first) == list(lf.apply(customers, store, box))
+    again = cache.apply(lf, customers, store, "-79.60,43.6 , -79.3,  43.70")
+    assert again is first
+    df = DurationFilter()
+    longer = cache.apply(df, customers, store, " G010 ")
+    assert list(longer) == list(df.apply(customers, store, "G010"))
+    assert cache.apply(df, customers, store, "G010") is longer
+    assert (cache.hits, cache.misses) == (2, 2)
+    # whitespace makes a customer ID invalid, so it is not normalized away
+    cid = str(customers[0].get_id())
+    assert len(cache.apply(CustomerFilter(), customers, store, " " + cid)) \
+        == len(store)
+    assert len(cache.apply(CustomerFilter(), customers, store, cid)) \
+        < len(store)
+    assert cache.misses == 4
+
+
+def test_filter_cache_eviction_and_invalidation(store_dataset):
+    """
+    Test that the filter cache drops the least recently used result when
+    it is full, and all of its results when calls are added to the store.
+    """
+    customers, store, calls = store_dataset
+    cache = FilterCache(size=2)
+    df = DurationFilter()
+    cache.apply(df, customers, store, "L100")
+    cache.apply(df, customers, store, "G100")
+    cache.apply(df, customers, store, "L100")
+    cache.apply(df, customers, store, "G050")
+    assert len(cache) == 2
+    cache.apply(df, customers, store, "L100")
+    assert (cache.hits, cache.misses) == (2, 3)
+    cache.apply(df, customers, store, "G100")
+    assert cache.misses == 4
+
+    store.append(calls[0])
+    result = cache.apply(df, customers, store, "L100")
+    assert cache.misses == 5 and len(cache) == 1
+    assert list(result) == list(df.apply(customers, store, "L100"))
+    # filters applied to a list are not cached
+    cache.apply(df, customers, calls, "L100")
+    assert (cache.hits, cache.misses) == (2, 5)
+
+
+
+def test_closed_month_bills_cached():
+    """
+    Test that the bills of closed months are summarized once, are not
+    changed by mutating a returned summary, and that the bill of the current
+    month keeps changing with new calls.
+    """
+    customer = create_customers(test_dict1)[0]
+    customer.new_month(1, 2018)
+    customer.make_call(create_dummy_call2('867-5309', '273-8255', 600,
+                                          "2018-01-10 12:00:00"))
+    customer.new_month(2, 2018)
+    lines = [customer.get_phone_line(n) for n in customer.get_phone_numbers()]
+    # the summaries are only computed once a bill is asked for
+    assert not any(line._summaries for line in lines)
+    january = customer.generate_bill(1, 2018)
+    assert all((1, 2018) in line._summaries for line in lines)
+    january[2][0]['total'] = -1
+    again = customer.generate_bill(1, 2018)
+    assert again[1] == january[1]
+    assert again[2][0]['total'] != -1
+    assert again[2] == [
+        dict(line.bills[(1, 2018)].get_summary(), number=line.get_number())
+        for line in lines]
+    line = customer.get_phone_line('273-8255')
+    assert line.get_bill(1, 2018) == dict(
+        line.bills[(1, 2018)].get_summary(), number='273-8255')
+
+    before = customer.generate_bill(2, 2018)[1]
+    customer.make_call(create_dummy_call2('273-8255', '867-5309', 600,
+                                          "2018-02-10 12:00:00"))
+    assert customer.generate_bill(2, 2018)[1] == pytest.approx(
+        before + 10 * MTM_MINS_COST)
+
+    # a new line changes the bills of every month
+    customer.add_phone_line(PhoneLine('555-0000', MTMContract(
+        datetime.date(2018, 1, 1))))
+    customer.get_phone_line('555-0000').new_month(1, 2018)
+    assert len(customer.generate_bill(1, 2018)[2]) == 4
+
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_bill_run_matches_generate_bill(store_dataset, fmt, tmp_path):
+    """
+    Test that the bill run writes the same bills with and without worker
+    processes, whether they load the customers from a given snapshot file or
+    not, and that they are the bills of Customer.generate_bill.
+    """
+    customers, store, _ = store_dataset
+    filename = str(tmp_path / 'dataset.snapshot')
+    save_snapshot(filename, customers, store)
+    outputs = []
+    for workers, snapshot_file in [(1, None), (2, None), (2, filename)]:
+        out = io.StringIO()
+        assert run_bills(customers, 3, 2018, out, fmt, workers,
+                         snapshot_file)[0] == len(customers)
+        outputs.append(out.getvalue())
+    # the whole fixed costs of restored bills are floats, so the values are
+    # compared rather than the text
+    if fmt == 'jsonl':
+        values = [[json.loads(line) for line in text.splitlines()]
+                  for text in outputs]
+    else:
+        values = [[row.split(',')[:5] + [float(v) for v in
+                                         row.split(',')[5:]]
+                   for row in text.splitlines()[1:]] for text in outputs]
+    assert values[0] == values[1] == values[2]
+
+    bills = [c.generate_bill(3, 2018) for c in customers]
+    if fmt == 'jsonl':
+        rows = [json.loads(line) for line in outputs[0].splitlines()]
+        assert [(r['customer_id'], r['total'], r['lines']) for r in rows] \
+            == [(cid, pytest.approx(total), lines)
+                for cid, total, lines in bills]
+    else:
+        rows = outputs[0].splitlines()
+        assert rows[0].split(',') == CSV_COLUMNS
+        assert len(rows) == 1 + sum(len(lines) for _, _, lines in bills)
+        assert rows[1].split(',')[3] == bills[0][2][0]['number']
+
+
+
+def test_callhistory_calls_between(store_dataset):
+    """
+    Test that the calls made in a period are the calls of the call history
+    made in that period, in chronological order, including calls registered
+    out of order.
+    """
+    customers, _, _ = store_dataset
+    histories = [h for c in customers for h in c.get_call_history()]
+    periods = [(datetime.datetime(2018, 1, 1), datetime.datetime(2019, 1, 1)),
+               (datetime.datetime(2018, 3, 5, 10, 30),
+                datetime.datetime(2018, 3, 12, 10, 30)),
+               (datetime.datetime(2018, 2, 20, 0, 0, 0, 500),
+                datetime.datetime(2018, 5, 2)),
+               (datetime.datetime(2018, 6, 1), datetime.datetime(2018, 6, 1))]
+    for start, end in periods:
+        for history in histories:
+            found = history.get_calls_between(start, end)
+            for calls, direction in zip(found, history.get_monthly_history()):
+                expected = sorted((c for c in direction
+                                   if start <= c.time < end),
+                                  key=lambda c: c.timestamp)
+                assert list(calls) == expected
+
+    ch = CallHistory()
+    late = create_dummy_call2('111', '222', 60, "2018-01-20 10:00:00")
+    early = create_dummy_call2('111', '222', 60, "2018-01-05 10:00:00")
+    ch.register_outgoing_call(late)
+    ch.register_outgoing_call(early)
+    outgoing, incoming = ch.get_calls_between(datetime.datetime(2018, 1, 1),
+                                              datetime.datetime(2018, 2, 1))
+    assert list(outgoing) == [early, late]
+    assert list(incoming) == []
+
+
+
+def test_history_iterators_match_lists(store_dataset):
+    """
+    Test that iterating over the history of customers, phone lines and
+    call histories gives the calls of the corresponding lists, in order.
+    """
+    customers, _, calls = store_dataset
+    for customer in customers:
+        outgoing, incoming = customer.get_history()
+        assert list(customer.iter_outgoing()) == outgoing
+        assert list(customer.iter_incoming()) == incoming
+        for number in customer.get_phone_numbers():
+            line = customer.get_phone_line(number)
+            for month in [None, 1, 6]:
+                year = None if month is None else 2018
+                history = line.get_monthly_history(month, year)
+                assert list(line.iter_outgoing(month, year)) == history[0]
+                assert list(line.iter_incoming(month, year)) == history[1]
+    assert list(ResetFilter().apply(customers, calls, '')) == [
+        call for c in customers for call in c.get_history()[0]]
+
+
+
+def make_call_drawables(locations: list[tuple[float, float]]) \
+        -> list[Drawable]:
+    """ Return the drawables of calls from and to each of the <locations>,
+    with the connections after the sprites, as drawn by the application.
+    """
+    calls = [Call('111-1111', '222-2222', datetime.datetime(2018, 1, 1), 60,
+                  loc, loc) for loc in locations]
+    drawables = [d for call in calls for d in call.get_drawables()]
+    return drawables + [call.get_connection() for call in calls]
+
+
+def screen_position(m: Map, location: tuple[float, float]) -> tuple[int, int]:
+    """ Return the pixel of the screen showing the <location> in the current
+    view of the map <m>.
+    """
+    x, y = m._map_to_screen(m._longlat_to_map(np.array([location])))[0]
+    return int(x), int(y)
+
+
+@pytest.fixture
+def dummy_map():
+    """
+    Create a map for the screen of the application, not panned or zoomed.
+    """
+    return Map(SCREEN_SIZE)
+
+
+def test_map_culls_objects_outside_view(dummy_map):
+    """
+    Test that the map only draws the objects inside the current view,
+    once zoomed in on its top-left corner.
+    """
+    top_left = (-79.69, 43.79)
+    bottom_right = (-79.2, 43.58)
+    drawables = make_call_drawables([top_left, bottom_right])
+    sprites, lines = dummy_map._visible_objects(drawables)
+    assert len(sprites) == 4 and len(lines) == 2
+
+    dummy_map.zoom(2)
+    sprites, lines = dummy_map._visible_objects(drawables)
+    assert sprites.tolist() == [0, 1] and lines.tolist() == [0]
+
+
+def test_map_clusters_dense_objects(dummy_map):
+    """
+    Test that the map draws one marker per cluster of sprites, when more
+    than LOD_THRESHOLD sprites are visible.
+    """
+    location = (-79.45, 43.68)
+    screen = pygame.Surface(SCREEN_SIZE)
+    screen.fill((255, 255, 255))
+    dummy_map.render_objects(
+        make_call_drawables([location] * LOD_THRESHOLD), screen)
+    x, y = screen_position(dummy_map, location)
+    centre = (x // CLUSTER_SIZE * CLUSTER_SIZE + CLUSTER_SIZE // 2,
+              y // CLUSTER_SIZE * CLUSTER_SIZE + CLUSTER_SIZE // 2)
+    assert tuple(screen.get_at(centre))[:3] == CLUSTER_COLOUR
+    # a single sprite is drawn as it is
+    screen.fill((255, 255, 255))
+    dummy_map.render_objects(make_call_drawables([location]), screen)
+    assert tuple(screen.get_at(centre))[:3] != CLUSTER_COLOUR
+
+
+
+def test_map_view_cached_per_transform(dummy_map):
+    """
+    Test that the map view is only prepared again when the map is panned
+    or zoomed, and that it covers the screen at every zoom level and offset.
+    """
+    view = dummy_map.get_current_view()
+    assert view.get_size() == SCREEN_SIZE
+    assert dummy_map.get_current_view() is view
+    dummy_map.zoom(1)
+    dummy_map.pan((-50, -30))
+    panned = dummy_map.get_current_view()
+    assert panned is not view
+    for _ in range(30):
+        dummy_map.zoom(0.1)
+        dummy_map.pan((-10000, -10000))
+        assert dummy_map.get_current_view().get_size() == SCREEN_SIZE
+    # only the levels of the pyramid are scaled as a whole
+    assert set(dummy_map._pyramid) <= set(PYRAMID_ZOOMS)
+    while dummy_map._zoom > 1:
+        dummy_map.zoom(-0.1)
+    dummy_map.pan((10000, 10000))
+    dummy_map.pan((-50, -30))
+    assert dummy_map.get_current_view().get_size() == SCREEN_SIZE
+
+
+
+def test_map_transform_changes_with_view(dummy_map):
+    """
+    Test that the transformation of the map only changes when the map is
+    actually panned or zoomed, so that unchanged frames are not drawn again.
+    """
+    transform = dummy_map.get_transform()
+    dummy_map.pan((-40, -40))
+    dummy_map.zoom(-0.1)
+    assert dummy_map.get_transform() == transform
+    dummy_map.zoom(0.5)
+    dummy_map.pan((-40, -40))
+    assert dummy_map.get_transform() != transform
+
+
+
+def test_map_overlay_drawn_once(dummy_map):
+    """
+    Test that the drawables set as the overlay of the map appear in its
+    views, that they are only drawn again when other drawables are set, and
+    that a dense overlay is drawn as clusters.
+    """
+    location = (-79.45, 43.68)
+    x, y = screen_position(dummy_map, location)
+    empty = dummy_map.get_current_view().get_at((x + 6, y + 6))
+
+    drawables = make_call_drawables([location])
+    dummy_map.set_overlay(drawables)
+    view = dummy_map.get_current_view()
+    assert view.get_at((x + 6, y + 6)) != empty
+    dummy_map.set_overlay(drawables)
+    assert dummy_map.get_current_view() is view
+
+    assert dummy_map.set_overlay([])
+    assert dummy_map.get_current_view().get_at((x + 6, y + 6)) == empty
+
+
+def test_map_dense_objects_not_drawn_onto_map(dummy_map):
+    """
+    Test that drawables with too many sprites are not drawn onto the
+    map, and are rendered as clusters at the first zoom level, but as sprites
+    once zoomed in far enough.
+    """
+    rng = np.random.default_rng(148)
+    locations = list(zip(rng.uniform(-79.69, -79.2, 3000).tolist(),
+                         rng.uniform(43.58, 43.79, 3000).tolist()))
+    drawables = make_call_drawables(locations)
+    view = dummy_map.get_current_view()
+    assert not dummy_map.set_overlay(drawables)
+    assert dummy_map.get_current_view() is view
+
+    screen = pygame.Surface(SCREEN_SIZE)
+    dummy_map.render_objects(drawables, screen)
+    assert dummy_map._clusters is not None
+    dummy_map.zoom(3)
+    assert len(dummy_map._visible_objects(drawables)[0]) <= LOD_THRESHOLD
+    dummy_map.render_objects(drawables, screen)
+    assert dummy_map._clusters is None
+
+
+def test_map_pyramid_scaled_lazily(dummy_map):
+    """
+    Test that the levels of the pyramid are only scaled once they are
+    used, including by the zoom levels between them, and scaled again after
+    other drawables are drawn onto the map.
+    """
+    assert dummy_map._pyramid == {}
+    dummy_map.get_current_view()
+    assert list(dummy_map._pyramid) == [1]
+    dummy_map.zoom(0.5)
+    assert dummy_map.get_current_view().get_size() == SCREEN_SIZE
+    assert list(dummy_map._pyramid) == [1, 2]
+    dummy_map.zoom(2.5)
+    dummy_map.get_current_view()
+    assert list(dummy_map._pyramid) == [1, 2, 4]
+    dummy_map.set_overlay(make_call_drawables([(-79.45, 43.68)]))
+    assert dummy_map._pyramid == {}
+    dummy_map.get_current_view()
+    assert list(dummy_map._pyramid) == [4]
+
+
 if __name__ == '__main__':
     pytest.main(['tests.py'])
@@ -22,18 +22,22 @@ longitude/latitude coordinates and pixel coordinates on the pygame window.
 
 DO NOT CHANGE ANY CODE IN THIS FILE, unless instructed in the handout.
 """
-import math
 import os
-import threading
 import time
 from tkinter import *
 from typing import Optional, Union, Callable, Any
 
+import numpy as np
 import pygame
 
-from call import Drawable, Call
+from call import Call
+from callstore import CallStore
+from drawable import Drawable, SPRITE_SIZE
 from customer import Customer
 from filter import Filter, DurationFilter, CustomerFilter, LocationFilter, ResetFilter
+from filtercache import FilterCache
+from parallel import FilterPool, NUM_WORKERS
+from pipeline import FilterPipeline
 
 # ----------------------------------------------------------------------------
 # NOTE: You do not need to understand any of the visualization details from
@@ -52,8 +56,69 @@ MAP_MAX = (-79.196382, 43.576959)
 # Window size
 SCREEN_SIZE = (1000, 700)
 
-# Thread settings for Task 5
-NUM_THREADS = 1
+# Largest number of frames drawn per second
+MAX_FPS = 60
+
+# Number of visible sprites above which nearby sprites are drawn as a single
+# marker, and the size in pixels of the square cells they are grouped in
+LOD_THRESHOLD = 5000
+CLUSTER_SIZE = 12
+CLUSTER_COLOUR = (200, 40, 40)
+# Size in pixels of the square cells that the ends of the lines are grouped
+# in when sprites are grouped, and the largest number of lines then drawn
+LINK_SIZE = 48
+MAX_LINKS = 2000
+
+# Zoom levels whose scaled map is kept once it is needed, until other
+# drawables are drawn onto the map; the views at the other zoom levels are
+# scaled from the part of the next level that they display
+PYRAMID_ZOOMS = (1, 2, 4)
+
+
+def _count(keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """ Return the distinct values of <keys>, in increasing order, and the
+    number of times each of them occurs.
+    """
+    keys = np.sort(keys)
+    starts = np.flatnonzero(np.diff(keys, prepend=keys[:1] - 1))
+    return keys[starts], np.diff(starts, append=len(keys))
+
+
+def _cluster_objects(positions: np.ndarray, endpoints: np.ndarray) \
+        -> tuple[list[tuple[tuple[int, int], tuple[int, int]]],
+                 list[tuple[tuple[int, int], int]]]:
+    """ Return the lines and the markers drawn for the sprites at the screen
+    <positions> and the lines between the screen <endpoints>, when they are
+    too many to be drawn one by one.
+
+    The lines are the lines between the centres of the LINK_SIZE squares of
+    the screen holding the endpoints of the most lines, for at most MAX_LINKS
+    pairs of squares. The markers are the centre and the radius of a circle
+    for each CLUSTER_SIZE square of the screen holding any of the sprites,
+    which grows with their number.
+    """
+    # the squares are numbered with one byte per coordinate, which is enough
+    # for the screen positions of the whole map at any zoom level
+    squares = np.clip(endpoints // LINK_SIZE + 128, 0, 255)
+    links, counts = _count(((squares[:, 0] * 256 + squares[:, 1]) * 256
+                            + squares[:, 2]) * 256 + squares[:, 3])
+    if len(links) > MAX_LINKS:
+        links = links[np.argpartition(counts, -MAX_LINKS)[-MAX_LINKS:]]
+    squares = np.stack([links >> 24, links >> 16, links >> 8, links],
+                       axis=1) % 256 - 128
+    lines = [((x0, y0), (x1, y1)) for x0, y0, x1, y1
+             in (squares * LINK_SIZE + LINK_SIZE // 2).tolist()]
+
+    cells = positions // CLUSTER_SIZE + 128
+    counts = np.bincount(cells[:, 0] * 256 + cells[:, 1], minlength=1)
+    clusters = np.flatnonzero(counts)
+    counts = counts[clusters]
+    half = CLUSTER_SIZE // 2
+    centres = (np.stack([clusters // 256, clusters % 256], axis=1)
+               - 128) * CLUSTER_SIZE + half
+    radii = np.minimum(half, 2 + np.rint(np.log2(counts)).astype(int))
+    return lines, [(tuple(centre), radius) for centre, radius
+                   in zip(centres.tolist(), radii.tolist())]
 
 
 def get_filter(unicode: str) -> Optional[Filter]:
@@ -82,11 +147,28 @@ class Visualizer:
     #   on the pygame window.
     # _map: the Map object responsible for converting between longitude/latitude
     #   coordinates and the pixels of the visualization window.
+    # _filter_pool: the worker processes applying the filters to the calls,
+    #   or None if no filter was applied to a CallStore yet.
+    # _filter_cache: the results of the filters applied most recently, which
+    #   are applied by the filter pool when they are not cached.
+    # _pipeline: the filters applied so far to a CallStore, which can be
+    #   undone one at a time, or None if no filter was applied to one yet.
+    # _clock: the clock used to limit the number of frames per second.
+    # _dirty: whether the screen must be drawn again, even if neither the
+    #   drawables nor the view of the map changed, e.g. once uncovered.
+    # _rendered: the drawables drawn last, and the transformation of the map
+    #   they were drawn with, or None if nothing was drawn yet.
     _uiscreen: pygame.Surface
     _screen: pygame.Surface
     _mouse_down: bool
     _map: 'Map'
     _quit: bool
+    _filter_pool: Optional[FilterPool]
+    _filter_cache: FilterCache
+    _pipeline: Optional[FilterPipeline]
+    _clock: pygame.time.Clock
+    _dirty: bool
+    _rendered: Optional[tuple[list[Drawable], tuple[int, int, float]]]
     r: Tk
 
     def __init__(self) -> None:
@@ -115,6 +197,8 @@ class Visualizer:
                             (SCREEN_SIZE[0] + 10, 200))
         self._uiscreen.blit(font.render("R: reset filter", True, WHITE),
                             (SCREEN_SIZE[0] + 10, 250))
+        self._uiscreen.blit(font.render("U: undo last filter", True, WHITE),
+                            (SCREEN_SIZE[0] + 10, 300))
 
         self._uiscreen.blit(font.render("M: monthly bill", True, WHITE),
                             (SCREEN_SIZE[0] + 10, 500))
@@ -125,23 +209,93 @@ class Visualizer:
         self._screen.fill(WHITE)
         self._mouse_down = False
         self._map = Map(SCREEN_SIZE)
+        self._clock = pygame.time.Clock()
+        self._dirty = True
+        self._rendered = None
 
         # Initial render
         self.render_drawables([])
         self._quit = False
+        self._filter_pool = None
+        self._filter_cache = FilterCache(self._pool_apply)
+        self._pipeline = None
 
-    def render_drawables(self, drawables: list[Drawable]) -> None:
-        """Render the <drawables> to the screen
+    def render_drawables(self, drawables: list[Drawable]) -> bool:
+        """Render the <drawables> to the screen, unless the same drawables
+        were rendered last, and neither the view of the map changed nor the
+        screen was invalidated since then. Return whether the screen was
+        drawn.
+
+        The <drawables> must not be changed once rendered.
         """
-        # Draw the background map onto the screen
+        transform = self._map.get_transform()
+        if (not self._dirty and self._rendered is not None
+                and self._rendered[0] is drawables
+                and self._rendered[1] == transform):
+            return False
+        self._dirty = False
+        self._rendered = (drawables, transform)
+
+        # A few objects are drawn onto the map once, and then panned and
+        # zoomed along with it; more are drawn onto every view, grouped
+        # depending on how many of them it shows
+        drawn = self._map.set_overlay(drawables)
+
+        # Draw the map onto the screen
         self._screen.fill(WHITE)
         self._screen.blit(self._map.get_current_view(), (0, 0))
-
-        # Add all of the objects onto the screen
-        self._map.render_objects(drawables, self._screen)
+        if not drawn:
+            self._map.render_objects(drawables, self._screen)
 
         # Show the new image
         pygame.display.flip()
+        return True
+
+    def invalidate(self) -> None:
+        """Draw the screen again the next time drawables are rendered, even
+        if neither they nor the view of the map changed.
+        """
+        self._dirty = True
+
+    def wait_frame(self) -> None:
+        """Wait until the next frame is due, so that at most MAX_FPS frames
+        are drawn per second, and the main loop sleeps while idle instead of
+        using a whole core.
+        """
+        self._clock.tick(MAX_FPS)
+
+    def _get_filter_pool(self, customers: list[Customer],
+                         store: CallStore) -> FilterPool:
+        """Return the pool of worker processes applying the filters to the
+        calls of the root <store>, made by the <customers>, creating it the
+        first time, or if calls were added to <store> since then.
+        """
+        pool = self._filter_pool
+        if pool is None or pool.store is not store or not pool.is_current():
+            if pool is not None:
+                pool.close()
+            self._filter_pool = FilterPool(store, customers, NUM_WORKERS)
+        return self._filter_pool
+
+    def _pool_apply(self, f: Filter, customers: list[Customer],
+                    data: CallStore, filter_string: str) -> CallStore:
+        """Apply the filter <f> with the worker processes of the filter pool
+        """
+        pool = self._get_filter_pool(customers, data.root)
+        print("Num_workers:", pool.workers)
+        return pool.apply(f, customers, data, filter_string)
+
+    def _get_pipeline(self, customers: list[Customer],
+                      store: CallStore) -> FilterPipeline:
+        """Return the pipeline of the filters applied to the calls of the
+        root <store>, made by the <customers>, creating it the first time.
+        Its stages are looked up in the filter cache, and evaluated by the
+        filter pool when they are not cached.
+        """
+        if self._pipeline is None or self._pipeline.calls is not store:
+            self._pipeline = FilterPipeline(customers, store,
+                                            self._filter_cache.apply)
+        return self._pipeline
 
     def has_quit(self) -> bool:
         """Returns if the program has received the quit command
@@ -187,57 +341,30 @@ class Visualizer:
                 f = get_filter(event.unicode)
 
                 if f is not None:
-                    def result_wrapper(fun: Callable[[list[Customer],
-                                                      list[Call],
-                                                      str], list[Call]],
-                                       customers: list[Customer],
-                                       data: list[Call],
-                                       filter_string: str,
-                                       res: list) -> None:
-                        """A final wrapper to return the result of the operation
+                    def pipeline_wrapper(customers: list[Customer],
+                                         data: Union[list[Call], CallStore],
+                                         filter_string: str) \
+                            -> Union[list[Call], CallStore]:
+                        """A wrapper for the application of filters as a new
+                        stage of the filter pipeline, evaluated in parallel
+                        by the worker processes of the filter pool
                         """
-                        res.append(fun(customers, data, filter_string))
-
-                    def threading_wrapper(customers: list[Customer],
-                                          data: list[Call],
-                                          filter_string: str) -> list[Call]:
-                        """A wrapper for the application of filters with
-                        threading
-                        """
-                        chk_cls = math.ceil(
-                            (len(data) + NUM_THREADS - 1) / NUM_THREADS)
-                        print("Num_threads:", NUM_THREADS)
-                        print("Chunk_calls:", chk_cls)
-                        threads = []
-                        results = []
-                        for i in range(NUM_THREADS):
-                            res = []
-                            results.append(res)
-                            t = threading.Thread(target=result_wrapper,
-                                                 args=(f.apply,
-                                                       customers,
-                                                       data[i * chk_cls:
-                                                            (i + 1) * chk_cls],
-                                                       filter_string,
-                                                       res))
-                            t.daemon = True
-                            t.start()
-                            threads.append(t)
-                            # f.apply(customers, data, filter_string)
-                        # Wait to finish
-                        for t in threads:
-                            t.join()
-
-                        # Now reconstruct the data
-                        new_data = []
-                        for res in results:
-                            new_data.extend(res[0])
-                        return new_data
+                        if not isinstance(data, CallStore):
+                            return f.apply(customers, data, filter_string)
+                        pipeline = self._get_pipeline(customers, data.root)
+                        result = pipeline.push(f, filter_string)
+                        print("Filter cache hits:", self._filter_cache.hits,
+                              "misses:", self._filter_cache.misses)
+                        return result
 
                     new_drawables = self.entry_window(str(f),
                                                       customers,
                                                       drawables,
-                                                      threading_wrapper)
+                                                      pipeline_wrapper)
+
+                # Undo the last filter applied
+                if event.unicode.lower() == "u" and self._pipeline is not None:
+                    new_drawables = self._pipeline.undo()
 
                 # Perform the billing for a selected customer:
                 if event.unicode == "m":
@@ -298,6 +425,8 @@ class Visualizer:
                 self._mouse_down = False
             elif event.type == pygame.MOUSEMOTION:
                 self.set_event_button_motion()
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                self.invalidate()
         return new_drawables
 
     def entry_window(self, field: str,
@@ -344,6 +473,8 @@ class Visualizer:
                                                sticky=W, pady=5)
         m.mainloop()
         print("FILTER APPLIED")
+        # the pop-up window may have covered the map
+        self.invalidate()
         return new_drawables
 
 
@@ -367,6 +498,31 @@ class Map:
     #    offset on y axis
     # _zoom:
     #    map zoom level
+    # _pyramid:
+    #    the whole map scaled for the PYRAMID_ZOOMS zoom levels used since the
+    #    last drawables were drawn onto it
+    # _view:
+    #    the part of the map displayed for the (_xoffset, _yoffset, zoom) key
+    #    it is stored with, or None if it was not displayed yet
+    # _objects:
+    #    the drawables rendered last, their sprites, and arrays of the
+    #    positions on the map image of their sprites and of the endpoints of
+    #    their lines, or None if nothing was rendered yet
+    # _projection:
+    #    for the drawables rendered last, the (_xoffset, _yoffset, _zoom) key
+    #    of the view, arrays of the screen positions of their sprites and of
+    #    the endpoints of their lines in that view, and the indexes of the
+    #    visible sprites and lines, or None if they were not projected yet
+    # _clusters:
+    #    the lines and the markers drawn for the drawables rendered last in
+    #    the current view, when they are too many to be drawn one by one, or
+    #    None if they were not grouped yet
+    # _overlay:
+    #    the drawables drawn onto the map by set_overlay, or None if there
+    #    are none, such as when they are too many to be drawn onto it
+    # _base:
+    #    the map image with the <_overlay> drawables drawn onto it, which
+    #    the views of the map are scaled from
     image: pygame.image
     min_coords: tuple[float, float]
     max_coords: tuple[float, float]
@@ -374,6 +530,16 @@ class Map:
     _xoffset: int
     _yoffset: int
     _zoom: int
+    _pyramid: dict[float, pygame.Surface]
+    _view: Optional[tuple[tuple[int, int, float], pygame.Surface]]
+    _objects: Optional[tuple[list[Drawable], list[pygame.Surface],
+                             np.ndarray, np.ndarray]]
+    _projection: Optional[tuple[tuple[int, int, float], np.ndarray,
+                                np.ndarray, np.ndarray, np.ndarray]]
+    _clusters: Optional[tuple[list[tuple[tuple[int, int], tuple[int, int]]],
+                              list[tuple[tuple[int, int], int]]]]
+    _overlay: Optional[list[Drawable]]
+    _base: pygame.Surface
 
     def __init__(self, screendims: tuple[int, int]) -> None:
         """ Initialize this map for the given screen dimensions <screendims>.
@@ -387,39 +553,196 @@ class Map:
         self._yoffset = 0
         self._zoom = 1
         self.screensize = screendims
+        self._view = None
+        self._objects = None
+        self._projection = None
+        self._clusters = None
+        self._overlay = None
+        self._base = self.image
+        self._pyramid = {}
 
     def render_objects(self, drawables: list[Drawable],
                        screen: pygame.Surface) -> None:
         """ Render the <drawables> onto the <screen>.
+
+        Only the drawables which can be seen in the current view are drawn.
+        If more than LOD_THRESHOLD sprites can be seen, the sprites within
+        the same CLUSTER_SIZE square of the screen are drawn as a single
+        marker, sized by their number, and only the MAX_LINKS busiest links
+        between LINK_SIZE squares are drawn, as a single line each, so that
+        the time taken to draw a frame is bounded by the size of the screen
+        rather than by the number of calls.
+
+        The screen positions of the drawables are computed for all of them at
+        once, and kept until the map is panned or zoomed, or other drawables
+        are rendered. The <drawables> must not be changed once rendered.
+        """
+        sprites, positions, endpoints = self._screen_objects(drawables)
+        visible_sprites, visible_lines = self._visible_objects(drawables)
+        if len(visible_sprites) > LOD_THRESHOLD:
+            if self._clusters is None:
+                self._clusters = _cluster_objects(positions[visible_sprites],
+                                                  endpoints[visible_lines])
+            links, markers = self._clusters
+            for start, end in links:
+                pygame.draw.line(screen, LINE_COLOUR, start, end)
+            for centre, radius in markers:
+                pygame.draw.circle(screen, CLUSTER_COLOUR, centre, radius)
+            return
+
+        screen.blits([(sprites[i], position) for i, position in
+                      zip(visible_sprites.tolist(),
+                          positions[visible_sprites].tolist())],
+                     doreturn=False)
+        for x0, y0, x1, y1 in endpoints[visible_lines].tolist():
+            pygame.draw.aaline(screen, LINE_COLOUR, (x0, y0), (x1, y1))
+
+    def _screen_objects(self, drawables: list[Drawable]) \
+            -> tuple[list[pygame.Surface], np.ndarray, np.ndarray]:
+        """ Return the sprites of the <drawables>, in order, along with an
+        array of the (x, y) screen positions of these sprites, and an array
+        of the (x0, y0, x1, y1) screen endpoints of the lines of the
+        <drawables>, in order, in the current view.
+        """
+        sprites, locations, limits = self._map_objects(drawables)
+        key = (self._xoffset, self._yoffset, self._zoom)
+        if self._projection is None or self._projection[0] != key:
+            positions = self._map_to_screen(locations)
+            x = positions[:, 0]
+            y = positions[:, 1]
+            visible = ((-SPRITE_SIZE[0] < x) & (x < self.screensize[0])
+                       & (-SPRITE_SIZE[1] < y) & (y < self.screensize[1]))
+            endpoints = self._map_to_screen(
+                limits.reshape(-1, 2)).reshape(-1, 4)
+            x0, y0, x1, y1 = endpoints.T
+            # a line whose bounding box is off the screen is not visible
+            crossing = ((np.minimum(x0, x1) < self.screensize[0])
+                        & (np.maximum(x0, x1) >= 0)
+                        & (np.minimum(y0, y1) < self.screensize[1])
+                        & (np.maximum(y0, y1) >= 0))
+            self._projection = (key, positions, endpoints,
+                                np.flatnonzero(visible),
+                                np.flatnonzero(crossing))
+            self._clusters = None
+        return sprites, self._projection[1], self._projection[2]
+
+    def _map_objects(self, drawables: list[Drawable]) \
+            -> tuple[list[pygame.Surface], np.ndarray, np.ndarray]:
+        """ Return the sprites of the <drawables>, in order, along with an
+        array of the (x, y) positions of these sprites on the map image, and
+        an array of the (x0, y0, x1, y1) positions of the endpoints of the
+        lines of the <drawables> on the map image, in order.
+        """
+        if self._objects is None or self._objects[0] is not drawables:
+            sprites = []
+            locations = []
+            limits = []
+            for drawable in drawables:
+                longlat_position = drawable.get_position()
+                if longlat_position is not None:
+                    sprites.append(drawable.sprite)
+                    locations.append(longlat_position)
+                else:  # is a line segment
+                    start, end = drawable.get_linelimits()
+                    limits.append(start + end)
+            # the positions on the map image do not depend on the view
+            self._objects = (drawables, sprites,
+                             self._longlat_to_map(np.array(
+                                 locations, dtype=float).reshape(-1, 2)),
+                             self._longlat_to_map(np.array(
+                                 limits, dtype=float).reshape(-1, 2)))
+            self._projection = None
+        return self._objects[1], self._objects[2], \
+            self._objects[3].reshape(-1, 4)
+
+    def set_overlay(self, drawables: list[Drawable]) -> bool:
+        """ Draw the <drawables> onto the map itself, replacing the drawables
+        drawn onto it before, so that the views of the map show them. Return
+        whether they were drawn onto the map.
+
+        The drawables are drawn once, at the resolution of the map image, and
+        are then panned and zoomed along with the map. At the first zoom
+        level, they have the same size and position as when rendered onto the
+        screen by render_objects. Nothing is drawn again if the <drawables>
+        were drawn onto the map last. The <drawables> must not be changed once
+        drawn.
+
+        Drawables with more than LOD_THRESHOLD sprites are not drawn onto the
+        map, and must be rendered onto each view with render_objects instead,
+        so that they are grouped depending on how many of them the view shows,
+        and zooming in shows the sprites of the groups again.
         """
-        for drawable in drawables:
-            longlat_position = drawable.get_position()
-            if longlat_position is not None:
-                sprite_position = self._longlat_to_screen(longlat_position)
-                screen.blit(drawable.sprite, sprite_position)
-            else:  # is a line segment
-                endpoints = drawable.get_linelimits()
-                pygame.draw.aaline(screen,
-                                   LINE_COLOUR,
-                                   self._longlat_to_screen(endpoints[0]),
-                                   self._longlat_to_screen(endpoints[1]))
-
-    def _longlat_to_screen(self,
-                           location: tuple[float, float]) -> tuple[int, int]:
-        """ Convert the <location> long/lat coordinates into pixel coordinates.
+        sprites, locations, limits = self._map_objects(drawables)
+        dense = len(sprites) > LOD_THRESHOLD
+        overlay = None if dense or not drawables else drawables
+        if overlay is not self._overlay:
+            self._overlay = overlay
+            if overlay is None:
+                self._base = self.image
+            else:
+                self._base = self._draw_overlay(sprites, locations, limits)
+            self._reset_levels()
+        return not dense
+
+    def _draw_overlay(self, sprites: list[pygame.Surface],
+                      locations: np.ndarray, limits: np.ndarray) \
+            -> pygame.Surface:
+        """ Return a copy of the map image with the <sprites> drawn at the
+        (x, y) map image positions <locations>, and the lines between the
+        (x0, y0, x1, y1) map image positions <limits>, as returned by
+        _map_objects.
         """
-        x = round((location[0] - self.min_coords[0])
-                  / (self.max_coords[0] - self.min_coords[0])
-                  * self.image.get_width())
-        y = round((location[1] - self.min_coords[1])
-                  / (self.max_coords[1] - self.min_coords[1])
-                  * self.image.get_height())
-
-        x = round((x - self._xoffset) * self._zoom * self.screensize[0]
-                  / self.image.get_width())
-        y = round((y - self._yoffset) * self._zoom * self.screensize[1]
-                  / self.image.get_height())
-        return x, y
+        # the size of a sprite on the map image, so that it has its usual
+        # size on the screen at the first zoom level
+        size = (round(SPRITE_SIZE[0] * self.image.get_width()
+                      / self.screensize[0]),
+                round(SPRITE_SIZE[1] * self.image.get_height()
+                      / self.screensize[1]))
+        base = self.image.copy()
+        scaled = {}
+        for sprite in sprites:
+            if sprite not in scaled:
+                scaled[sprite] = pygame.transform.smoothscale(sprite, size)
+        base.blits([(scaled[sprite], position) for sprite, position
+                    in zip(sprites, locations.tolist())], doreturn=False)
+        for x0, y0, x1, y1 in limits.tolist():
+            pygame.draw.aaline(base, LINE_COLOUR, (x0, y0), (x1, y1))
+        return base
+
+    def _visible_objects(self, drawables: list[Drawable]) \
+            -> tuple[np.ndarray, np.ndarray]:
+        """ Return the increasing indexes of the sprites and of the lines of
+        the <drawables>, as returned by _screen_objects, which can be seen in
+        the current view.
+        """
+        self._screen_objects(drawables)
+        return self._projection[3], self._projection[4]
+
+    def _longlat_to_map(self, locations: np.ndarray) -> np.ndarray:
+        """ Convert the long/lat coordinates of the <locations>, an array of
+        (long, lat) rows, into an array of (x, y) pixel coordinates on the
+        map image.
+        """
+        scale = np.array([self.image.get_width(), self.image.get_height()])
+        return np.rint((locations - self.min_coords)
+                       / np.subtract(self.max_coords, self.min_coords)
+                       * scale)
+
+    def _map_to_screen(self, pixels: np.ndarray) -> np.ndarray:
+        """ Convert the <pixels>, an array of (x, y) pixel coordinates on the
+        map image, into an array of (x, y) pixel coordinates on the screen in
+        the current view.
+        """
+        scale = np.array([self.image.get_width(), self.image.get_height()])
+        offset = np.array([self._xoffset, self._yoffset])
+        return np.rint((pixels - offset) * self._zoom * self.screensize
+                       / scale).astype(np.int64)
+
+    def get_transform(self) -> tuple[int, int, float]:
+        """ Return the (x offset, y offset, zoom) transformation of the view of
+        this map, which changes whenever the map is panned or zoomed.
+        """
+        return self._xoffset, self._yoffset, self._zoom
 
     def pan(self, dp: tuple[int, int]) -> None:
         """ Pan the view in the image by <dp> (dx, dy) screenspace pixels.
@@ -452,15 +775,96 @@ class Map:
 
     def get_current_view(self) -> pygame.Surface:
         """ Get the subimage to display to screen from the map.
+
+        The whole map is scaled once for each zoom level of the pyramid, so
+        that panning at those levels only selects another part of the scaled
+        map. At the other zoom levels, only the displayed part of the next
+        level of the pyramid is scaled. The same view is returned until the
+        map is panned or zoomed. The returned Surface is shared, so it must
+        not be modified.
+        """
+        zoom = round(self._zoom, 2)
+        key = (self._xoffset, self._yoffset, zoom)
+        if self._view is not None and self._view[0] == key:
+            return self._view[1]
+
+        if zoom in PYRAMID_ZOOMS:
+            level = self._get_level(zoom)
+            x = round(self._xoffset * level.get_width()
+                      / self.image.get_width())
+            y = round(self._yoffset * level.get_height()
+                      / self.image.get_height())
+            x = min(x, level.get_width() - self.screensize[0])
+            y = min(y, level.get_height() - self.screensize[1])
+            view = level.subsurface(((x, y), self.screensize))
+        else:
+            view = self._scale_window(zoom)
+        self._view = (key, view)
+        return view
+
+    def _get_level(self, zoom: float) -> pygame.Surface:
+        """ Return the whole map scaled for the <zoom> level of the pyramid.
+
+        The levels of the pyramid are only scaled the first time they are
+        used, so that drawing other drawables onto the map does not scale the
+        largest levels unless the map is zoomed in that far.
+
+        Precondition: zoom in PYRAMID_ZOOMS
+        """
+        level = self._pyramid.get(zoom)
+        if level is None:
+            level = self._scale_map(zoom)
+            self._pyramid[zoom] = level
+        return level
+
+    def _scale_window(self, zoom: float) -> pygame.Surface:
+        """ Return the part of the map displayed at the <zoom> level, which
+        is not a level of the pyramid, scaled to the screen.
+
+        It is scaled down from the same part of the smallest level of the
+        pyramid larger than <zoom>, or of the map itself past the last level.
+        """
+        larger = [level for level in PYRAMID_ZOOMS if level > zoom]
+        source = self._get_level(min(larger)) if larger else self._base
+        scale_x = source.get_width() / self.image.get_width()
+        scale_y = source.get_height() / self.image.get_height()
+        width = min(source.get_width(),
+                    round(self.image.get_width() / self._zoom * scale_x))
+        height = min(source.get_height(),
+                     round(self.image.get_height() / self._zoom * scale_y))
+        x = min(round(self._xoffset * scale_x), source.get_width() - width)
+        y = min(round(self._yoffset * scale_y), source.get_height() - height)
+        window = source.subsurface(((x, y), (width, height)))
+        return pygame.transform.smoothscale(window, self.screensize)
+
+    def _reset_levels(self) -> None:
+        """ Forget the scaled maps and the current view, once other drawables
+        are drawn onto the map.
+        """
+        self._pyramid = {}
+        self._view = None
+
+    def _scale_map(self, zoom: float) -> pygame.Surface:
+        """ Return the whole map, with the drawables drawn onto it, scaled
+        for the <zoom> level of the pyramid: at the same scale as the part of
+        the map displayed at that zoom level.
+
+        The map is scaled from the smallest level of the pyramid scaled so
+        far at least as large as the result, which is cheaper than scaling
+        the whole image.
         """
         raw_width = self.image.get_width()
         raw_height = self.image.get_height()
-        zoom_width = round(raw_width / self._zoom)
-        zoom_height = round(raw_height / self._zoom)
-
-        mapsegment = self.image.subsurface(((self._xoffset, self._yoffset),
-                                            (zoom_width, zoom_height)))
-        return pygame.transform.smoothscale(mapsegment, self.screensize)
+        size = (round(raw_width * self.screensize[0]
+                      / round(raw_width / zoom)),
+                round(raw_height * self.screensize[1]
+                      / round(raw_height / zoom)))
+        source = self._base
+        for level in self._pyramid.values():
+            if (size[0] <= level.get_width() < source.get_width()
+                    and size[1] <= level.get_height()):
+                source = level
+        return pygame.transform.smoothscale(source, size)
 
 
 if __name__ == '__main__':
@@ -468,13 +872,14 @@ if __name__ == '__main__':
 
     python_ta.check_all(config={
         'allowed-import-modules': [
-            'doctest', 'python_ta', 'typing',
+            'doctest', 'python_ta', 'typing', 'numpy',
             'tkinter', 'os', 'pygame',
-            'threading', 'math', 'time',
-            'customer', 'call', 'filter',
+            'time', 'parallel', 'pipeline', 'filtercache',
+            'customer', 'call', 'callstore', 'drawable', 'filter',
         ],
         'allowed-io': [
-            'entry_window', 'callback_wrapper', 'threading_wrapper',
+            'entry_window', 'callback_wrapper', 'pipeline_wrapper',
+            '_pool_apply',
             '__init__', 'handle_window_events'
         ],
         'disable': ['R0915', 'W0613', 'W0401', 'R0201'],